@@ -6,15 +6,18 @@ AI邮件简报系统 - 主应用
 """
 
 import os
+import re
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 from datetime import datetime, timedelta
+from functools import partial, wraps
+from itertools import chain
 import logging
 import logging.handlers
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_file
-import zipfile
-import tempfile
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_file, g, has_app_context, Response, stream_with_context, session
+from urllib.parse import quote
 from apscheduler.schedulers.background import BackgroundScheduler
 from werkzeug.security import generate_password_hash
 
@@ -34,14 +37,40 @@ from routes.ai_assistant_routes import register_ai_assistant_routes
 from services.cache_service import cache_service
 from services.cache_manager import cache_manager
 from services.auto_cache_cleaner import auto_cache_cleaner
+from services.dedup_bloom import EmailDedupBloom
+from services.processing_gate import ProcessingGate, LIMIT_REACHED, ALREADY_PROCESSING
+from services.job_queue import JobQueue
 from models.database import Database
 from utils.logger import setup_logger
 from utils.log_filter import setup_log_filters
-
-# 性能保护变量
-current_processing_users = set()
-processing_lock = threading.Lock()
+from utils.rate_limiter import rate_limit, load_glm_limits
+from utils.zip_stream import stream_zip
+from utils.json_provider import install_json_provider
+from utils.lang import is_in_language
+from utils.ttl_cache import TTLCache
+from utils.pagination import encode_cursor, decode_cursor
+
+# 性能保护变量（并发名额记录在Redis中，多进程部署时同样生效）
 MAX_CONCURRENT_USERS = 3
+processing_gate = ProcessingGate(MAX_CONCURRENT_USERS)
+
+# IMAP收取线程池（网络IO密集，多账户并行收取；总连接数受MAX_CONCURRENT_USERS约束）
+_fetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="imap")
+
+# 翻译线程池（GLM接口为同步HTTP调用，并发数兼顾接口限流）
+TRANSLATION_MAX_WORKERS = 10
+_translation_pool = ThreadPoolExecutor(max_workers=TRANSLATION_MAX_WORKERS, thread_name_prefix="translate")
+
+# 手动收取任务线程池（与MAX_CONCURRENT_USERS一致，超出的提交在队列中排队）
+EMAIL_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_USERS, thread_name_prefix="EmailProc")
+# 简报生成线程池（Celery不可用时使用，不占用收取并发名额）
+_digest_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="digest")
+# 批量操作后台任务队列（请求立即返回任务ID，前端轮询 /api/jobs/<job_id>）
+job_queue = JobQueue(max_workers=2)
+# 新用户定时任务创建线程（注册请求不等待调度器加锁添加任务）
+_schedule_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="schedule")
+_user_futures = {}  # user_id -> Future，用于避免重复提交和取消排队中的任务
+_user_futures_lock = threading.Lock()
 
 # 设置日志
 logger = setup_logger(__name__)
@@ -72,6 +101,7 @@ load_dotenv()
 
 app = Flask(__name__)
 app.config.from_object(Config)
+install_json_provider(app)
 
 # 配置Flask日志
 setup_flask_logging(app)
@@ -82,6 +112,7 @@ scheduler = BackgroundScheduler()
 email_manager = EmailManager()
 ai_client = AIClient()
 digest_generator = DigestGenerator()
+dedup_bloom = EmailDedupBloom(db)
 
 # 导入并初始化调度管理器
 from services.scheduler_manager import EmailSchedulerManager
@@ -93,10 +124,7 @@ def process_emails():
     
     try:
         # 获取所有活跃用户
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT id FROM users WHERE is_active = 1')
-            user_ids = [row['id'] for row in cursor.fetchall()]
+        user_ids = db.get_active_user_ids()
         
         for user_id in user_ids:
             try:
@@ -115,23 +143,19 @@ def process_user_emails(user_id: int, is_manual_fetch: bool = False):
         user_id: 用户ID
         is_manual_fetch: 是否为手动实时收取（True=手动收取，False=定时收取）
     """
-    global current_processing_users, processing_lock
-    
     # 检查并发限制
-    with processing_lock:
-        if len(current_processing_users) >= MAX_CONCURRENT_USERS:
-            logger.info(f"达到并发限制 ({MAX_CONCURRENT_USERS})，用户 {user_id} 的任务将延后处理")
-            return
-        
-        if user_id in current_processing_users:
-            logger.warning(f"用户 {user_id} 的邮件正在处理中，跳过本次任务")
-            return
-        
-        current_processing_users.add(user_id)
+    admission = processing_gate.acquire(user_id)
+    if admission == ALREADY_PROCESSING:
+        logger.warning(f"用户 {user_id} 的邮件正在处理中，跳过本次任务")
+        return
+    if admission == LIMIT_REACHED:
+        logger.info(f"达到并发限制 ({MAX_CONCURRENT_USERS})，用户 {user_id} 的任务将延后处理")
+        return
     
     start_time = time.time()
     fetch_type = "手动" if is_manual_fetch else "定时"
     logger.info(f"开始处理用户 {user_id} 的邮件（{fetch_type}收取）...")
+    notifications = []  # 本次处理产生的系统通知，结束时统一写入
     
     try:
         # 获取用户的邮箱账户
@@ -141,7 +165,7 @@ def process_user_emails(user_id: int, is_manual_fetch: bool = False):
             return
         
         # 获取用户配置
-        user_configs = db.get_user_configs(user_id)
+        user_configs = _cached_user_configs(user_id)
         since_days = int(user_configs.get('check_days_back', '1'))
         max_emails_per_account = int(user_configs.get('max_emails_per_account', '20'))
         
@@ -149,26 +173,34 @@ def process_user_emails(user_id: int, is_manual_fetch: bool = False):
         
         all_new_emails = []
         
-        # 处理用户的每个邮箱账户
-        for account in user_accounts:
-            if not account['is_active']:
-                continue
-                
+        # 一次查询取出所有账户密码，避免每个账户单独查库
+        account_passwords = db.get_account_passwords(user_id)
+        
+        def _fetch_account(account):
+            """收取单个邮箱账户的新邮件（在线程池中执行）"""
             logger.info(f"处理邮箱: {account['email']}")
+            # 为邮件管理器构造账户信息
+            account_info = {
+                'email': account['email'],
+                'password': account_passwords.get(account['id'], ''),
+                'provider': account['provider']
+            }
+            return email_manager.fetch_new_emails(
+                account_info, 
+                since_days=since_days, 
+                user_id=user_id,
+                max_emails=max_emails_per_account
+            )
+        
+        # 并行处理用户的每个邮箱账户
+        futures = {
+            _fetch_pool.submit(_fetch_account, account): account
+            for account in user_accounts if account['is_active']
+        }
+        for future in as_completed(futures):
+            account = futures[future]
             try:
-                # 为邮件管理器构造账户信息
-                account_info = {
-                    'email': account['email'],
-                    'password': _get_account_password(account['id']),  # 需要单独获取密码
-                    'provider': account['provider']
-                }
-                
-                new_emails = email_manager.fetch_new_emails(
-                    account_info, 
-                    since_days=since_days, 
-                    user_id=user_id,
-                    max_emails=max_emails_per_account
-                )
+                new_emails = future.result()
                 if new_emails:
                     # 为每封邮件添加用户ID
                     for email in new_emails:
@@ -181,75 +213,52 @@ def process_user_emails(user_id: int, is_manual_fetch: bool = False):
         
         if not all_new_emails:
             logger.info(f"用户 {user_id} 没有新邮件需要处理")
-            # 保存系统通知，告知用户收取结果
-            db.save_notification(
-                user_id=user_id,
-                title="邮件收取完成",
-                message="本次收取没有找到新邮件。所有邮箱均已检查完毕，暂无新邮件到达。",
-                notification_type='info'
-            )
+            # 记录系统通知，告知用户收取结果
+            notifications.append({
+                'user_id': user_id,
+                'title': "邮件收取完成",
+                'message': "本次收取没有找到新邮件。所有邮箱均已检查完毕，暂无新邮件到达。",
+                'notification_type': 'info'
+            })
             return
             
         logger.info(f"用户 {user_id} 总共发现 {len(all_new_emails)} 封新邮件，开始去重...")
         
-        # 去重处理（用户隔离）
-        deduplicated_emails = db.deduplicate_emails(all_new_emails, user_id=user_id)
+        # 去重处理（用户隔离，布隆过滤器预筛，仅可能重复的邮件查库确认）
+        deduplicated_emails = dedup_bloom.deduplicate(all_new_emails, user_id=user_id)
         logger.info(f"用户 {user_id} 去重后剩余 {len(deduplicated_emails)} 封邮件")
         
         if not deduplicated_emails:
             logger.info(f"用户 {user_id} 去重后没有新邮件需要处理")
-            # 保存系统通知，说明去重结果
-            db.save_notification(
-                user_id=user_id,
-                title="邮件收取完成",
-                message=f"找到 {len(all_new_emails)} 封邮件，但全部为重复邮件，已自动过滤。系统已为您去重，避免重复查看。",
-                notification_type='info'
-            )
+            # 记录系统通知，说明去重结果
+            notifications.append({
+                'user_id': user_id,
+                'title': "邮件收取完成",
+                'message': f"找到 {len(all_new_emails)} 封邮件，但全部为重复邮件，已自动过滤。系统已为您去重，避免重复查看。",
+                'notification_type': 'info'
+            })
             return
             
         logger.info(f"开始为用户 {user_id} 生成AI摘要...")
         
-        # 生成AI摘要
-        summarized_emails = ai_client.batch_summarize(deduplicated_emails)
+        # 生成AI摘要（分批并发，近似重复邮件合并为一次请求）
+        summarized_emails = ai_client.batch_summarize(deduplicated_emails, batch_size=Config.SUMMARY_BATCH_SIZE)
         
-        # 保存到数据库
-        saved_count = 0
-        for email_data in summarized_emails:
-            try:
-                db.save_email(email_data)
-                saved_count += 1
-            except Exception as e:
-                logger.error(f"保存邮件失败: {e}")
-                continue
+        # 保存到数据库（记录新邮件行ID，供简报生成直接使用）
+        saved_ids = db.save_emails_bulk(summarized_emails)
+        saved_count = len(saved_ids)
         
         logger.info(f"用户 {user_id} 成功保存 {saved_count} 封邮件")
         
-        # 更新每个邮箱账户的统计信息
-        for account in user_accounts:
-            if account['is_active']:
-                account_email_count = db.get_account_email_count(user_id, account['email'])
-                db.update_email_account_stats(user_id, account['email'], account_email_count)
-                logger.debug(f"更新邮箱 {account['email']} 统计: {account_email_count} 封邮件")
+        # 批量更新邮箱账户的统计信息
+        active_accounts = [account for account in user_accounts if account['is_active']]
+        updated = db.bulk_update_account_stats(user_id, active_accounts)
+        logger.debug(f"更新 {updated} 个邮箱账户的统计信息")
         
         # 生成用户专属简报 - 使用已保存的邮件（包含ID）
-        if saved_count > 0:
-            # 获取最近保存的邮件（包含数据库ID）
-            recent_emails, _ = db.get_user_emails_filtered(user_id, page=1, per_page=saved_count)
-            if recent_emails:
-                # 传递is_manual_fetch参数，影响AI摘要的生成风格
-                digest = digest_generator.create_digest(recent_emails, is_manual_fetch=is_manual_fetch)
-                db.save_digest(digest, user_id=user_id)
-                logger.info(f"用户 {user_id} 简报生成完成（{fetch_type}收取）")
-                
-                # 保存成功通知
-                db.save_notification(
-                    user_id=user_id,
-                    title="新邮件到达",
-                    message=f"成功收取并处理了 {saved_count} 封新邮件，已生成邮件简报。去重前共发现 {len(all_new_emails)} 封邮件。",
-                    notification_type='success'
-                )
-            else:
-                logger.warning(f"用户 {user_id} 无法获取已保存的邮件用于生成简报")
+        if saved_ids:
+            # 简报生成（需再次调用AI）转入后台执行，尽早释放并发名额
+            _dispatch_user_digest(user_id, saved_ids, is_manual_fetch, total_found=len(all_new_emails))
         
         # 记录处理时间
         processing_time = time.time() - start_time
@@ -260,24 +269,142 @@ def process_user_emails(user_id: int, is_manual_fetch: bool = False):
         logger.error(f"处理用户 {user_id} 邮件时发生错误（耗时 {processing_time:.2f} 秒）: {e}")
     
     finally:
-        # 确保从处理中列表移除
-        with processing_lock:
-            current_processing_users.discard(user_id)
+        # 统一写入本次处理产生的系统通知
+        if notifications:
+            db.save_notifications_bulk(notifications)
         
-        # 添加处理间隔，避免过载
-        time.sleep(1)
+        # 确保从处理中列表移除（节流由调度器参数和手动收取限流负责）
+        processing_gate.release(user_id)
 
-def _get_account_password(account_id: int) -> str:
-    """获取邮箱账户密码"""
+def _generate_user_digest(user_id: int, email_ids: list, is_manual_fetch: bool = False,
+                          total_found: int = None):
+    """根据已保存的邮件ID生成并保存用户简报（线程模式）"""
+    fetch_type = "手动" if is_manual_fetch else "定时"
     try:
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT password FROM email_accounts WHERE id = ?', (account_id,))
-            row = cursor.fetchone()
-            return row['password'] if row else ''
+        emails = db.get_emails_by_ids(email_ids, user_id=user_id)
+        if not emails:
+            logger.warning(f"用户 {user_id} 无法获取已保存的邮件用于生成简报")
+            return
+        
+        # 传递is_manual_fetch参数，影响AI摘要的生成风格
+        digest = digest_generator.create_digest(emails, is_manual_fetch=is_manual_fetch)
+        db.save_digest(digest, user_id=user_id)
+        logger.info(f"用户 {user_id} 简报生成完成（{fetch_type}收取）")
+        
+        # 保存成功通知
+        db.save_notification(
+            user_id=user_id,
+            title="新邮件到达",
+            message=f"成功收取并处理了 {len(emails)} 封新邮件，已生成邮件简报。去重前共发现 {total_found or len(emails)} 封邮件。",
+            notification_type='success'
+        )
+    except Exception as e:
+        logger.error(f"用户 {user_id} 简报生成失败: {e}")
+
+CELERY_STATUS_TTL = 30  # Celery可用性检查结果的缓存时间（秒）
+_celery_alive = {'time': 0.0, 'ok': False}
+
+def _celery_available(force_refresh: bool = False) -> bool:
+    """检查Celery worker是否可用（ping是广播RPC，结果缓存30秒）"""
+    now = time.monotonic()
+    if not force_refresh and _celery_alive['time'] and now - _celery_alive['time'] < CELERY_STATUS_TTL:
+        return _celery_alive['ok']
+    
+    try:
+        from services.celery_app import celery_app
+        ok = bool(celery_app.control.inspect().ping())
     except Exception as e:
-        logger.error(f"获取账户密码失败: {e}")
-        return ''
+        logger.debug(f"Celery不可用: {e}")
+        ok = False
+    
+    _celery_alive.update(time=now, ok=ok)
+    return ok
+
+def _mark_celery_unavailable():
+    """提交任务失败时立即标记Celery不可用，缓存过期后再重新检查"""
+    _celery_alive.update(time=time.monotonic(), ok=False)
+
+def _dispatch_user_digest(user_id: int, email_ids: list, is_manual_fetch: bool = False,
+                          total_found: int = None):
+    """提交简报生成任务：优先Celery，不可用时使用后台线程池"""
+    if _celery_available():
+        try:
+            from services.async_tasks import generate_user_digest
+            task = generate_user_digest.apply_async(
+                args=(user_id, email_ids, is_manual_fetch),
+                kwargs={'total_found': total_found}
+            )
+            logger.info(f"用户 {user_id} 简报生成任务已提交到Celery: {task.id}")
+            return
+        except Exception as e:
+            _mark_celery_unavailable()
+            logger.warning(f"提交Celery简报任务失败，改用线程池: {e}")
+    
+    _digest_pool.submit(_generate_user_digest, user_id, email_ids, is_manual_fetch, total_found)
+
+USER_CONFIGS_CACHE_TTL = 60  # 用户配置缓存时间（秒）
+USER_CONFIGS_LOCAL_TTL = 30  # 进程内用户配置缓存时间（秒）
+
+# 进程内用户配置缓存（在Redis缓存之前，仪表盘频繁刷新时不再访问Redis/数据库）
+_local_user_configs = TTLCache(maxsize=1024, ttl=USER_CONFIGS_LOCAL_TTL)
+
+def _user_configs_cache_key(user_id: int) -> str:
+    return f"ucfg:{user_id}"
+
+def _cached_user_configs(user_id: int) -> dict:
+    """获取用户配置（请求内用flask.g记忆，其次是30秒进程内缓存和60秒Redis缓存）"""
+    memo = None
+    if has_app_context():
+        memo = g.setdefault('_user_configs', {})
+        if user_id in memo:
+            return dict(memo[user_id])
+    
+    configs = _local_user_configs.get(user_id)
+    if configs is None:
+        configs = cache_service.get(_user_configs_cache_key(user_id))
+        if not isinstance(configs, dict):
+            configs = db.get_user_configs(user_id)
+            cache_service.set(_user_configs_cache_key(user_id), configs, USER_CONFIGS_CACHE_TTL)
+        _local_user_configs.set(user_id, configs)
+    
+    if memo is not None:
+        memo[user_id] = configs
+    return dict(configs)
+
+def _invalidate_user_configs(user_id: int):
+    """用户配置变更后清除缓存"""
+    cache_service.delete(_user_configs_cache_key(user_id))
+    _local_user_configs.pop(user_id)
+    if has_app_context():
+        g.setdefault('_user_configs', {}).pop(user_id, None)
+
+# 高频错误响应：启动时序列化一次，请求中只创建Response对象（不能复用同一个Response，
+# 否则after_request/会话写入的响应头会串到其他请求）
+_ERROR_MESSAGES = {
+    'email_not_found': ('邮件不存在', 404),
+    'email_forbidden': ('邮件不存在或您没有权限', 404),
+    'translation_unavailable': ('翻译服务不可用，请检查GLM API配置', 503),
+    'empty_body': ('邮件正文为空', 400),
+    'unsupported_language': ('不支持的目标语言', 400),
+    'no_summary': ('邮件没有摘要可以翻译', 400),
+    'no_attachments': ('该邮件没有附件', 404),
+    'attachment_not_found': ('附件不存在', 404),
+    'attachment_file_missing': ('附件文件不存在', 404),
+}
+_ERROR_BODIES = {
+    key: (app.json.dumps({'error': message}) + '\n', status)
+    for key, (message, status) in _ERROR_MESSAGES.items()
+}
+
+def _error_response(key: str):
+    """返回预先序列化的错误响应"""
+    body, status = _ERROR_BODIES[key]
+    return app.response_class(body, status=status, mimetype='application/json')
+
+def _rate_limit_user_key() -> str:
+    """限流标识：已登录用户按用户ID，未登录按IP"""
+    user = auth_service.get_current_user()
+    return f"user:{user['id']}" if user else None
 
 @app.route('/')
 @auth_service.require_login
@@ -296,7 +423,7 @@ def index():
         stats = db.get_user_stats(user['id'])
         
         # 获取用户配置（用于系统信息显示）
-        user_configs = db.get_user_configs(user['id'])
+        user_configs = _cached_user_configs(user['id'])
         
         return render_template('index.html', 
                              digest=latest_digest, 
@@ -387,7 +514,7 @@ def settings():
         accounts = db.get_user_email_accounts(user['id'])
         
         # 获取用户配置
-        user_configs = db.get_user_configs(user['id'])
+        user_configs = _cached_user_configs(user['id'])
         
         # 获取系统配置（仅管理员可见）
         system_configs = {}
@@ -533,25 +660,25 @@ def transfer_email_account(account_id):
 
 @app.route('/trigger', methods=['POST'])
 @auth_service.require_login
+@rate_limit(Config.TRIGGER_RATE_LIMIT, scope='trigger', key_func=_rate_limit_user_key)
 def trigger_processing():
     """手动触发邮件处理 - 智能选择Celery或线程模式"""
     user = auth_service.get_current_user()
     
-    # ⚠️ 首先检查用户是否配置了邮箱账户
-    user_accounts = db.get_user_email_accounts(user['id'])
-    if not user_accounts:
-        logger.warning(f"用户 {user['id']} ({user['username']}) 尝试收取邮件，但未配置邮箱账户")
-        return jsonify({
-            'success': False,
-            'message': '您还没有配置任何邮箱账户！',
-            'action': 'redirect',
-            'redirect_url': '/settings',
-            'prompt': '请先在设置页面添加您的邮箱账户，然后再进行邮件收取。'
-        }), 400
-    
-    # 检查是否有激活的账户
-    active_accounts = [acc for acc in user_accounts if acc.get('is_active', True)]
+    # ⚠️ 首先检查用户是否有激活的邮箱账户
+    active_accounts = db.get_user_email_accounts(user['id'], active_only=True)
     if not active_accounts:
+        # 仅在没有激活账户时再区分"未配置"和"全部停用"
+        if not db.get_user_email_accounts(user['id']):
+            logger.warning(f"用户 {user['id']} ({user['username']}) 尝试收取邮件，但未配置邮箱账户")
+            return jsonify({
+                'success': False,
+                'message': '您还没有配置任何邮箱账户！',
+                'action': 'redirect',
+                'redirect_url': '/settings',
+                'prompt': '请先在设置页面添加您的邮箱账户，然后再进行邮件收取。'
+            }), 400
+        
         logger.warning(f"用户 {user['id']} ({user['username']}) 的所有邮箱账户都已停用")
         return jsonify({
             'success': False,
@@ -565,15 +692,18 @@ def trigger_processing():
     
     # 尝试使用Celery（如果可用）
     try:
-        # 检查Celery是否可用
-        from services.celery_app import celery_app
-        from services.async_tasks import process_user_emails_async
+        # 检查Celery是否可用（结果缓存30秒，避免每次点击都广播ping）
+        if not _celery_available():
+            raise RuntimeError('Celery worker无响应')
         
-        # 尝试ping Celery
-        celery_app.control.inspect().ping()
+        from services.async_tasks import process_user_emails_async
         
         # Celery可用，提交异步任务
-        task = process_user_emails_async.delay(user['id'])
+        try:
+            task = process_user_emails_async.delay(user['id'])
+        except Exception:
+            _mark_celery_unavailable()
+            raise
         logger.info(f"✅ 用户 {user['id']} 使用Celery处理邮件,任务ID: {task.id}")
         
         return jsonify({
@@ -588,17 +718,21 @@ def trigger_processing():
         logger.warning(f"⚠️ Celery不可用: {celery_error}, 使用线程模式")
         
         try:
-            # 使用daemon线程处理（不阻塞主进程）
-            # 手动触发时传递is_manual_fetch=True
-            thread = threading.Thread(
-                target=process_user_emails, 
-                args=(user['id'], True),  # True表示手动收取
-                daemon=True,
-                name=f"EmailProcessing-User{user['id']}"
-            )
-            thread.start()
+            # 提交到共享线程池处理（不阻塞主进程）
+            with _user_futures_lock:
+                pending = _user_futures.get(user['id'])
+                if pending is not None and not pending.done():
+                    logger.info(f"用户 {user['id']} 已有邮件处理任务在进行中，忽略重复提交")
+                    return jsonify({
+                        'success': True,
+                        'message': '邮件处理正在进行中，请稍候',
+                        'use_celery': False
+                    })
+                
+                # 手动触发时传递is_manual_fetch=True
+                _user_futures[user['id']] = EMAIL_EXECUTOR.submit(process_user_emails, user['id'], True)
             
-            logger.info(f"✅ 用户 {user['id']} 使用线程处理邮件（手动触发）")
+            logger.info(f"✅ 用户 {user['id']} 使用线程池处理邮件（手动触发）")
             
             return jsonify({
                 'success': True,
@@ -692,6 +826,34 @@ def get_task_status(task_id):
             'error': str(e)
         }), 500
 
+@app.route('/api/jobs/<job_id>')
+@auth_service.require_login
+def get_job_status(job_id):
+    """查询后台任务状态和结果（只能查询自己提交的任务）"""
+    try:
+        user = auth_service.get_current_user()
+        job = job_queue.get(job_id)
+        
+        if not job or job.get('user_id') != user['id']:
+            return jsonify({'error': '任务不存在或已过期'}), 404
+        
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"查询后台任务状态失败: {e}")
+        return jsonify({'error': '查询任务状态失败'}), 500
+
+CACHE_STATS_TTL = 5  # 缓存统计信息的记忆时间（秒），监控探针高频访问时避免每次执行Redis INFO
+_cache_stats_memo = {'time': 0.0, 'value': None}
+
+def _cached_cache_stats() -> dict:
+    """获取缓存统计信息（5秒内复用上次结果）"""
+    now = time.monotonic()
+    if _cache_stats_memo['value'] is None or now - _cache_stats_memo['time'] >= CACHE_STATS_TTL:
+        _cache_stats_memo['value'] = cache_service.get_cache_stats()
+        _cache_stats_memo['time'] = now
+    return _cache_stats_memo['value']
+
 @app.route('/health')
 def health():
     """健康检查"""
@@ -700,9 +862,8 @@ def health():
         cache_status = cache_service.is_connected()
         
         # 获取性能信息
-        with processing_lock:
-            current_processing_count = len(current_processing_users)
-            processing_users_list = list(current_processing_users)
+        processing_users_list = processing_gate.current_users()
+        current_processing_count = len(processing_users_list)
         
         health_info = {
             'status': 'healthy' if db_status else 'unhealthy',
@@ -720,8 +881,7 @@ def health():
         
         # 添加缓存统计信息
         if cache_status:
-            cache_stats = cache_service.get_cache_stats()
-            health_info['cache_stats'] = cache_stats
+            health_info['cache_stats'] = _cached_cache_stats()
         
         return jsonify(health_info)
     except Exception as e:
@@ -736,9 +896,8 @@ def health():
 def system_performance():
     """系统性能监控（仅管理员）"""
     try:
-        with processing_lock:
-            current_processing_count = len(current_processing_users)
-            processing_users_list = list(current_processing_users)
+        processing_users_list = processing_gate.current_users()
+        current_processing_count = len(processing_users_list)
         
         # 获取调度器信息
         jobs_info = []
@@ -763,7 +922,8 @@ def system_performance():
             },
             'database': {
                 'connected': db.check_connection()
-            }
+            },
+            'cache_stats': _cached_cache_stats()
         })
         
     except Exception as e:
@@ -812,6 +972,8 @@ def api_stats():
         logger.error(f"获取统计信息时出错: {e}")
         return jsonify({'error': '获取统计信息失败'}), 500
 
+EMAIL_LIST_MAX_LIMIT = 500  # /api/emails 单次返回的最大邮件数
+
 @app.route('/api/emails')
 @auth_service.require_login
 def get_emails_list():
@@ -820,7 +982,7 @@ def get_emails_list():
         user = auth_service.get_current_user()
         
         # 获取查询参数
-        limit = request.args.get('limit', 100, type=int)
+        limit = max(1, min(request.args.get('limit', 100, type=int), EMAIL_LIST_MAX_LIMIT))
         offset = request.args.get('offset', 0, type=int)
         category = request.args.get('category', None)
         
@@ -843,12 +1005,25 @@ def get_emails_list():
                 sql += " AND category = ?"
                 params.append(category)
             
-            # 排序和分页
-            sql += " ORDER BY date DESC LIMIT ? OFFSET ?"
-            params.extend([limit, offset])
+            # 排序和分页：传入cursor时按 (date, id) 游标定位，不再跳过offset行
+            use_cursor = 'cursor' in request.args
+            if use_cursor:
+                after_cursor = decode_cursor(request.args.get('cursor'))
+                if after_cursor:
+                    sql += " AND (date, id) < (?, ?)"
+                    params.extend(after_cursor)
+                sql += " ORDER BY date DESC, id DESC LIMIT ?"
+                params.append(limit + 1)
+            else:
+                sql += " ORDER BY date DESC LIMIT ? OFFSET ?"
+                params.extend([limit, offset])
             
             cursor.execute(sql, params)
             rows = cursor.fetchall()
+            next_cursor = None
+            if use_cursor and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1]['date'], rows[-1]['id'])
             
             # 转换为字典列表
             emails = []
@@ -864,11 +1039,14 @@ def get_emails_list():
                     pass
                 emails.append(email)
             
-            return jsonify({
+            result = {
                 'success': True,
                 'emails': emails,
                 'total': len(emails)
-            })
+            }
+            if use_cursor:
+                result['next_cursor'] = next_cursor
+            return jsonify(result)
     
     except Exception as e:
         logger.error(f"获取邮件列表失败: {e}")
@@ -923,9 +1101,10 @@ def update_email_classification(email_id):
         if not email or email.get('user_id') != user_id:
             return jsonify({'success': False, 'error': '邮件不存在或无权限'}), 404
         
-        # 2. 更新邮件分类
+        # 2. 更新邮件分类并记录用户行为（同一事务，一次提交）
         with db.get_connection() as conn:
             cursor = conn.cursor()
+            now = datetime.now().isoformat()
             cursor.execute('''
                 UPDATE emails 
                 SET category = ?, importance = ?, 
@@ -933,14 +1112,12 @@ def update_email_classification(email_id):
                     updated_at = ?
                 WHERE id = ? AND user_id = ?
             ''', (new_category, new_importance, 
-                  datetime.now().isoformat(), 
+                  now, 
                   email_id, user_id))
-            conn.commit()
-        
-        # 3. 记录用户行为（关键步骤！用于智能学习）
-        try:
-            with db.get_connection() as conn:
-                cursor = conn.cursor()
+            
+            # 3. 记录用户行为（关键步骤！用于智能学习）
+            # 单条语句失败不会回滚同一事务中的UPDATE，历史记录失败仍提交分类修改
+            try:
                 cursor.execute('''
                     INSERT INTO manual_classification_history 
                     (user_id, email_id, original_category, new_category,
@@ -950,12 +1127,12 @@ def update_email_classification(email_id):
                 ''', (user_id, email_id, old_category, new_category,
                       old_importance, new_importance,
                       email['sender'], email['subject'],
-                      'manual_change', datetime.now().isoformat()))
-                conn.commit()
+                      'manual_change', now))
+                logger.info(f"用户 {user_id} 手动修改邮件 {email_id} 分类: {old_category} -> {new_category}")
+            except Exception as e:
+                logger.error(f"记录用户行为失败（非致命）: {e}")
             
-            logger.info(f"用户 {user_id} 手动修改邮件 {email_id} 分类: {old_category} -> {new_category}")
-        except Exception as e:
-            logger.error(f"记录用户行为失败（非致命）: {e}")
+            conn.commit()
         
         # 4. 检查是否需要触发智能建议生成（可选，后台执行）
         # 这里可以异步触发，不阻塞用户操作
@@ -973,12 +1150,13 @@ def update_email_classification(email_id):
         }), 500
 
 @app.route('/api/emails/<int:email_id>/reprocess', methods=['POST'])
+@rate_limit(Config.REPROCESS_RATE_LIMIT, scope='reprocess', key_func=_rate_limit_user_key)
 def reprocess_email(email_id):
     """重新处理邮件摘要"""
     try:
         email_detail = db.get_email_by_id(email_id)
         if not email_detail:
-            return jsonify({'error': '邮件不存在'}), 404
+            return _error_response('email_not_found')
         
         # 重新生成AI摘要
         ai_summary = ai_client.summarize_email(email_detail)
@@ -1003,21 +1181,30 @@ def translate_email_summary(email_id):
         email_detail = db.get_email_by_id(email_id)
         
         if not email_detail:
-            return jsonify({'error': '邮件不存在'}), 404
+            return _error_response('email_not_found')
         
         # 检查邮件是否属于当前用户
         if email_detail.get('user_id') != user['id']:
-            return jsonify({'error': '邮件不存在或您没有权限'}), 404
+            return _error_response('email_forbidden')
         
         # 检查翻译服务是否可用
         if not translation_service.is_translation_available():
-            return jsonify({'error': '翻译服务不可用，请检查GLM API配置'}), 503
+            return _error_response('translation_unavailable')
         
         # 获取当前摘要
         current_summary = email_detail.get('ai_summary') or email_detail.get('summary', '')
         
         if not current_summary:
-            return jsonify({'error': '邮件没有摘要可以翻译'}), 400
+            return _error_response('no_summary')
+        
+        # 已经是中文时直接返回，不调用GLM
+        if is_in_language(current_summary, 'chinese'):
+            return jsonify({
+                'success': True,
+                'message': '摘要已经是中文或无需翻译',
+                'summary': current_summary,
+                'translated': False
+            })
         
         # 翻译摘要
         translated_summary = translation_service.translate_to_chinese(current_summary)
@@ -1033,7 +1220,7 @@ def translate_email_summary(email_id):
         # 更新数据库中的摘要
         db.update_email_summary(email_id, translated_summary)
         
-        logger.info(f"邮件摘要翻译完成: {email_id}")
+        logger.info("邮件摘要翻译完成: %s", email_id)
         
         return jsonify({
             'success': True,
@@ -1044,9 +1231,154 @@ def translate_email_summary(email_id):
         })
         
     except Exception as e:
-        logger.error(f"翻译邮件摘要时出错: {e}")
+        logger.error("翻译邮件摘要时出错: %s", e)
         return jsonify({'error': '翻译失败'}), 500
 
+def _translate_email_summary_item(email_id: int, email_detail: dict,
+                                  translated_summary: str = None) -> dict:
+    """翻译单封邮件的摘要并保存，返回批量翻译接口中的单项结果（可传入已批量翻译好的摘要）"""
+    try:
+        if not email_detail:
+            return {
+                'email_id': email_id,
+                'success': False,
+                'error': '邮件不存在或没有权限'
+            }
+        
+        # 获取当前摘要
+        current_summary = email_detail.get('ai_summary') or email_detail.get('summary', '')
+        
+        if not current_summary:
+            return {
+                'email_id': email_id,
+                'success': False,
+                'error': '邮件没有摘要可以翻译'
+            }
+        
+        # 翻译摘要
+        if translated_summary is None:
+            translated_summary = translation_service.translate_to_chinese(current_summary)
+        
+        if translated_summary != current_summary:
+            # 更新数据库中的摘要
+            db.update_email_summary(email_id, translated_summary)
+            return {
+                'email_id': email_id,
+                'success': True,
+                'translated': True,
+                'summary': translated_summary
+            }
+        
+        return {
+            'email_id': email_id,
+            'success': True,
+            'translated': False,
+            'message': '摘要已经是中文或无需翻译'
+        }
+        
+    except Exception as e:
+        logger.error("翻译邮件 %s 摘要时出错: %s", email_id, e)
+        return {
+            'email_id': email_id,
+            'success': False,
+            'error': '翻译失败'
+        }
+
+def _translate_email_summary_chunk(email_ids: list, emails_by_id: dict) -> list:
+    """一组邮件的摘要合并为一次GLM请求翻译，返回各邮件的结果"""
+    summaries = {}
+    translated = {}
+    for email_id in email_ids:
+        email_detail = emails_by_id.get(email_id)
+        if email_detail:
+            current_summary = email_detail.get('ai_summary') or email_detail.get('summary', '')
+            if current_summary and is_in_language(current_summary, 'chinese'):
+                # 已经是中文的摘要不参与翻译，按"无需翻译"返回
+                translated[email_id] = current_summary
+            elif current_summary:
+                summaries[email_id] = current_summary
+    
+    if summaries:
+        try:
+            translated.update(zip(summaries, translation_service.translate_batch_to_chinese(list(summaries.values()))))
+        except Exception as e:
+            # 批量翻译出错时由单项处理逐条翻译
+            logger.error("批量翻译摘要失败: %s", e)
+    
+    return [
+        _translate_email_summary_item(email_id, emails_by_id.get(email_id), translated.get(email_id))
+        for email_id in email_ids
+    ]
+
+def _run_batch_translate(user_id: int, email_ids: list) -> dict:
+    """批量翻译任务：返回各邮件的翻译结果和统计"""
+    # 一次查询取出所有邮件（只包含当前用户的邮件）
+    emails_by_id = {email['id']: email for email in db.get_emails_by_ids(email_ids, user_id=user_id)}
+    
+    # 每组摘要合并为一次GLM请求，多组并发翻译（结果顺序与请求一致）
+    batch_size = Config.TRANSLATION_BATCH_SIZE
+    chunks = [email_ids[i:i + batch_size] for i in range(0, len(email_ids), batch_size)]
+    results = [
+        result
+        for chunk_results in _translation_pool.map(
+            lambda chunk: _translate_email_summary_chunk(chunk, emails_by_id), chunks
+        )
+        for result in chunk_results
+    ]
+    success_count = sum(1 for result in results if result['success'])
+    failed_count = len(results) - success_count
+    
+    logger.info("批量翻译完成: 成功 %s, 失败 %s", success_count, failed_count)
+    
+    return {
+        'success': True,
+        'message': f'批量翻译完成: 成功 {success_count}, 失败 {failed_count}',
+        'summary': {
+            'total': len(email_ids),
+            'success': success_count,
+            'failed': failed_count
+        },
+        'results': results
+    }
+
+def _ndjson_line(obj) -> str:
+    return app.json.dumps(obj) + '\n'
+
+def _stream_batch_translate(user_id: int, email_ids: list):
+    """批量翻译（NDJSON）：每封邮件完成后输出一行结果，最后输出 {"done": true, "summary": ...}"""
+    emails_by_id = {email['id']: email for email in db.get_emails_by_ids(email_ids, user_id=user_id)}
+    
+    batch_size = Config.TRANSLATION_BATCH_SIZE
+    futures = [
+        _translation_pool.submit(_translate_email_summary_chunk, email_ids[i:i + batch_size], emails_by_id)
+        for i in range(0, len(email_ids), batch_size)
+    ]
+    
+    success_count = 0
+    failed_count = 0
+    try:
+        for future in as_completed(futures):
+            for result in future.result():
+                if result['success']:
+                    success_count += 1
+                else:
+                    failed_count += 1
+                yield _ndjson_line(result)
+    finally:
+        # 客户端断开时取消尚未开始的分组
+        for future in futures:
+            future.cancel()
+    
+    logger.info("批量翻译完成: 成功 %s, 失败 %s", success_count, failed_count)
+    yield _ndjson_line({
+        'done': True,
+        'summary': {
+            'total': len(email_ids),
+            'success': success_count,
+            'failed': failed_count
+        }
+    })
+
 @app.route('/api/emails/batch-translate', methods=['POST'])
 @auth_service.require_login
 def batch_translate_email_summaries():
@@ -1061,83 +1393,27 @@ def batch_translate_email_summaries():
         
         # 检查翻译服务是否可用
         if not translation_service.is_translation_available():
-            return jsonify({'error': '翻译服务不可用，请检查GLM API配置'}), 503
+            return _error_response('translation_unavailable')
         
-        success_count = 0
-        failed_count = 0
-        results = []
-        
-        for email_id in email_ids:
-            try:
-                email_detail = db.get_email_by_id(email_id)
-                
-                if not email_detail or email_detail.get('user_id') != user['id']:
-                    failed_count += 1
-                    results.append({
-                        'email_id': email_id,
-                        'success': False,
-                        'error': '邮件不存在或没有权限'
-                    })
-                    continue
-                
-                # 获取当前摘要
-                current_summary = email_detail.get('ai_summary') or email_detail.get('summary', '')
-                
-                if not current_summary:
-                    failed_count += 1
-                    results.append({
-                        'email_id': email_id,
-                        'success': False,
-                        'error': '邮件没有摘要可以翻译'
-                    })
-                    continue
-                
-                # 翻译摘要
-                translated_summary = translation_service.translate_to_chinese(current_summary)
-                
-                if translated_summary != current_summary:
-                    # 更新数据库中的摘要
-                    db.update_email_summary(email_id, translated_summary)
-                    success_count += 1
-                    results.append({
-                        'email_id': email_id,
-                        'success': True,
-                        'translated': True,
-                        'summary': translated_summary
-                    })
-                else:
-                    success_count += 1
-                    results.append({
-                        'email_id': email_id,
-                        'success': True,
-                        'translated': False,
-                        'message': '摘要已经是中文或无需翻译'
-                    })
-                    
-            except Exception as e:
-                logger.error(f"翻译邮件 {email_id} 摘要时出错: {e}")
-                failed_count += 1
-                results.append({
-                    'email_id': email_id,
-                    'success': False,
-                    'error': '翻译失败'
-                })
+        # 客户端接受NDJSON时按完成顺序逐条流式返回结果
+        if 'application/x-ndjson' in request.headers.get('Accept', ''):
+            return Response(
+                stream_with_context(_stream_batch_translate(user['id'], email_ids)),
+                mimetype='application/x-ndjson'
+            )
         
-        logger.info(f"批量翻译完成: 成功 {success_count}, 失败 {failed_count}")
+        # 翻译耗时较长，提交到后台任务队列，立即返回任务ID
+        job_id = job_queue.submit('batch_translate', user['id'], _run_batch_translate, user['id'], email_ids)
         
         return jsonify({
             'success': True,
-            'message': f'批量翻译完成: 成功 {success_count}, 失败 {failed_count}',
-            'summary': {
-                'total': len(email_ids),
-                'success': success_count,
-                'failed': failed_count
-            },
-            'results': results
-        })
+            'message': f'批量翻译任务已提交，共 {len(email_ids)} 封邮件',
+            'job_id': job_id,
+            'status_url': url_for('get_job_status', job_id=job_id)
+        }), 202
         
     except Exception as e:
-        logger.error(f"批量翻译邮件摘要时出错: {e}")
+        logger.error("批量翻译邮件摘要时出错: %s", e)
         return jsonify({'error': '批量翻译失败'}), 500
 
 @app.route('/api/translate-text', methods=['POST'])
@@ -1153,10 +1429,13 @@ def translate_text():
         
         # 检查翻译服务是否可用
         if not translation_service.is_translation_available():
-            return jsonify({'error': '翻译服务不可用，请检查GLM API配置'}), 503
+            return _error_response('translation_unavailable')
         
-        # 翻译文本
-        translated_text = translation_service.translate_to_chinese(text)
+        # 已经是中文时不调用GLM
+        if is_in_language(text, 'chinese'):
+            translated_text = text
+        else:
+            translated_text = translation_service.translate_to_chinese(text)
         
         if translated_text == text:
             return jsonify({
@@ -1167,7 +1446,7 @@ def translate_text():
                 'translated': False
             })
         else:
-            logger.info(f"文本翻译完成: {len(text)} 字符")
+            logger.info("文本翻译完成: %s 字符", len(text))
             return jsonify({
                 'success': True,
                 'message': '文本翻译完成',
@@ -1177,9 +1456,57 @@ def translate_text():
             })
             
     except Exception as e:
-        logger.error(f"翻译文本时出错: {e}")
+        logger.error("翻译文本时出错: %s", e)
         return jsonify({'error': '翻译失败'}), 500
 
+def _stream_email_body_translation(email_id: int, email_detail: dict, target_language: str,
+                                   existing_translation: str = None):
+    """以NDJSON流式返回邮件正文翻译: 若干 {"delta": ...} 行，最后一行 {"done": true, ...}"""
+    if existing_translation:
+        def cached_lines():
+            yield _ndjson_line({'delta': existing_translation})
+            yield _ndjson_line({'done': True, 'translated': True, 'from_cache': True})
+        return Response(cached_lines(), mimetype='application/x-ndjson')
+    
+    if target_language == 'chinese':
+        stream_translate = translation_service.stream_smart_translate_to_chinese
+    elif target_language == 'english':
+        stream_translate = translation_service.stream_smart_translate_to_english
+    else:
+        return _error_response('unsupported_language')
+    
+    if not translation_service.is_translation_available():
+        return _error_response('translation_unavailable')
+    
+    email_body = email_detail.get('body', '')
+    if not email_body:
+        return _error_response('empty_body')
+    
+    def generate():
+        parts = []
+        try:
+            for delta in stream_translate(email_body):
+                parts.append(delta)
+                yield _ndjson_line({'delta': delta})
+        except Exception as e:
+            logger.error("流式翻译邮件正文时出错: %s", e)
+            yield _ndjson_line({'done': True, 'error': '翻译失败'})
+            return
+        
+        # 流结束后保存翻译结果
+        translated_body = ''.join(parts).strip()
+        translated = bool(translated_body) and translated_body != email_body
+        if translated:
+            if db.save_email_translation(email_id, target_language, translated_body):
+                logger.info("翻译结果已保存到数据库: email_id=%s, language=%s", email_id, target_language)
+            else:
+                logger.warning("翻译结果保存失败: email_id=%s, language=%s", email_id, target_language)
+        
+        logger.info("邮件正文流式翻译完成: %s, 目标语言: %s", email_id, target_language)
+        yield _ndjson_line({'done': True, 'translated': translated, 'from_cache': False})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/emails/<int:email_id>/translate-body', methods=['POST'])
 @auth_service.require_login
 def translate_email_body(email_id):
@@ -1193,17 +1520,34 @@ def translate_email_body(email_id):
         email_detail = db.get_email_by_id(email_id)
         
         if not email_detail:
-            return jsonify({'error': '邮件不存在'}), 404
+            return _error_response('email_not_found')
         
         # 检查邮件是否属于当前用户
         if email_detail.get('user_id') != user['id']:
-            return jsonify({'error': '邮件不存在或您没有权限'}), 404
+            return _error_response('email_forbidden')
         
         # 首先检查数据库中是否已有翻译结果
         existing_translation = db.get_email_translation(email_id, target_language)
         
+        # 客户端接受NDJSON时流式返回翻译内容
+        if 'application/x-ndjson' in request.headers.get('Accept', ''):
+            return _stream_email_body_translation(email_id, email_detail, target_language, existing_translation)
+        
+        # 正文已经是目标语言时直接返回，不调用GLM
+        email_body = email_detail.get('body', '')
+        if not existing_translation and email_body and is_in_language(email_body, target_language):
+            return jsonify({
+                'success': True,
+                'message': f'邮件正文已经是目标语言（{target_language}），无需翻译',
+                'original_body': email_body,
+                'translated_body': email_body,
+                'target_language': target_language,
+                'translated': False,
+                'from_cache': False
+            })
+        
         if existing_translation:
-            logger.info(f"使用数据库中的翻译结果: email_id={email_id}, language={target_language}")
+            logger.info("使用数据库中的翻译结果: email_id=%s, language=%s", email_id, target_language)
             return jsonify({
                 'success': True,
                 'message': f'邮件正文翻译完成（{target_language}）',
@@ -1216,13 +1560,13 @@ def translate_email_body(email_id):
         
         # 检查翻译服务是否可用
         if not translation_service.is_translation_available():
-            return jsonify({'error': '翻译服务不可用，请检查GLM API配置'}), 503
+            return _error_response('translation_unavailable')
         
         # 获取邮件正文
         email_body = email_detail.get('body', '')
         
         if not email_body:
-            return jsonify({'error': '邮件正文为空'}), 400
+            return _error_response('empty_body')
         
         # 根据目标语言进行翻译
         if target_language == 'chinese':
@@ -1230,17 +1574,17 @@ def translate_email_body(email_id):
         elif target_language == 'english':
             translated_body = translation_service.smart_translate_to_english(email_body)
         else:
-            return jsonify({'error': '不支持的目标语言'}), 400
+            return _error_response('unsupported_language')
         
         # 保存翻译结果到数据库
         if translated_body != email_body:
             save_success = db.save_email_translation(email_id, target_language, translated_body)
             if save_success:
-                logger.info(f"翻译结果已保存到数据库: email_id={email_id}, language={target_language}")
+                logger.info("翻译结果已保存到数据库: email_id=%s, language=%s", email_id, target_language)
             else:
-                logger.warning(f"翻译结果保存失败: email_id={email_id}, language={target_language}")
+                logger.warning("翻译结果保存失败: email_id=%s, language=%s", email_id, target_language)
         
-        logger.info(f"邮件正文翻译完成: {email_id}, 目标语言: {target_language}")
+        logger.info("邮件正文翻译完成: %s, 目标语言: %s", email_id, target_language)
         
         return jsonify({
             'success': True,
@@ -1253,7 +1597,7 @@ def translate_email_body(email_id):
         })
         
     except Exception as e:
-        logger.error(f"翻译邮件正文时出错: {e}")
+        logger.error("翻译邮件正文时出错: %s", e)
         return jsonify({'error': '翻译失败'}), 500
 
 @app.route('/api/emails/<int:email_id>/clear-translations', methods=['POST'])
@@ -1267,17 +1611,18 @@ def clear_email_translations(email_id):
         email_detail = db.get_email_by_id(email_id)
         
         if not email_detail:
-            return jsonify({'error': '邮件不存在'}), 404
+            return _error_response('email_not_found')
         
         # 检查邮件是否属于当前用户
         if email_detail.get('user_id') != user['id']:
-            return jsonify({'error': '邮件不存在或您没有权限'}), 404
+            return _error_response('email_forbidden')
         
-        # 清除翻译结果
+        # 清除翻译结果（同时清除正文的翻译缓存，下次翻译会重新调用GLM）
         success = db.clear_email_translations(email_id)
+        translation_service.invalidate_cached_translation(email_detail.get('body', ''))
         
         if success:
-            logger.info(f"邮件翻译已清除: email_id={email_id}, user_id={user['id']}")
+            logger.info("邮件翻译已清除: email_id=%s, user_id=%s", email_id, user['id'])
             return jsonify({
                 'success': True,
                 'message': '翻译结果已清除'
@@ -1286,9 +1631,21 @@ def clear_email_translations(email_id):
             return jsonify({'error': '清除翻译失败'}), 500
         
     except Exception as e:
-        logger.error(f"清除邮件翻译时出错: {e}")
+        logger.error("清除邮件翻译时出错: %s", e)
         return jsonify({'error': '清除翻译失败'}), 500
 
+# 打包下载文件名中只保留文字、数字、空格、横线和下划线
+SAFE_SUBJECT_RE = re.compile(r'[^\w \-]')
+
+def _attachment_disposition(filename: str) -> str:
+    """生成附件下载的Content-Disposition（非ASCII文件名使用RFC 5987编码）"""
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        ascii_name = filename.encode('ascii', 'ignore').decode('ascii').strip() or 'download'
+        return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
 @app.route('/api/emails/<int:email_id>/attachments/<path:attachment_filename>')
 @auth_service.require_login
 def download_attachment(email_id, attachment_filename):
@@ -1303,27 +1660,24 @@ def download_attachment(email_id, attachment_filename):
         # 获取邮件详情
         email_detail = db.get_email_by_id(email_id)
         if not email_detail:
-            return jsonify({'error': '邮件不存在'}), 404
+            return _error_response('email_not_found')
         
         # 检查邮件是否属于当前用户
         if email_detail.get('user_id') != user['id']:
-            return jsonify({'error': '邮件不存在或您没有权限'}), 404
+            return _error_response('email_forbidden')
         
         # 获取附件列表
         attachments = email_detail.get('attachments', [])
         if not attachments:
-            return jsonify({'error': '该邮件没有附件'}), 404
+            return _error_response('no_attachments')
         
-        # 查找指定的附件
-        target_attachment = None
-        for attachment in attachments:
-            if attachment.get('stored_filename') == decoded_filename:
-                target_attachment = attachment
-                break
+        # 按存储文件名查找指定的附件
+        attachments_by_stored = {a.get('stored_filename'): a for a in attachments}
+        target_attachment = attachments_by_stored.get(decoded_filename)
         
         if not target_attachment:
-            logger.error(f"附件不存在: {decoded_filename}, 可用附件: {[a.get('stored_filename') for a in attachments]}")
-            return jsonify({'error': '附件不存在'}), 404
+            logger.error("附件不存在: %s, 可用附件: %s", decoded_filename, list(attachments_by_stored))
+            return _error_response('attachment_not_found')
         
         # 构建附件文件路径
         user_attachment_dir = os.path.join('email_attachments', f'user_{user["id"]}')
@@ -1331,19 +1685,31 @@ def download_attachment(email_id, attachment_filename):
         
         # 检查文件是否存在
         if not os.path.exists(file_path):
-            logger.error(f"附件文件不存在: {file_path}")
-            return jsonify({'error': '附件文件不存在'}), 404
+            logger.error("附件文件不存在: %s", file_path)
+            return _error_response('attachment_file_missing')
+        
+        download_name = target_attachment.get('original_filename', decoded_filename)
+        mimetype = target_attachment.get('content_type', 'application/octet-stream')
+        
+        # 部署在nginx后面时交给nginx用sendfile发送，应用只返回响应头
+        if Config.ATTACHMENT_ACCEL_REDIRECT_PREFIX:
+            response = Response(mimetype=mimetype)
+            response.headers['Content-Disposition'] = _attachment_disposition(download_name)
+            response.headers['X-Accel-Redirect'] = (
+                f"{Config.ATTACHMENT_ACCEL_REDIRECT_PREFIX}/user_{user['id']}/{quote(decoded_filename)}"
+            )
+            return response
         
-        # 发送文件
+        # 发送文件（WSGI服务器提供 wsgi.file_wrapper 时由其零拷贝发送）
         return send_file(
             file_path,
             as_attachment=True,
-            download_name=target_attachment.get('original_filename', decoded_filename),
-            mimetype=target_attachment.get('content_type', 'application/octet-stream')
+            download_name=download_name,
+            mimetype=mimetype
         )
         
     except Exception as e:
-        logger.error(f"下载附件时出错: {e}")
+        logger.error("下载附件时出错: %s", e)
         return jsonify({'error': '下载附件失败'}), 500
 
 @app.route('/api/emails/<int:email_id>/attachments/download-all')
@@ -1356,96 +1722,58 @@ def download_all_attachments(email_id):
         # 获取邮件详情
         email_detail = db.get_email_by_id(email_id)
         if not email_detail:
-            return jsonify({'error': '邮件不存在'}), 404
+            return _error_response('email_not_found')
         
         # 检查邮件是否属于当前用户
         if email_detail.get('user_id') != user['id']:
-            return jsonify({'error': '邮件不存在或您没有权限'}), 404
+            return _error_response('email_forbidden')
         
         # 获取附件列表
         attachments = email_detail.get('attachments', [])
         if not attachments:
-            return jsonify({'error': '该邮件没有附件'}), 404
+            return _error_response('no_attachments')
         
         # 构建用户附件目录路径
         user_attachment_dir = os.path.join('email_attachments', f'user_{user["id"]}')
         
-        # 创建临时ZIP文件
-        temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-        temp_zip.close()
-        
-        try:
-            with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                added_files = 0
-                
-                for attachment in attachments:
-                    stored_filename = attachment.get('stored_filename')
-                    original_filename = attachment.get('original_filename', stored_filename)
-                    
-                    if not stored_filename:
-                        continue
-                    
-                    file_path = os.path.join(user_attachment_dir, stored_filename)
-                    
-                    # 检查文件是否存在
-                    if os.path.exists(file_path):
-                        # 添加文件到ZIP，使用原始文件名
-                        zipf.write(file_path, original_filename)
-                        added_files += 1
-                        logger.info(f"添加附件到ZIP: {original_filename}")
-                    else:
-                        logger.warning(f"附件文件不存在: {file_path}")
-                
-                if added_files == 0:
-                    os.unlink(temp_zip.name)
-                    return jsonify({'error': '没有可用的附件文件'}), 404
-            
-            # 生成下载文件名
-            email_subject = email_detail.get('subject', 'Unknown')[:50]  # 限制长度
-            # 清理文件名中的特殊字符
-            safe_subject = "".join(c for c in email_subject if c.isalnum() or c in (' ', '-', '_')).strip()
-            download_filename = f"邮件附件_{safe_subject}_{email_id}.zip"
-            
-            # 发送ZIP文件
-            logger.info(f"批量下载附件: 邮件ID={email_id}, 文件数={added_files}")
-            
-            # 使用Flask的send_file直接发送，让操作系统处理临时文件清理
-            # 或者使用定时清理机制
-            response = send_file(
-                temp_zip.name,
-                as_attachment=True,
-                download_name=download_filename,
-                mimetype='application/zip'
-            )
-            
-            # 延迟删除临时文件（给下载一些时间）
-            import threading
-            def delayed_cleanup():
-                import time
-                time.sleep(10)  # 等待10秒让下载完成
-                try:
-                    os.unlink(temp_zip.name)
-                    logger.debug(f"清理临时ZIP文件: {temp_zip.name}")
-                except:
-                    pass
+        # 先确认要打包的附件文件
+        zip_entries = []
+        for attachment in attachments:
+            stored_filename = attachment.get('stored_filename')
+            original_filename = attachment.get('original_filename', stored_filename)
             
-            # 在后台线程中清理
-            cleanup_thread = threading.Thread(target=delayed_cleanup)
-            cleanup_thread.daemon = True
-            cleanup_thread.start()
+            if not stored_filename:
+                continue
             
-            return response
+            file_path = os.path.join(user_attachment_dir, stored_filename)
             
-        except Exception as e:
-            # 清理临时文件
-            try:
-                os.unlink(temp_zip.name)
-            except:
-                pass
-            raise e
+            # 检查文件是否存在
+            if os.path.exists(file_path):
+                # 使用原始文件名打包
+                zip_entries.append((file_path, original_filename, attachment.get('content_type')))
+            else:
+                logger.warning("附件文件不存在: %s", file_path)
+        
+        if not zip_entries:
+            return jsonify({'error': '没有可用的附件文件'}), 404
+        
+        # 生成下载文件名
+        email_subject = email_detail.get('subject', 'Unknown')[:50]  # 限制长度
+        # 清理文件名中的特殊字符
+        safe_subject = SAFE_SUBJECT_RE.sub('', email_subject).strip()
+        download_filename = f"邮件附件_{safe_subject}_{email_id}.zip"
+        
+        logger.info("批量下载附件: 邮件ID=%s, 文件数=%s", email_id, len(zip_entries))
+        
+        # 边压缩边发送，不生成临时文件
+        return Response(
+            stream_with_context(stream_zip(zip_entries)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': _attachment_disposition(download_filename)}
+        )
         
     except Exception as e:
-        logger.error(f"批量下载附件时出错: {e}")
+        logger.error("批量下载附件时出错: %s", e)
         return jsonify({'error': '批量下载失败'}), 500
 
 @app.route('/api/user/stats')
@@ -1529,7 +1857,7 @@ def handle_user_config():
         # 获取用户配置
         try:
             user = auth_service.get_current_user()
-            configs = db.get_user_configs(user['id'])
+            configs = _cached_user_configs(user['id'])
             
             # 添加调度状态信息
             schedule_status = scheduler_manager.get_user_schedule_status(user['id'])
@@ -1543,39 +1871,55 @@ def handle_user_config():
     else:  # POST
         return save_user_config()
 
+# 调度相关配置项（修改后需要重建用户的定时任务）
+SCHEDULE_CONFIG_KEYS = frozenset({
+    'check_interval_minutes',
+    'schedule_type',
+    'cron_hours',
+    'cron_minutes',
+    'custom_rule',
+    'custom_minute',
+    'n_hours',
+})
+
+# 用户可配置的项目
+ALLOWED_USER_CONFIGS = frozenset({
+    'max_emails_per_account',
+    'email_body_max_length',
+    'email_subject_max_length',
+    'check_days_back',
+    'duplicate_check_days',
+}) | SCHEDULE_CONFIG_KEYS
+
+# GLM限流配置项（修改后立即生效）
+GLM_LIMIT_CONFIGS = frozenset({'glm_rpm_limit', 'glm_tpm_limit'})
+
+# 系统级配置项目
+ALLOWED_SYSTEM_CONFIGS = frozenset({
+    'ai_provider',
+    'glm_api_key',
+    'glm_model',
+    'openai_api_key',
+    'openai_model',
+    'summary_max_length',
+    'summary_temperature',
+}) | GLM_LIMIT_CONFIGS
+
 def save_user_config():
     """保存用户配置"""
     try:
         user = auth_service.get_current_user()
         data = request.get_json()
         
-        # 用户可配置的项目
-        allowed_user_configs = [
-            'check_interval_minutes',
-            'max_emails_per_account',
-            'email_body_max_length',
-            'email_subject_max_length',
-            'check_days_back',
-            'duplicate_check_days',
-            # 新增调度配置项
-            'schedule_type',
-            'cron_hours',
-            'cron_minutes',
-            'custom_rule',
-            'custom_minute',
-            'n_hours'
-        ]
+        # 只保存允许用户修改的配置项，一个事务写入
+        items = {key: str(value) for key, value in data.items() if key in ALLOWED_USER_CONFIGS}
+        saved_count = db.set_user_configs_bulk(user['id'], items)
         
-        saved_count = 0
-        schedule_config_updated = False
+        # 检查是否更新了调度相关配置
+        schedule_config_updated = bool(saved_count) and not SCHEDULE_CONFIG_KEYS.isdisjoint(items)
         
-        for key, value in data.items():
-            if key in allowed_user_configs:
-                if db.set_user_config(user['id'], key, str(value)):
-                    saved_count += 1
-                    # 检查是否更新了调度相关配置
-                    if key in ['check_interval_minutes', 'schedule_type', 'cron_hours', 'cron_minutes', 'custom_rule', 'custom_minute', 'n_hours']:
-                        schedule_config_updated = True
+        if saved_count:
+            _invalidate_user_configs(user['id'])
         
         # 如果调度配置被更新，重新创建用户的定时任务
         if schedule_config_updated:
@@ -1599,22 +1943,12 @@ def save_system_config():
     try:
         data = request.get_json()
         
-        # 系统级配置项目
-        allowed_system_configs = [
-            'ai_provider',
-            'glm_api_key',
-            'glm_model',
-            'openai_api_key', 
-            'openai_model',
-            'summary_max_length',
-            'summary_temperature'
-        ]
+        items = {key: str(value) for key, value in data.items() if key in ALLOWED_SYSTEM_CONFIGS}
+        saved_count = db.set_system_configs_bulk(items)
         
-        saved_count = 0
-        for key, value in data.items():
-            if key in allowed_system_configs:
-                if db.set_system_config(key, str(value)):
-                    saved_count += 1
+        # 限流配置立即生效
+        if not GLM_LIMIT_CONFIGS.isdisjoint(data):
+            load_glm_limits(db)
         
         return jsonify({'success': True, 'message': f'保存了 {saved_count} 项系统配置'})
         
@@ -1756,14 +2090,8 @@ def refresh_account_stats():
         user = auth_service.get_current_user()
         user_accounts = db.get_user_email_accounts(user['id'])
         
-        updated_count = 0
-        for account in user_accounts:
-            # 计算该邮箱的邮件数量
-            email_count = db.get_account_email_count(user['id'], account['email'])
-            
-            # 更新统计信息
-            if db.update_email_account_stats(user['id'], account['email'], email_count):
-                updated_count += 1
+        # 一次分组统计所有邮箱的邮件数量，一次批量更新
+        updated_count = db.bulk_update_account_stats(user['id'], user_accounts)
         
         return jsonify({
             'success': True, 
@@ -1834,19 +2162,11 @@ def batch_delete_emails():
         if not email_ids:
             return jsonify({'error': '请选择要删除的邮件'}), 400
         
-        success_count = 0
-        for email_id in email_ids:
-            try:
-                if delete_type == 'purge':
-                    success = db.purge_email(email_id, user['id'])
-                else:
-                    success = db.soft_delete_email(email_id, user['id'])
-                
-                if success:
-                    success_count += 1
-            except Exception as e:
-                logger.error(f"批量删除邮件 {email_id} 失败: {e}")
-                continue
+        # 单条语句批量删除（限定当前用户的邮件）
+        if delete_type == 'purge':
+            success_count = db.bulk_purge(email_ids, user['id'])
+        else:
+            success_count = db.bulk_soft_delete(email_ids, user['id'])
         
         message = f"成功删除 {success_count}/{len(email_ids)} 封邮件"
         return jsonify({'success': True, 'message': message, 'deleted_count': success_count})
@@ -1882,6 +2202,10 @@ def restore_email(email_id):
         logger.error(f"恢复邮件时出错: {e}")
         return jsonify({'error': '恢复失败'}), 500
 
+# 回收站筛选选项
+RECYCLE_BIN_CATEGORIES = ('工作', '财务', '社交', '购物', '资讯', '通知', '其他')
+RECYCLE_BIN_PROVIDERS = ('Gmail', '126', '163', 'QQ', 'Hotmail', 'Yahoo', 'Outlook')
+
 @app.route('/recycle_bin')
 @auth_service.require_login
 def recycle_bin():
@@ -1890,12 +2214,16 @@ def recycle_bin():
         user = auth_service.get_current_user()
         
         # 获取筛选参数
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        search = request.args.get('search', '').strip()
-        category = request.args.get('category', '').strip()
-        provider = request.args.get('provider', '').strip()
-        processed = request.args.get('processed', '').strip()
+        args = request.args
+        page = max(args.get('page', 1, type=int), 1)
+        per_page = args.get('per_page', 20, type=int)
+        # 限制在有效范围内，避免超大分页放大OFFSET查询开销
+        if per_page not in [10, 20, 30, 50, 100]:
+            per_page = 20
+        search = args.get('search', '').strip()
+        category = args.get('category', '').strip()
+        provider = args.get('provider', '').strip()
+        processed = args.get('processed', '').strip()
         
         # 获取已删除邮件列表
         emails, total = db.get_user_deleted_emails_filtered(
@@ -1907,10 +2235,6 @@ def recycle_bin():
         has_prev = page > 1
         has_next = page < total_pages
         
-        # 获取筛选选项
-        categories = ['工作', '财务', '社交', '购物', '资讯', '通知', '其他']
-        providers = ['Gmail', '126', '163', 'QQ', 'Hotmail', 'Yahoo', 'Outlook']
-        
         return render_template('recycle_bin.html',
                              emails=emails,
                              total=total,
@@ -1923,8 +2247,8 @@ def recycle_bin():
                              category=category,
                              provider=provider,
                              processed=processed,
-                             categories=categories,
-                             providers=providers)
+                             categories=RECYCLE_BIN_CATEGORIES,
+                             providers=RECYCLE_BIN_PROVIDERS)
         
     except Exception as e:
         logger.error(f"获取回收站页面时出错: {e}")
@@ -1953,6 +2277,18 @@ def login():
     
     return render_template('auth/login.html')
 
+def _create_new_user_schedule(user_id: int):
+    """为新注册用户创建默认定时任务"""
+    try:
+        check_interval = Config.CHECK_INTERVAL_MINUTES
+        scheduler_manager.create_user_schedule(user_id, {
+            'type': EmailSchedulerManager.SCHEDULE_TYPE_INTERVAL,
+            'interval_minutes': check_interval
+        })
+        logger.info(f"已为新用户 {user_id} 创建定时任务: {check_interval} 分钟")
+    except Exception as e:
+        logger.error(f"为新用户 {user_id} 创建定时任务失败: {e}")
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     """用户注册"""
@@ -1974,13 +2310,8 @@ def register():
         
         success, message, user_id = auth_service.register_user(username, email, password, full_name)
         if success and user_id:
-            # 为新用户创建默认定时任务
-            try:
-                check_interval = Config.CHECK_INTERVAL_MINUTES
-                scheduler_manager.create_user_schedule(user_id, check_interval)
-                logger.info(f"已为新用户 {user_id} 创建定时任务: {check_interval} 分钟")
-            except Exception as e:
-                logger.error(f"为新用户 {user_id} 创建定时任务失败: {e}")
+            # 为新用户创建默认定时任务（后台执行，注册立即返回）
+            _schedule_pool.submit(_create_new_user_schedule, user_id)
             
             flash('注册成功，请登录', 'success')
             return redirect(url_for('login'))
@@ -2054,42 +2385,47 @@ def init_system():
         # 清理过期会话
         auth_service.cleanup_sessions()
         
-        # 检查是否有管理员账户，如果没有则创建默认管理员
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) as count FROM users WHERE is_admin = 1')
-            admin_count = cursor.fetchone()['count']
-            
-            if admin_count == 0:
-                # 创建默认管理员账户
-                admin_password = "admin123"  # 生产环境应该使用更强的密码
-                password_hash = auth_service.hash_password(admin_password)
+        # 默认管理员只在首次启动时创建，之后通过标记跳过检查
+        if db.get_system_config('bootstrap_done') != '1':
+            with db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT 1 FROM users WHERE is_admin = 1 LIMIT 1')
                 
-                cursor.execute('''
-                    INSERT INTO users (username, email, password_hash, full_name, is_admin)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', ("admin", "admin@email.wyg.life", password_hash, "系统管理员", True))
+                if cursor.fetchone() is None:
+                    # 创建默认管理员账户
+                    admin_password = "admin123"  # 生产环境应该使用更强的密码
+                    password_hash = auth_service.hash_password(admin_password)
+                    
+                    cursor.execute('''
+                        INSERT INTO users (username, email, password_hash, full_name, is_admin)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', ("admin", "admin@email.wyg.life", password_hash, "系统管理员", True))
+                    logger.info("创建默认管理员账户: admin / admin123")
                 
+                cursor.execute('''
+                    INSERT OR REPLACE INTO system_config (key, value, updated_at)
+                    VALUES ('bootstrap_done', '1', ?)
+                ''', (datetime.now().isoformat(),))
                 conn.commit()
-                logger.info("创建默认管理员账户: admin / admin123")
         
-        # 初始化系统配置
+        # 初始化系统配置（一次查询取出已有配置，只写入缺失的默认值）
         try:
+            defaults = {
+                'ai_provider': Config.AI_PROVIDER,
+                'glm_model': Config.GLM_MODEL,
+                'summary_max_length': str(Config.SUMMARY_MAX_LENGTH),
+                'summary_temperature': str(Config.SUMMARY_TEMPERATURE),
+            }
             # 如果环境变量中有GLM API密钥，保存到数据库
             if Config.GLM_API_KEY and Config.GLM_API_KEY != 'your_glm_api_key_here':
-                if not db.get_system_config('glm_api_key'):
-                    db.set_system_config('glm_api_key', Config.GLM_API_KEY)
-                    logger.info("GLM API密钥已保存到数据库")
+                defaults['glm_api_key'] = Config.GLM_API_KEY
             
-            # 设置其他默认系统配置
-            if not db.get_system_config('ai_provider'):
-                db.set_system_config('ai_provider', Config.AI_PROVIDER)
-            if not db.get_system_config('glm_model'):
-                db.set_system_config('glm_model', Config.GLM_MODEL)
-            if not db.get_system_config('summary_max_length'):
-                db.set_system_config('summary_max_length', str(Config.SUMMARY_MAX_LENGTH))
-            if not db.get_system_config('summary_temperature'):
-                db.set_system_config('summary_temperature', str(Config.SUMMARY_TEMPERATURE))
+            existing = db.get_system_configs(list(defaults))
+            missing = {key: value for key, value in defaults.items() if not existing.get(key)}
+            if missing:
+                db.set_system_configs_bulk(missing)
+                if 'glm_api_key' in missing:
+                    logger.info("GLM API密钥已保存到数据库")
                 
         except Exception as e:
             logger.error(f"初始化系统配置失败: {e}")
@@ -2122,7 +2458,7 @@ def start_scheduler():
             
             # 添加旧通知清理任务
             scheduler.add_job(
-                func=lambda: db.clear_old_notifications(days=30),
+                func=partial(db.clear_old_notifications, days=30),
                 trigger="cron",
                 hour=3,  # 每天凌晨3点执行
                 minute=0,
@@ -2136,20 +2472,8 @@ def start_scheduler():
             
             # 为所有活跃用户创建个性化定时任务
             try:
-                with db.get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT id FROM users WHERE is_active = 1')
-                    user_ids = [row['id'] for row in cursor.fetchall()]
-                
-                for user_id in user_ids:
-                    try:
-                        # 获取用户的调度配置
-                        schedule_config = scheduler_manager._get_user_schedule_config(user_id, db)
-                        
-                        # 为用户创建定时任务
-                        scheduler_manager.create_user_schedule(user_id, schedule_config)
-                    except Exception as e:
-                        logger.error(f"为用户 {user_id} 创建定时任务失败: {e}")
+                user_ids = db.get_active_user_ids()
+                scheduler_manager.create_user_schedules(user_ids, db)
                         
             except Exception as e:
                 logger.error(f"初始化用户定时任务失败: {e}")
@@ -2157,23 +2481,74 @@ def start_scheduler():
         except Exception as e:
             logger.error(f"启动定时任务失败: {e}")
 
+# 未登录访客的错误页只与错误码和当前端点有关（爬虫扫描大量404时），渲染一次后复用
+_error_page_cache = {}
+
+def _render_error_page(error_code: int, error_message: str):
+    """渲染错误页；未登录且没有待显示的flash消息时使用预渲染结果"""
+    if 'user_id' in session or session.get('_flashes'):
+        return render_template('error.html', error_code=error_code, error_message=error_message), error_code
+    
+    cache_key = (error_code, request.endpoint)
+    html = _error_page_cache.get(cache_key)
+    if html is None:
+        html = render_template('error.html', error_code=error_code, error_message=error_message)
+        _error_page_cache[cache_key] = html
+    return app.response_class(html, status=error_code, mimetype='text/html')
+
 @app.errorhandler(404)
 def not_found(error):
-    return render_template('error.html', error_code=404, error_message='页面未找到'), 404
+    return _render_error_page(404, '页面未找到')
 
 @app.errorhandler(500)
 def internal_error(error):
-    return render_template('error.html', error_code=500, error_message='服务器内部错误'), 500
+    return _render_error_page(500, '服务器内部错误')
 
 # ==================== 缓存管理API ====================
 
+def _private_cache(max_age: int = 10):
+    """
+    只读接口的HTTP缓存：浏览器在max_age秒内直接复用响应，
+    之后带If-None-Match请求，内容未变时返回304
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response.cache_control.private = True
+                response.cache_control.max_age = max_age
+                response.add_etag()
+                response.make_conditional(request)
+            return response
+        return decorated_function
+    return decorator
+
+# 健康检查需要遍历Redis键空间，结果在进程内缓存30秒
+_cache_health_memo = TTLCache(maxsize=2, ttl=30)
+
 @app.route('/api/cache/health')
-@auth_service.require_admin
+@auth_service.require_login
+@_private_cache()
 def cache_health():
-    """缓存健康检查（仅管理员）"""
+    """缓存健康检查（管理员返回详细状态，普通用户返回健康报告）"""
     try:
-        health_info = cache_manager.get_cache_health()
-        return jsonify(health_info)
+        user = auth_service.get_current_user()
+        if user.get('is_admin'):
+            health_info = _cache_health_memo.get('admin')
+            if health_info is None:
+                health_info = cache_manager.get_cache_health()
+                _cache_health_memo.set('admin', health_info)
+            return jsonify(health_info)
+        
+        health_report = _cache_health_memo.get('report')
+        if health_report is None:
+            health_report = auto_cache_cleaner.get_cache_health_report()
+            _cache_health_memo.set('report', health_report)
+        return jsonify({
+            'success': True,
+            'health': health_report
+        })
     except Exception as e:
         logger.error(f"缓存健康检查失败: {e}")
         return jsonify({
@@ -2211,6 +2586,7 @@ def clear_user_cache(user_id):
 
 @app.route('/api/cache/keys')
 @auth_service.require_admin
+@_private_cache()
 def get_cache_keys():
     """获取缓存键信息（仅管理员）"""
     try:
@@ -2226,6 +2602,7 @@ def get_cache_keys():
 
 @app.route('/api/cache/optimize')
 @auth_service.require_admin
+@_private_cache()
 def cache_optimization():
     """缓存优化建议（仅管理员）"""
     try:
@@ -2260,6 +2637,7 @@ def clear_my_cache():
 # 新的缓存管理API端点
 @app.route('/api/cache/stats')
 @auth_service.require_login
+@_private_cache()
 def get_cache_stats():
     """获取缓存统计信息"""
     try:
@@ -2269,18 +2647,15 @@ def get_cache_stats():
                 'error': 'Redis缓存未连接'
             })
         
-        # 获取各类缓存的数量
-        email_keys = cache_service.redis_client.keys('emails:*')
-        stats_keys = cache_service.redis_client.keys('stats:*')
-        digest_keys = cache_service.redis_client.keys('digests:*')
-        config_keys = cache_service.redis_client.keys('config:*')
+        # 获取各类缓存的数量（一次SCAN遍历统计所有前缀）
+        counts = cache_service.count_keys_by_prefix(['emails:', 'stats:', 'digests:', 'config:'])
         
         stats = {
-            'email_cache': len(email_keys),
-            'stats_cache': len(stats_keys),
-            'digest_cache': len(digest_keys),
-            'config_cache': len(config_keys),
-            'total_cache': len(email_keys) + len(stats_keys) + len(digest_keys) + len(config_keys)
+            'email_cache': counts['emails:'],
+            'stats_cache': counts['stats:'],
+            'digest_cache': counts['digests:'],
+            'config_cache': counts['config:'],
+            'total_cache': sum(counts.values())
         }
         
         return jsonify({
@@ -2322,10 +2697,7 @@ def clear_user_cache_api():
             f'config:user:{user_id}:*'
         ]
         
-        total_cleared = 0
-        for pattern in patterns:
-            cleared = cache_service.delete_pattern(pattern)
-            total_cleared += cleared
+        total_cleared = cache_service.delete_patterns(patterns)
         
         logger.info(f"用户 {user_id} 缓存清理完成，清除了 {total_cleared} 个缓存项")
         
@@ -2370,10 +2742,7 @@ def clear_all_cache_api():
         # 清理所有应用相关缓存
         patterns = ['emails:*', 'stats:*', 'digests:*', 'config:*']
         
-        total_cleared = 0
-        for pattern in patterns:
-            cleared = cache_service.delete_pattern(pattern)
-            total_cleared += cleared
+        total_cleared = cache_service.delete_patterns(patterns)
         
         logger.info(f"管理员 {user['id']} 执行全局缓存清理，清除了 {total_cleared} 个缓存项")
         
@@ -2390,23 +2759,6 @@ def clear_all_cache_api():
             'error': f'清理所有缓存失败: {str(e)}'
         })
 
-@app.route('/api/cache/health')
-@auth_service.require_login
-def get_cache_health():
-    """获取缓存健康报告"""
-    try:
-        health_report = auto_cache_cleaner.get_cache_health_report()
-        return jsonify({
-            'success': True,
-            'health': health_report
-        })
-    except Exception as e:
-        logger.error(f"获取缓存健康报告失败: {e}")
-        return jsonify({
-            'success': False,
-            'error': f'获取缓存健康报告失败: {str(e)}'
-        })
-
 @app.route('/api/cache/cleanup/manual', methods=['POST'])
 @auth_service.require_login
 def manual_cache_cleanup():
@@ -2479,10 +2831,21 @@ def get_notifications():
     """获取用户通知列表"""
     try:
         user = auth_service.get_current_user()
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page = max(1, request.args.get('page', 1, type=int))
+        per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
         
+        # 传入cursor时走游标分页，不再计算总数
+        if 'cursor' in request.args:
+            notifications, next_cursor = db.get_user_notifications_after(
+                user['id'], decode_cursor(request.args.get('cursor')), per_page, unread_only
+            )
+            return jsonify({
+                'success': True,
+                'notifications': notifications,
+                'next_cursor': encode_cursor(*next_cursor) if next_cursor else None
+            })
+        
         notifications, total = db.get_user_notifications(user['id'], page, per_page, unread_only)
         
         return jsonify({
@@ -2601,6 +2964,26 @@ def delete_notification_api(notification_id):
             'message': f'删除失败: {str(e)}'
         }), 500
 
+def _stream_sent_emails(first_row, rows, per_page: int):
+    """逐行输出已发送邮件列表JSON，不在内存中拼出完整列表"""
+    last_row = None
+    has_next = False
+    count = 0
+    try:
+        yield '{"success":true,"emails":['
+        if first_row is not None:
+            for row in chain((first_row,), rows):
+                if count == per_page:
+                    has_next = True
+                    break
+                yield (',' if count else '') + app.json.dumps(row)
+                last_row = row
+                count += 1
+    finally:
+        rows.close()  # 提前结束或客户端断开时归还数据库连接
+    next_cursor = encode_cursor(last_row['sent_at'], last_row['id']) if has_next else None
+    yield '],"next_cursor":' + app.json.dumps(next_cursor) + '}\n'
+
 @app.route('/api/user/sent-emails')
 @auth_service.require_login
 def get_sent_emails():
@@ -2608,27 +2991,18 @@ def get_sent_emails():
     try:
         user = auth_service.get_current_user()
         
-        # 从数据库获取已发送邮件
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, to_addresses, cc_addresses, bcc_addresses, subject, 
-                       body, sent_at, created_at
-                FROM sent_emails 
-                WHERE user_id = ? 
-                ORDER BY sent_at DESC 
-                LIMIT 50
-            ''', (user['id'],))
-            
-            sent_emails = []
-            for row in cursor.fetchall():
-                email_dict = dict(row)
-                sent_emails.append(email_dict)
+        per_page = max(1, min(request.args.get('per_page', 50, type=int), 200))
         
-        return jsonify({
-            'success': True,
-            'emails': sent_emails
-        })
+        # 从数据库逐行读取已发送邮件（游标分页，多取一行判断是否有下一页）
+        rows = db.iter_user_sent_emails(
+            user['id'], decode_cursor(request.args.get('cursor')), per_page + 1
+        )
+        first_row = next(rows, None)  # 先执行查询，出错时仍能返回500
+        
+        return Response(
+            stream_with_context(_stream_sent_emails(first_row, rows, per_page)),
+            mimetype='application/json'
+        )
         
     except Exception as e:
         logger.error(f"获取已发送邮件失败: {e}")
@@ -2770,3 +3144,9 @@ if __name__ == '__main__':
     finally:
         if scheduler.running:
             scheduler.shutdown()
+        EMAIL_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _fetch_pool.shutdown(wait=False, cancel_futures=True)
+        _digest_pool.shutdown(wait=False, cancel_futures=True)
+        _schedule_pool.shutdown(wait=False, cancel_futures=True)
+        _translation_pool.shutdown(wait=False, cancel_futures=True)
+        job_queue.shutdown()
@@ -4,15 +4,40 @@
 AI邮件简报系统 - 配置文件
 """
 
+import json
 import os
 from pathlib import Path
+from types import MappingProxyType
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# 布尔型环境变量视为真的取值
+_TRUTHY = frozenset({'1', 'true', 'yes', 'on'})
+
+
+def _env_bool(name, default=False):
+    """读取布尔型环境变量（1/true/yes/on 为真，不区分大小写），未设置时返回默认值"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in _TRUTHY
+
+
+def _build_domain_trie(domain_mapping):
+    """按反转的域名标签构建字典树（vip.sina.com -> com/sina/vip），节点的None键保存服务商"""
+    trie = {}
+    for domain, provider in domain_mapping.items():
+        node = trie
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        node[None] = provider
+    return trie
+
+
 class Config:
     # 应用基础配置
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-    DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
+    DEBUG = _env_bool('DEBUG')
     PORT = int(os.getenv('PORT', '6006'))
     
     # Celery异步任务队列配置
@@ -26,13 +51,15 @@ class Config:
     GLM_API_KEY = os.getenv('GLM_API_KEY')
     GLM_MODEL = os.getenv('GLM_MODEL', 'glm-4-plus')
     GLM_BASE_URL = os.getenv('GLM_BASE_URL', 'https://open.bigmodel.cn/api/paas/v4')
+    GLM_RPM_LIMIT = int(os.getenv('GLM_RPM_LIMIT', '60'))  # 每分钟请求数上限（<=0不限制）
+    GLM_TPM_LIMIT = int(os.getenv('GLM_TPM_LIMIT', '100000'))  # 每分钟token数上限（<=0不限制）
     
     # OpenAI配置（备选）
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
     OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
     
-    # 邮件服务配置
+    # 邮件服务配置（只读，防止调用方意外修改共享配置）
     EMAIL_PROVIDERS = {
         'gmail': {
             'imap_host': 'imap.gmail.com',
@@ -113,31 +140,48 @@ class Config:
             'use_ssl': True
         }
     }
+    EMAIL_PROVIDERS = MappingProxyType(
+        {name: MappingProxyType(settings) for name, settings in EMAIL_PROVIDERS.items()})
     
     # 调度配置
     CHECK_INTERVAL_MINUTES = int(os.getenv('CHECK_INTERVAL_MINUTES', '30'))
     MAX_EMAILS_PER_RUN = int(os.getenv('MAX_EMAILS_PER_RUN', '50'))
     MAX_EMAILS_PER_ACCOUNT = int(os.getenv('MAX_EMAILS_PER_ACCOUNT', '30'))
     
+    # 限流配置（格式: 次数/周期，多条规则用分号分隔）
+    TRIGGER_RATE_LIMIT = os.getenv('TRIGGER_RATE_LIMIT', '6/hour;1/minute')  # 手动收取邮件
+    REPROCESS_RATE_LIMIT = os.getenv('REPROCESS_RATE_LIMIT', '60/hour;10/minute')  # 重新生成摘要
+    
     # 数据库配置
     DATABASE_PATH = BASE_DIR / 'data' / 'emails.db'
-    DATABASE_PATH.parent.mkdir(exist_ok=True)
+    # 目录在首次打开数据库时创建（见 models.database._get_connection_pool）
     
     # 日志配置
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_DIR = BASE_DIR / 'logs'
-    LOG_DIR.mkdir(exist_ok=True)
+    # 目录在创建文件日志处理器时创建（见 utils.logger）
     LOG_FILE = LOG_DIR / 'email_digest.log'
     
     # 安全配置
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     
+    # 附件下载：部署在nginx后面时设置为内部location前缀（如 /internal/attachments），
+    # 由nginx通过 X-Accel-Redirect 直接发送文件；为空时由应用发送
+    ATTACHMENT_ACCEL_REDIRECT_PREFIX = os.getenv('ATTACHMENT_ACCEL_REDIRECT_PREFIX', '').rstrip('/')
+    
     # 去重配置
     DUPLICATE_CHECK_DAYS = int(os.getenv('DUPLICATE_CHECK_DAYS', '7'))  # 检查最近7天的邮件去重
     
     # AI摘要配置
     SUMMARY_MAX_LENGTH = int(os.getenv('SUMMARY_MAX_LENGTH', '800'))  # 扩大到800字符，支持智能摘要
     SUMMARY_TEMPERATURE = float(os.getenv('SUMMARY_TEMPERATURE', '0.3'))
+    SUMMARY_BATCH_SIZE = int(os.getenv('SUMMARY_BATCH_SIZE', '8'))  # 每批摘要的邮件数
+    SUMMARY_MAX_WORKERS = int(os.getenv('SUMMARY_MAX_WORKERS', '4'))  # 并发摘要批次数
+    
+    # 翻译缓存配置
+    TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', '10000'))  # 进程内LRU条目数
+    TRANSLATION_CACHE_TTL_DAYS = int(os.getenv('TRANSLATION_CACHE_TTL_DAYS', '30'))  # 翻译缓存保留天数
+    TRANSLATION_BATCH_SIZE = int(os.getenv('TRANSLATION_BATCH_SIZE', '10'))  # 每次GLM请求合并翻译的条数
     
     # 邮件内容限制
     EMAIL_BODY_MAX_LENGTH = int(os.getenv('EMAIL_BODY_MAX_LENGTH', '20000'))
@@ -153,7 +197,7 @@ class Config:
     # 缓存配置
     CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', '3600'))  # 1小时
     
-    # 缓存TTL配置（秒）
+    # 缓存TTL配置（秒），单项环境变量作为默认值
     CACHE_TTL = {
         'email_list': int(os.getenv('CACHE_TTL_EMAIL_LIST', '300')),      # 5分钟
         'user_stats': int(os.getenv('CACHE_TTL_USER_STATS', '600')),      # 10分钟
@@ -161,39 +205,56 @@ class Config:
         'digest_list': int(os.getenv('CACHE_TTL_DIGEST_LIST', '1800')),   # 30分钟
         'user_config': int(os.getenv('CACHE_TTL_USER_CONFIG', '7200'))    # 2小时
     }
+    # 也可以用一个JSON环境变量统一覆盖，如 CACHE_TTL_JSON='{"email_list": 120}'
+    CACHE_TTL.update({name: int(ttl) for name, ttl in json.loads(os.getenv('CACHE_TTL_JSON') or '{}').items()})
+    
+    # 域名到服务商的映射
+    EMAIL_DOMAIN_PROVIDERS = {
+        'gmail.com': 'gmail',
+        '126.com': '126',
+        '163.com': '163',
+        'qq.com': 'qq',
+        'hotmail.com': 'hotmail',
+        'outlook.com': 'outlook',
+        'live.com': 'hotmail',
+        'yahoo.com': 'yahoo',
+        'yahoo.com.cn': 'yahoo',
+        # 新浪邮箱 - 4种域名
+        'sina.com': 'sina.com',
+        'sina.cn': 'sina.cn',
+        'vip.sina.com': 'vip.sina.com',
+        'vip.sina.cn': 'vip.sina.cn'
+    }
+    EMAIL_DOMAIN_TRIE = _build_domain_trie(EMAIL_DOMAIN_PROVIDERS)
     
     @classmethod
     def get_email_provider_config(cls, provider_name):
         """获取邮件服务商配置"""
-        return cls.EMAIL_PROVIDERS.get(provider_name.lower())
+        # 数据库中保存的服务商名已是小写，先直接查找，命中不了再转小写
+        provider_config = cls.EMAIL_PROVIDERS.get(provider_name)
+        if provider_config is None:
+            provider_config = cls.EMAIL_PROVIDERS.get(provider_name.lower())
+        return provider_config
     
     @classmethod
     def detect_email_provider(cls, email_address):
-        """根据邮箱地址自动检测服务商"""
-        if not email_address or '@' not in email_address:
+        """根据邮箱地址自动检测服务商（子域名按最长匹配，如 mail.vip.sina.com -> vip.sina.com）"""
+        if not email_address:
             return None
             
-        domain = email_address.split('@')[1].lower()
-        
-        # 域名到服务商的映射
-        domain_mapping = {
-            'gmail.com': 'gmail',
-            '126.com': '126',
-            '163.com': '163',
-            'qq.com': 'qq',
-            'hotmail.com': 'hotmail',
-            'outlook.com': 'outlook',
-            'live.com': 'hotmail',
-            'yahoo.com': 'yahoo',
-            'yahoo.com.cn': 'yahoo',
-            # 新浪邮箱 - 4种域名
-            'sina.com': 'sina.com',
-            'sina.cn': 'sina.cn',
-            'vip.sina.com': 'vip.sina.com',
-            'vip.sina.cn': 'vip.sina.cn'
-        }
+        local_part, at, domain = email_address.rpartition('@')
+        if not at:
+            return None
+        domain = domain.lower()
         
-        return domain_mapping.get(domain)
+        node = cls.EMAIL_DOMAIN_TRIE
+        provider = None
+        for label in reversed(domain.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            provider = node.get(None, provider)
+        return provider
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
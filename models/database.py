@@ -6,14 +6,17 @@ AI邮件简报系统 - 数据库模型
 
 import sqlite3
 from datetime import datetime, timedelta
-import json
 import hashlib
 import logging
+import queue
+import threading
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 from contextlib import contextmanager
 
 from config import Config
+from utils.json_codec import json_dumps, json_loads
 
 logger = logging.getLogger(__name__)
 
@@ -26,27 +29,130 @@ def get_cache_service():
     except ImportError:
         return None
 
+def record_saved_emails_in_bloom(user_id: int, emails: List[Dict]):
+    """把写库成功的邮件同步到去重布隆过滤器（延迟导入，避免循环依赖）"""
+    try:
+        from services.dedup_bloom import record_saved_emails
+    except ImportError:
+        return
+    record_saved_emails(user_id, emails)
+
+# 邮件列表总数缓存时间（秒）
+EMAIL_COUNT_CACHE_TTL = 30
+
+# 未读通知数计数器（不在 notifications:user:* 模式内，通知列表缓存失效时保留）
+UNREAD_NOTIFICATION_COUNT_KEY = 'notif_unread:user:{user_id}'
+UNREAD_NOTIFICATION_COUNT_TTL = 3600
+# 未读数版本号：每次写操作递增，回填计数器期间版本号变化则重新统计（清理旧通知递增全局版本号）
+UNREAD_NOTIFICATION_VERSION_KEY = 'notif_unread_ver:user:{user_id}'
+UNREAD_NOTIFICATION_GLOBAL_VERSION_KEY = 'notif_unread_ver:all'
+UNREAD_NOTIFICATION_SEED_ATTEMPTS = 3
+
+# 邮件分页列表返回的字段（查询列与字典键一致）
+EMAIL_LIST_COLUMNS = ('id', 'subject', 'sender', 'date', 'summary', 'ai_summary', 'processed',
+                      'account_email', 'provider', 'importance', 'category', 'created_at')
+
+# 已发送邮件列表返回的字段
+SENT_EMAIL_COLUMNS = ('id', 'to_addresses', 'cc_addresses', 'bcc_addresses', 'subject',
+                      'body', 'sent_at', 'created_at')
+
+# 数据库结构版本（PRAGMA user_version），新增迁移时递增
+SCHEMA_VERSION = 2
+
+# 旧版emails表需要补充的字段：附件、转发信息、软删除（列表查询依赖deleted字段）
+EMAIL_MIGRATION_COLUMNS = (
+    ('attachments', 'TEXT'),
+    ('is_forwarded', 'BOOLEAN DEFAULT 0'),
+    ('forward_level', 'INTEGER DEFAULT 0'),
+    ('original_sender', 'TEXT'),
+    ('original_sender_email', 'TEXT'),
+    ('forwarded_by', 'TEXT'),
+    ('forwarded_by_email', 'TEXT'),
+    ('forward_chain', 'TEXT'),
+    ('deleted', 'BOOLEAN DEFAULT 0'),
+)
+
+# 由触发器维护的邮件计数（stats_counters表），系统统计不再每次COUNT整张表
+EMAIL_COUNTER_TOTAL = 'emails_total'
+EMAIL_COUNTER_PROCESSED = 'emails_processed'
+
+# 去重时每条IN查询携带的候选值数量（低于SQLite的变量个数上限）
+DEDUP_QUERY_BATCH_SIZE = 500
+
+# 清理旧通知时每批删除的行数
+NOTIFICATION_CLEANUP_BATCH_SIZE = 5000
+
+# 连接池配置（按数据库文件共享，所有Database实例复用同一个池）
+CONNECTION_POOL_SIZE = 8
+# 每个连接缓存的预编译语句数（连接长期复用，常用SQL不必重复prepare）
+STATEMENT_CACHE_SIZE = 256
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+def _get_connection_pool(db_path) -> queue.LifoQueue:
+    """获取指定数据库文件的连接池"""
+    key = str(db_path)
+    with _connection_pools_lock:
+        pool = _connection_pools.get(key)
+        if pool is None:
+            # 首次使用该数据库文件时确保目录存在
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            pool = queue.LifoQueue(maxsize=CONNECTION_POOL_SIZE)
+            _connection_pools[key] = pool
+        return pool
+
 class Database:
     def __init__(self):
         self.db_path = Config.DATABASE_PATH
+        self._pool = _get_connection_pool(self.db_path)
         self.init_database()
     
+    def _create_connection(self) -> sqlite3.Connection:
+        """创建新的数据库连接（WAL模式，可跨线程归还到连接池）"""
+        conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=-64000')  # 64MB页缓存
+        conn.execute('PRAGMA mmap_size=268435456')  # 256MB内存映射读取
+        conn.execute('PRAGMA temp_store=MEMORY')  # 排序/临时索引不落临时文件
+        # INSERT OR REPLACE 替换旧行时也触发删除触发器，保持 stats_counters 计数准确
+        conn.execute('PRAGMA recursive_triggers=ON')
+        return conn
+    
     @contextmanager
     def get_connection(self):
-        """获取数据库连接的上下文管理器"""
+        """获取数据库连接的上下文管理器（从连接池借出，用完归还）"""
         conn = None
+        healthy = True
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._create_connection()
             conn.row_factory = sqlite3.Row  # 支持字典式访问
             yield conn
         except Exception as e:
+            healthy = False
             if conn:
                 conn.rollback()
             logger.error(f"数据库操作失败: {e}")
             raise
         finally:
             if conn:
-                conn.close()
+                self._release_connection(conn, healthy)
+    
+    def _release_connection(self, conn: sqlite3.Connection, healthy: bool = True):
+        """归还连接：未提交的事务回滚（与关闭连接的语义一致），池满或出错时直接关闭"""
+        try:
+            if healthy:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._pool.put_nowait(conn)
+                return
+        except (queue.Full, sqlite3.Error):
+            pass
+        conn.close()
     
     def check_connection(self) -> bool:
         """检查数据库连接"""
@@ -121,6 +227,12 @@ class Database:
                     ON system_notifications(is_read)
                 ''')
                 
+                # 游标分页索引：按 (created_at, id) 倒序定位下一页
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_notifications_user_created 
+                    ON system_notifications(user_id, created_at DESC, id DESC)
+                ''')
+                
                 # 创建简报表
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS digests (
@@ -202,56 +314,125 @@ class Database:
                     )
                 ''')
                 
+                # 创建翻译缓存表（键为原文哈希 + 目标语言）
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS translation_cache (
+                        hash TEXT PRIMARY KEY,
+                        target_lang TEXT NOT NULL,
+                        translated TEXT NOT NULL,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_translation_cache_created_at ON translation_cache(created_at)')
+                
                 # 创建索引
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_date ON emails(date)')
+                # 按天统计用的表达式索引（查询中需使用相同的 substr(date, 1, 10) 表达式）
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_date_day ON emails(substr(date, 1, 10))')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_sender ON emails(sender)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_processed ON emails(processed)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_content_hash ON emails(content_hash)')
                 
-                # 数据库迁移：为现有emails表添加attachments字段
-                try:
-                    cursor.execute('ALTER TABLE emails ADD COLUMN attachments TEXT')
-                    logger.info("成功为emails表添加attachments字段")
-                except Exception as e:
-                    # 字段已存在或其他错误，忽略
-                    if "duplicate column name" not in str(e).lower():
-                        logger.debug(f"添加attachments字段时的预期错误: {e}")
-                    pass
-                
-                # 数据库迁移：为现有emails表添加转发相关字段
-                forward_fields = [
-                    ('is_forwarded', 'BOOLEAN DEFAULT 0'),
-                    ('forward_level', 'INTEGER DEFAULT 0'),
-                    ('original_sender', 'TEXT'),
-                    ('original_sender_email', 'TEXT'),
-                    ('forwarded_by', 'TEXT'),
-                    ('forwarded_by_email', 'TEXT'),
-                    ('forward_chain', 'TEXT'),
-                ]
-                
-                for field_name, field_type in forward_fields:
-                    try:
-                        cursor.execute(f'ALTER TABLE emails ADD COLUMN {field_name} {field_type}')
-                        logger.info(f"成功为emails表添加{field_name}字段")
-                    except Exception as e:
-                        if "duplicate column name" not in str(e).lower():
-                            logger.debug(f"添加{field_name}字段时的预期错误: {e}")
-                        pass
+                # 数据库迁移：为旧版emails表补充字段（按 user_version 记录，已迁移的库不再逐条尝试ALTER）
+                # 多个进程同时启动时，先取得写锁再读取版本号，迁移只由其中一个进程执行
+                if conn.in_transaction:
+                    conn.commit()
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('PRAGMA user_version')
+                schema_version = cursor.fetchone()[0]
+                if schema_version < 1:
+                    cursor.execute('PRAGMA table_info(emails)')
+                    existing_columns = {row['name'] for row in cursor.fetchall()}
+                    for field_name, field_type in EMAIL_MIGRATION_COLUMNS:
+                        if field_name in existing_columns:
+                            continue
+                        try:
+                            cursor.execute(f'ALTER TABLE emails ADD COLUMN {field_name} {field_type}')
+                            logger.info(f"成功为emails表添加{field_name}字段")
+                        except sqlite3.OperationalError as e:
+                            # 不持锁的旧版本进程可能已添加该字段，忽略
+                            if "duplicate column name" not in str(e).lower():
+                                raise
+                            logger.debug("添加%s字段时的预期错误: %s", field_name, e)
+                if schema_version < 2:
+                    self._create_email_counters(cursor)
+                if schema_version < SCHEMA_VERSION:
+                    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                conn.commit()
                 
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_account ON emails(account_email)')
+                # 邮件列表游标分页索引：按 (date, id) 倒序定位下一页
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_user_date_id ON emails(user_id, date DESC, id DESC)')
+                # 去重查询索引：按用户取email_id、按用户和更新时间取content_hash（覆盖索引，不回表读正文）
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_user_email_id ON emails(user_id, email_id)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_user_updated ON emails(user_id, updated_at, content_hash)')
+                # 部分索引：只包含活跃用户，调度器取活跃用户ID时不扫描整张用户表
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_active ON users(id) WHERE is_active = 1')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_digests_date ON digests(date)')
                 
                 # 转发相关索引
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_is_forwarded ON emails(is_forwarded)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_original_sender_email ON emails(original_sender_email)')
                 
+                # 已发送邮件游标分页索引（sent_emails表由发信功能创建，可能尚不存在）
+                try:
+                    cursor.execute('''
+                        CREATE INDEX IF NOT EXISTS idx_sent_emails_user_sent_at
+                        ON sent_emails(user_id, sent_at DESC, id DESC)
+                    ''')
+                except sqlite3.OperationalError as e:
+                    logger.debug("创建sent_emails索引时的预期错误: %s", e)
+                
                 conn.commit()
+                # 让查询规划器获得新建索引的统计信息（仅在需要时才执行ANALYZE）
+                conn.execute('PRAGMA optimize')
                 logger.info("数据库初始化完成")
                 
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
             raise
     
+    def _create_email_counters(self, cursor: sqlite3.Cursor):
+        """创建邮件计数表和维护计数的触发器，并按现有数据初始化计数"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS emails_ai_count AFTER INSERT ON emails
+            BEGIN
+                UPDATE stats_counters SET value = value + 1 WHERE key = '{EMAIL_COUNTER_TOTAL}';
+                UPDATE stats_counters SET value = value + 1
+                WHERE key = '{EMAIL_COUNTER_PROCESSED}' AND NEW.processed = 1;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS emails_au_count AFTER UPDATE OF processed ON emails
+            WHEN (OLD.processed = 1) IS NOT (NEW.processed = 1)
+            BEGIN
+                UPDATE stats_counters SET value = value + (CASE WHEN NEW.processed = 1 THEN 1 ELSE -1 END)
+                WHERE key = '{EMAIL_COUNTER_PROCESSED}';
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS emails_ad_count AFTER DELETE ON emails
+            BEGIN
+                UPDATE stats_counters SET value = value - 1 WHERE key = '{EMAIL_COUNTER_TOTAL}';
+                UPDATE stats_counters SET value = value - 1
+                WHERE key = '{EMAIL_COUNTER_PROCESSED}' AND OLD.processed = 1;
+            END
+        ''')
+        # 触发器建好后再按实际数据写入初始值，期间的增量被初始值覆盖，不会重复计数
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO stats_counters (key, value)
+            SELECT '{EMAIL_COUNTER_TOTAL}', COUNT(*) FROM emails
+            UNION ALL
+            SELECT '{EMAIL_COUNTER_PROCESSED}', COUNT(*) FROM emails WHERE processed = 1
+        ''')
+        logger.info("邮件计数表已初始化")
+    
     def generate_content_hash(self, email_data: Dict) -> str:
         """
         生成邮件内容哈希用于去重（增强版）
@@ -280,10 +461,13 @@ class Database:
         recipients = email_data.get('recipients', [])
         recipients_str = ','.join(recipients) if isinstance(recipients, list) else str(recipients)
         
-        # 组合所有信息生成hash
-        content = f"{subject}|{sender}|{date_str}|{recipients_str}|{body}"
-        
-        return hashlib.md5(content.encode('utf-8')).hexdigest()
+        # 组合所有信息生成hash（逐段写入，结果与拼接后整体哈希相同，保持与已入库的content_hash一致）
+        hasher = hashlib.md5(usedforsecurity=False)
+        for part in (subject, sender, date_str, recipients_str):
+            hasher.update(str(part).encode('utf-8'))
+            hasher.update(b'|')
+        hasher.update(body.encode('utf-8'))
+        return hasher.hexdigest()
     
     def deduplicate_emails(self, emails: List[Dict], user_id: int = None) -> List[Dict]:
         """
@@ -298,27 +482,42 @@ class Database:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
+                # 先计算所有待检查邮件的content_hash，只查询这些候选值是否已存在
+                for email in emails:
+                    email['content_hash'] = self.generate_content_hash(email)
+                candidate_ids = list({email['email_id'] for email in emails if email.get('email_id')})
+                candidate_hashes = list({email['content_hash'] for email in emails})
+                
                 if user_id:
-                    # 策略1: 获取所有已处理的email_id(永久,精确去重 - 解决简报重复问题)
-                    cursor.execute('''
-                        SELECT email_id FROM emails 
-                        WHERE user_id = ?
-                    ''', (user_id,))
-                    existing_email_ids = {row['email_id'] for row in cursor.fetchall()}
+                    # 策略1: email_id去重(永久,精确去重 - 解决简报重复问题)
+                    existing_email_ids = set()
+                    for i in range(0, len(candidate_ids), DEDUP_QUERY_BATCH_SIZE):
+                        batch = candidate_ids[i:i + DEDUP_QUERY_BATCH_SIZE]
+                        placeholders = ','.join('?' * len(batch))
+                        cursor.execute(f'''
+                            SELECT email_id FROM emails 
+                            WHERE user_id = ? AND email_id IN ({placeholders})
+                        ''', (user_id, *batch))
+                        existing_email_ids.update(row['email_id'] for row in cursor.fetchall())
                     
-                    # 策略2: 获取最近N天的content_hash(时间窗口,内容去重)
+                    # 策略2: 最近N天的content_hash(时间窗口,内容去重)
                     user_configs = self.get_user_configs(user_id)
                     check_days = int(user_configs.get('duplicate_check_days', '30'))  # 增加到30天
                     check_date = (datetime.now() - timedelta(days=check_days)).isoformat()
                     
-                    cursor.execute('''
-                        SELECT content_hash FROM emails 
-                        WHERE user_id = ? AND (created_at > ? OR updated_at > ?)
-                    ''', (user_id, check_date, check_date))
-                    existing_hashes = {row['content_hash'] for row in cursor.fetchall()}
+                    existing_hashes = set()
+                    for i in range(0, len(candidate_hashes), DEDUP_QUERY_BATCH_SIZE):
+                        batch = candidate_hashes[i:i + DEDUP_QUERY_BATCH_SIZE]
+                        placeholders = ','.join('?' * len(batch))
+                        cursor.execute(f'''
+                            SELECT content_hash FROM emails 
+                            WHERE user_id = ? AND updated_at > ? AND content_hash IN ({placeholders})
+                        ''', (user_id, check_date, *batch))
+                        existing_hashes.update(row['content_hash'] for row in cursor.fetchall())
                     
-                    logger.debug(f"用户 {user_id} 去重基准: {len(existing_email_ids)} 个email_id(全部), "
-                               f"{len(existing_hashes)} 个content_hash({check_days}天)")
+                    logger.debug("用户 %s 去重基准: %s/%s 个email_id已存在, %s/%s 个content_hash(%s天)已存在",
+                                 user_id, len(existing_email_ids), len(candidate_ids),
+                                 len(existing_hashes), len(candidate_hashes), check_days)
                 else:
                     # 管理员或全局去重
                     check_days = Config.DUPLICATE_CHECK_DAYS
@@ -326,8 +525,8 @@ class Database:
                     
                     cursor.execute('''
                         SELECT email_id, content_hash FROM emails 
-                        WHERE created_at > ? OR updated_at > ?
-                    ''', (check_date, check_date))
+                        WHERE updated_at > ?
+                    ''', (check_date,))
                     
                     results = cursor.fetchall()
                     existing_email_ids = {row['email_id'] for row in results}
@@ -343,19 +542,18 @@ class Database:
                 
                 for email in emails:
                     email_id = email.get('email_id')
-                    content_hash = self.generate_content_hash(email)
-                    email['content_hash'] = content_hash
+                    content_hash = email['content_hash']
                     
                     # 检查1: email_id重复(最准确 - 防止简报重复)
                     if email_id and (email_id in existing_email_ids or email_id in current_email_ids):
                         duplicate_count['email_id'] += 1
-                        logger.debug(f"用户 {user_id} email_id重复: {email.get('subject', '')[:30]}")
+                        logger.debug("用户 %s email_id重复: %s", user_id, email.get('subject', '')[:30])
                         continue
                     
                     # 检查2: content_hash重复(防止内容重复)
                     if content_hash in existing_hashes or content_hash in current_hashes:
                         duplicate_count['content_hash'] += 1
-                        logger.debug(f"用户 {user_id} content_hash重复: {email.get('subject', '')[:30]}")
+                        logger.debug("用户 %s content_hash重复: %s", user_id, email.get('subject', '')[:30])
                         continue
                     
                     unique_emails.append(email)
@@ -405,67 +603,135 @@ class Database:
             logger.warning(f"规范化邮件日期失败: {e}")
             return datetime.utcnow().replace(tzinfo=None).isoformat()
     
-    def save_email(self, email_data: Dict) -> bool:
-        """保存邮件到数据库"""
+    EMAIL_INSERT_SQL = '''
+        INSERT OR REPLACE INTO emails 
+        (user_id, email_id, content_hash, subject, sender, recipients, date, body, body_html, 
+         summary, ai_summary, processed, account_email, provider, importance, 
+         category, attachments, 
+         is_forwarded, forward_level, original_sender, original_sender_email, 
+         forwarded_by, forwarded_by_email, forward_chain, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    def _email_insert_params(self, email_data: Dict) -> tuple:
+        """构造邮件插入语句的参数（会补全content_hash；主题/正文为None时按空字符串截断，布尔字段按0/1绑定）"""
+        # 确保有内容哈希
+        if 'content_hash' not in email_data:
+            email_data['content_hash'] = self.generate_content_hash(email_data)
+        
+        return (
+            email_data.get('user_id'),
+            email_data.get('email_id'),
+            email_data.get('content_hash'),
+            (email_data.get('subject') or '')[:Config.EMAIL_SUBJECT_MAX_LENGTH],
+            email_data.get('sender', ''),
+            json_dumps(email_data.get('recipients', [])),
+            self._normalize_email_date(email_data.get('date')),  # ✅ 统一时区保存
+            (email_data.get('body') or '')[:Config.EMAIL_BODY_MAX_LENGTH],
+            email_data.get('body_html', ''),
+            email_data.get('summary', ''),
+            email_data.get('ai_summary', ''),
+            int(bool(email_data.get('processed', False))),
+            email_data.get('account_email', ''),
+            email_data.get('provider', ''),
+            email_data.get('importance', 1),
+            email_data.get('category', 'general'),
+            json_dumps(email_data.get('attachments', [])),
+            # 转发相关字段
+            int(bool(email_data.get('is_forwarded', False))),
+            email_data.get('forward_level', 0),
+            email_data.get('original_sender'),
+            email_data.get('original_sender_email'),
+            email_data.get('forwarded_by'),
+            email_data.get('forwarded_by_email'),
+            email_data.get('forward_chain'),
+            datetime.now().isoformat()
+        )
+    
+    def _insert_email(self, email_data: Dict) -> Optional[int]:
+        """写入单封邮件（不处理缓存），成功返回邮件行ID，失败返回None"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                
-                # 确保有内容哈希
-                if 'content_hash' not in email_data:
-                    email_data['content_hash'] = self.generate_content_hash(email_data)
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO emails 
-                    (user_id, email_id, content_hash, subject, sender, recipients, date, body, body_html, 
-                     summary, ai_summary, processed, account_email, provider, importance, 
-                     category, attachments, 
-                     is_forwarded, forward_level, original_sender, original_sender_email, 
-                     forwarded_by, forwarded_by_email, forward_chain, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    email_data.get('user_id'),
-                    email_data.get('email_id'),
-                    email_data.get('content_hash'),
-                    email_data.get('subject', '')[:Config.EMAIL_SUBJECT_MAX_LENGTH],
-                    email_data.get('sender', ''),
-                    json.dumps(email_data.get('recipients', [])),
-                    self._normalize_email_date(email_data.get('date')),  # ✅ 统一时区保存
-                    email_data.get('body', '')[:Config.EMAIL_BODY_MAX_LENGTH],
-                    email_data.get('body_html', ''),
-                    email_data.get('summary', ''),
-                    email_data.get('ai_summary', ''),
-                    email_data.get('processed', False),
-                    email_data.get('account_email', ''),
-                    email_data.get('provider', ''),
-                    email_data.get('importance', 1),
-                    email_data.get('category', 'general'),
-                    json.dumps(email_data.get('attachments', [])),
-                    # 转发相关字段
-                    email_data.get('is_forwarded', False),
-                    email_data.get('forward_level', 0),
-                    email_data.get('original_sender'),
-                    email_data.get('original_sender_email'),
-                    email_data.get('forwarded_by'),
-                    email_data.get('forwarded_by_email'),
-                    email_data.get('forward_chain'),
-                    datetime.now().isoformat()
-                ))
-                
+                cursor.execute(self.EMAIL_INSERT_SQL, self._email_insert_params(email_data))
                 conn.commit()
-                
-                # 缓存失效
-                user_id = email_data.get('user_id')
-                if user_id:
-                    cache = get_cache_service()
-                    if cache and cache.is_connected():
-                        cache.invalidate_user_cache(user_id, 'new_email')
-                
-                return True
+                return cursor.lastrowid
                 
         except Exception as e:
             logger.error(f"保存邮件失败: {e}")
-            return False
+            return None
+    
+    def _after_emails_saved(self, emails: List[Dict]):
+        """邮件写库后按用户清理缓存并同步去重布隆过滤器（每个用户只处理一次）"""
+        cache = get_cache_service()
+        if not (cache and cache.is_connected()):
+            return
+        emails_by_user = {}
+        for email_data in emails:
+            if email_data.get('user_id'):
+                emails_by_user.setdefault(email_data['user_id'], []).append(email_data)
+        for user_id, user_emails in emails_by_user.items():
+            cache.invalidate_user_cache(user_id, 'new_email')
+            record_saved_emails_in_bloom(user_id, user_emails)
+    
+    def save_email(self, email_data: Dict) -> Optional[int]:
+        """保存邮件到数据库，成功返回邮件行ID，失败返回None"""
+        saved_id = self._insert_email(email_data)
+        if saved_id:
+            self._after_emails_saved([email_data])
+        return saved_id
+    
+    def save_emails_bulk(self, emails: List[Dict]) -> List[int]:
+        """
+        批量保存邮件（单个事务内executemany，一次提交）
+        
+        Args:
+            emails: 邮件数据列表
+            
+        Returns:
+            成功保存的邮件行ID列表（与输入顺序一致）；批量写入失败时逐封保存
+        """
+        if not emails:
+            return []
+        
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                # 参数按需逐行生成，不先构造完整的参数列表
+                cursor.executemany(self.EMAIL_INSERT_SQL,
+                                   (self._email_insert_params(email_data) for email_data in emails))
+                
+                # executemany不提供每行的lastrowid，按唯一的content_hash取回ID
+                hashes = [email_data['content_hash'] for email_data in emails]
+                ids_by_hash = {}
+                for i in range(0, len(hashes), 500):
+                    batch = hashes[i:i + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    cursor.execute(f'SELECT id, content_hash FROM emails WHERE content_hash IN ({placeholders})', batch)
+                    ids_by_hash.update({row['content_hash']: row['id'] for row in cursor.fetchall()})
+                
+                conn.commit()
+            
+            self._after_emails_saved(emails)
+            
+            saved_ids = []
+            for content_hash in hashes:
+                saved_id = ids_by_hash.get(content_hash)
+                if saved_id and saved_id not in saved_ids:
+                    saved_ids.append(saved_id)
+            return saved_ids
+            
+        except Exception as e:
+            logger.error(f"批量保存邮件失败，改为逐封保存: {e}")
+            saved_ids = []
+            saved_emails = []
+            for email_data in emails:
+                saved_id = self._insert_email(email_data)
+                if saved_id:
+                    saved_ids.append(saved_id)
+                    saved_emails.append(email_data)
+            self._after_emails_saved(saved_emails)
+            return saved_ids
     
     def get_processed_email_ids(self, account_email: str = None) -> set:
         """获取已处理的邮件ID集合"""
@@ -487,6 +753,42 @@ class Database:
             logger.error(f"获取已处理邮件ID失败: {e}")
             return set()
     
+    def filter_unprocessed_email_ids(self, candidate_ids: List[str], account_email: str = None) -> List[str]:
+        """
+        从候选邮件ID中筛出尚未处理的ID（只查询候选值，不取回全部已处理ID）
+        
+        Args:
+            candidate_ids: 候选邮件ID列表
+            account_email: 限定邮箱账户
+            
+        Returns:
+            未处理的邮件ID列表（保持输入顺序）；查询失败时返回全部候选ID
+        """
+        if not candidate_ids:
+            return []
+        
+        try:
+            unique_ids = list(dict.fromkeys(candidate_ids))
+            processed = set()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                for i in range(0, len(unique_ids), DEDUP_QUERY_BATCH_SIZE):
+                    batch = unique_ids[i:i + DEDUP_QUERY_BATCH_SIZE]
+                    placeholders = ','.join('?' * len(batch))
+                    sql = f'SELECT email_id FROM emails WHERE processed = 1 AND email_id IN ({placeholders})'
+                    params = list(batch)
+                    if account_email:
+                        sql += ' AND account_email = ?'
+                        params.append(account_email)
+                    cursor.execute(sql, params)
+                    processed.update(row['email_id'] for row in cursor.fetchall())
+            
+            return [email_id for email_id in candidate_ids if email_id not in processed]
+            
+        except Exception as e:
+            logger.error(f"筛选未处理邮件ID失败: {e}")
+            return list(candidate_ids)
+    
     def get_latest_digest(self) -> Optional[Dict]:
         """获取最新简报（管理员用）"""
         try:
@@ -505,7 +807,7 @@ class Database:
                         'id': result['id'],
                         'date': result['date'],
                         'title': result['title'],
-                        'content': json.loads(result['content']) if result['content'] else {},
+                        'content': json_loads(result['content']) if result['content'] else {},
                         'email_count': result['email_count'],
                         'summary': result['summary'],
                         'created_at': result['created_at']
@@ -535,7 +837,7 @@ class Database:
                         'id': result['id'],
                         'date': result['date'],
                         'title': result['title'],
-                        'content': json.loads(result['content']) if result['content'] else {},
+                        'content': json_loads(result['content']) if result['content'] else {},
                         'email_count': result['email_count'],
                         'summary': result['summary'],
                         'created_at': result['created_at']
@@ -577,7 +879,7 @@ class Database:
                     user_id,
                     digest_date_str,
                     digest_data.get('title', f"{datetime.now(timezone.utc).strftime('%Y-%m-%d')} 邮件简报"),
-                    json.dumps(digest_data.get('content', {}), ensure_ascii=False),
+                    json_dumps(digest_data.get('content', {})),
                     digest_data.get('email_count', 0),
                     digest_data.get('summary', '')
                 ))
@@ -589,6 +891,14 @@ class Database:
             logger.error(f"保存简报失败: {e}")
             return False
     
+    @staticmethod
+    def _email_list_rows(cursor: sqlite3.Cursor) -> List[Dict]:
+        """把按 EMAIL_LIST_COLUMNS 查询的结果组装为邮件列表字典"""
+        emails = [dict(zip(EMAIL_LIST_COLUMNS, row)) for row in cursor.fetchall()]
+        for email in emails:
+            email['processed'] = bool(email['processed'])
+        return emails
+    
     def get_emails_paginated(self, page: int = 1, per_page: int = 20) -> Tuple[List[Dict], int]:
         """分页获取邮件列表（管理员用）"""
         try:
@@ -601,32 +911,15 @@ class Database:
                 
                 # 获取分页数据
                 offset = (page - 1) * per_page
-                cursor.execute('''
-                    SELECT id, subject, sender, date, summary, ai_summary, processed, 
-                           account_email, provider, importance, category, created_at
+                cursor.row_factory = None  # 直接按列名元组组装字典，不构造Row对象
+                cursor.execute(f'''
+                    SELECT {', '.join(EMAIL_LIST_COLUMNS)}
                     FROM emails
                     ORDER BY date DESC, created_at DESC
                     LIMIT ? OFFSET ?
                 ''', (per_page, offset))
                 
-                emails = []
-                for row in cursor.fetchall():
-                    emails.append({
-                        'id': row['id'],
-                        'subject': row['subject'],
-                        'sender': row['sender'],
-                        'date': row['date'],
-                        'summary': row['summary'],
-                        'ai_summary': row['ai_summary'],
-                        'processed': bool(row['processed']),
-                        'account_email': row['account_email'],
-                        'provider': row['provider'],
-                        'importance': row['importance'],
-                        'category': row['category'],
-                        'created_at': row['created_at']
-                    })
-                
-                return emails, total
+                return self._email_list_rows(cursor), total
                 
         except Exception as e:
             logger.error(f"获取分页邮件失败: {e}")
@@ -644,33 +937,16 @@ class Database:
                 
                 # 获取分页数据
                 offset = (page - 1) * per_page
-                cursor.execute('''
-                    SELECT id, subject, sender, date, summary, ai_summary, processed, 
-                           account_email, provider, importance, category, created_at
+                cursor.row_factory = None  # 直接按列名元组组装字典，不构造Row对象
+                cursor.execute(f'''
+                    SELECT {', '.join(EMAIL_LIST_COLUMNS)}
                     FROM emails
                     WHERE user_id = ?
                     ORDER BY date DESC, created_at DESC
                     LIMIT ? OFFSET ?
                 ''', (user_id, per_page, offset))
                 
-                emails = []
-                for row in cursor.fetchall():
-                    emails.append({
-                        'id': row['id'],
-                        'subject': row['subject'],
-                        'sender': row['sender'],
-                        'date': row['date'],
-                        'summary': row['summary'],
-                        'ai_summary': row['ai_summary'],
-                        'processed': bool(row['processed']),
-                        'account_email': row['account_email'],
-                        'provider': row['provider'],
-                        'importance': row['importance'],
-                        'category': row['category'],
-                        'created_at': row['created_at']
-                    })
-                
-                return emails, total
+                return self._email_list_rows(cursor), total
                 
         except Exception as e:
             logger.error(f"获取用户分页邮件失败: {e}")
@@ -682,31 +958,30 @@ class Database:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # 邮件统计
-                cursor.execute('SELECT COUNT(*) as total FROM emails')
-                total_emails = cursor.fetchone()['total']
-                
-                cursor.execute('SELECT COUNT(*) as processed FROM emails WHERE processed = 1')
-                processed_emails = cursor.fetchone()['processed']
-                
-                cursor.execute('SELECT COUNT(*) as today FROM emails WHERE date(date) = date("now")')
-                today_emails = cursor.fetchone()['today']
-                
-                # 账户统计
-                cursor.execute('SELECT COUNT(*) as accounts FROM email_accounts WHERE is_active = 1')
-                active_accounts = cursor.fetchone()['accounts']
-                
-                # 简报统计
-                cursor.execute('SELECT COUNT(*) as digests FROM digests')
-                total_digests = cursor.fetchone()['digests']
+                # 各项计数合并为一条查询：邮件总数/已处理数取触发器维护的计数，
+                # 今日邮件按日期前缀比较（date字段保存为UTC的ISO格式），可以使用 idx_emails_date_day 表达式索引
+                cursor.execute('''
+                    SELECT
+                        (SELECT value FROM stats_counters WHERE key = ?) as total,
+                        (SELECT value FROM stats_counters WHERE key = ?) as processed,
+                        (SELECT COUNT(*) FROM emails WHERE substr(date, 1, 10) = date("now")) as today,
+                        (SELECT COUNT(*) FROM email_accounts WHERE is_active = 1) as accounts,
+                        (SELECT COUNT(*) FROM digests) as digests
+                ''', (EMAIL_COUNTER_TOTAL, EMAIL_COUNTER_PROCESSED))
+                counts = cursor.fetchone()
+                total_emails = counts['total'] or 0
+                processed_emails = counts['processed'] or 0
+                today_emails = counts['today']
+                active_accounts = counts['accounts']
+                total_digests = counts['digests']
                 
                 # 最近活动
                 cursor.execute('''
                     SELECT date, COUNT(*) as count 
                     FROM emails 
-                    WHERE date >= date("now", "-7 days")
-                    GROUP BY date(date)
-                    ORDER BY date DESC
+                    WHERE substr(date, 1, 10) >= date("now", "-7 days")
+                    GROUP BY substr(date, 1, 10)
+                    ORDER BY substr(date, 1, 10) DESC
                     LIMIT 7
                 ''')
                 recent_activity = [{'date': row['date'], 'count': row['count']} for row in cursor.fetchall()]
@@ -781,61 +1056,111 @@ class Database:
             logger.error(f"获取邮箱账户失败: {e}")
             return []
     
+    EMAIL_DETAIL_COLUMNS = '''
+        id, user_id, email_id, content_hash, subject, sender, recipients, 
+        date, body, body_html, summary, ai_summary, processed, 
+        account_email, provider, importance, category, attachments,
+        is_forwarded, forward_level, original_sender, original_sender_email,
+        forwarded_by, forwarded_by_email, forward_chain,
+        created_at, updated_at, deleted
+    '''
+    
+    def _email_row_to_dict(self, row) -> Dict:
+        """将邮件详情查询结果转换为字典"""
+        return {
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'email_id': row['email_id'],
+            'content_hash': row['content_hash'],
+            'subject': row['subject'],
+            'sender': row['sender'],
+            'recipients': json_loads(row['recipients']) if row['recipients'] else [],
+            'date': row['date'],
+            'body': row['body'],
+            'body_html': row['body_html'],
+            'summary': row['summary'],
+            'ai_summary': row['ai_summary'],
+            'processed': bool(row['processed']),
+            'account_email': row['account_email'],
+            'provider': row['provider'],
+            'importance': row['importance'],
+            'category': row['category'],
+            'attachments': json_loads(row['attachments']) if row['attachments'] else [],
+            # 转发相关字段
+            'is_forwarded': bool(row['is_forwarded']) if row['is_forwarded'] is not None else False,
+            'forward_level': row['forward_level'] or 0,
+            'original_sender': row['original_sender'],
+            'original_sender_email': row['original_sender_email'],
+            'forwarded_by': row['forwarded_by'],
+            'forwarded_by_email': row['forwarded_by_email'],
+            'forward_chain': json_loads(row['forward_chain']) if row['forward_chain'] else None,
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'deleted': bool(row['deleted']) if row['deleted'] is not None else False
+        }
+    
     def get_email_by_id(self, email_id: int) -> Optional[Dict]:
         """根据ID获取邮件详情"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, user_id, email_id, content_hash, subject, sender, recipients, 
-                           date, body, body_html, summary, ai_summary, processed, 
-                           account_email, provider, importance, category, attachments,
-                           is_forwarded, forward_level, original_sender, original_sender_email,
-                           forwarded_by, forwarded_by_email, forward_chain,
-                           created_at, updated_at, deleted
+                cursor.execute(f'''
+                    SELECT {self.EMAIL_DETAIL_COLUMNS}
                     FROM emails
                     WHERE id = ?
                 ''', (email_id,))
                 
                 row = cursor.fetchone()
                 if row:
-                    return {
-                        'id': row['id'],
-                        'user_id': row['user_id'],
-                        'email_id': row['email_id'],
-                        'content_hash': row['content_hash'],
-                        'subject': row['subject'],
-                        'sender': row['sender'],
-                        'recipients': json.loads(row['recipients']) if row['recipients'] else [],
-                        'date': row['date'],
-                        'body': row['body'],
-                        'body_html': row['body_html'],
-                        'summary': row['summary'],
-                        'ai_summary': row['ai_summary'],
-                        'processed': bool(row['processed']),
-                        'account_email': row['account_email'],
-                        'provider': row['provider'],
-                        'importance': row['importance'],
-                        'category': row['category'],
-                        'attachments': json.loads(row['attachments']) if row['attachments'] else [],
-                        # 转发相关字段
-                        'is_forwarded': bool(row['is_forwarded']) if row['is_forwarded'] is not None else False,
-                        'forward_level': row['forward_level'] or 0,
-                        'original_sender': row['original_sender'],
-                        'original_sender_email': row['original_sender_email'],
-                        'forwarded_by': row['forwarded_by'],
-                        'forwarded_by_email': row['forwarded_by_email'],
-                        'forward_chain': json.loads(row['forward_chain']) if row['forward_chain'] else None,
-                        'created_at': row['created_at'],
-                        'updated_at': row['updated_at'],
-                        'deleted': bool(row['deleted']) if row['deleted'] is not None else False
-                    }
+                    return self._email_row_to_dict(row)
                 return None
                 
         except Exception as e:
             logger.error(f"获取邮件详情失败: {e}")
             return None
     
+    def get_emails_by_ids(self, email_ids: List[int], user_id: int = None) -> List[Dict]:
+        """
+        批量获取邮件详情（一次IN查询，按传入ID顺序返回）
+        
+        Args:
+            email_ids: 邮件ID列表
+            user_id: 指定时只返回属于该用户的邮件
+            
+        Returns:
+            邮件详情列表，不存在的ID会被忽略
+        """
+        email_ids = [email_id for email_id in email_ids if email_id]
+        if not email_ids:
+            return []
+        
+        try:
+            rows_by_id = {}
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                # 分批查询，避免超过SQLite参数数量上限
+                for i in range(0, len(email_ids), 500):
+                    batch = email_ids[i:i + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    sql = f'''
+                        SELECT {self.EMAIL_DETAIL_COLUMNS}
+                        FROM emails
+                        WHERE id IN ({placeholders})
+                    '''
+                    params = list(batch)
+                    if user_id is not None:
+                        sql += ' AND user_id = ?'
+                        params.append(user_id)
+                    cursor.execute(sql, params)
+                    for row in cursor.fetchall():
+                        rows_by_id[row['id']] = self._email_row_to_dict(row)
+            
+            return [rows_by_id[email_id] for email_id in email_ids if email_id in rows_by_id]
+            
+        except Exception as e:
+            logger.error(f"批量获取邮件详情失败: {e}")
+            return []
+    
     def update_email_summary(self, email_id: int, ai_summary: str) -> bool:
         """更新邮件AI摘要"""
         try:
@@ -970,6 +1295,77 @@ class Database:
             logger.error(f"清除邮件翻译失败: {e}")
             return False
     
+    def get_cached_translation(self, cache_key: str, max_age_days: int = None) -> Optional[str]:
+        """按缓存键获取翻译结果，超过 max_age_days 的记录视为过期"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                if max_age_days:
+                    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+                    cursor.execute(
+                        'SELECT translated FROM translation_cache WHERE hash = ? AND created_at >= ?',
+                        (cache_key, cutoff)
+                    )
+                else:
+                    cursor.execute('SELECT translated FROM translation_cache WHERE hash = ?', (cache_key,))
+                
+                row = cursor.fetchone()
+                return row['translated'] if row else None
+                
+        except Exception as e:
+            logger.error(f"获取翻译缓存失败: {e}")
+            return None
+    
+    def save_cached_translation(self, cache_key: str, target_lang: str, translated: str) -> bool:
+        """保存翻译结果到缓存表"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO translation_cache (hash, target_lang, translated, created_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (cache_key, target_lang, translated, datetime.now().isoformat()))
+                
+                conn.commit()
+                return True
+                
+        except Exception as e:
+            logger.error(f"保存翻译缓存失败: {e}")
+            return False
+    
+    def delete_cached_translations(self, cache_keys: List[str]) -> int:
+        """删除指定的翻译缓存记录"""
+        if not cache_keys:
+            return 0
+        
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                placeholders = ','.join('?' * len(cache_keys))
+                cursor.execute(f'DELETE FROM translation_cache WHERE hash IN ({placeholders})', cache_keys)
+                
+                conn.commit()
+                return cursor.rowcount
+                
+        except Exception as e:
+            logger.error(f"删除翻译缓存失败: {e}")
+            return 0
+    
+    def cleanup_translation_cache(self, max_age_days: int) -> int:
+        """清理过期的翻译缓存记录"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+                cursor.execute('DELETE FROM translation_cache WHERE created_at < ?', (cutoff,))
+                
+                conn.commit()
+                return cursor.rowcount
+                
+        except Exception as e:
+            logger.error(f"清理翻译缓存失败: {e}")
+            return 0
+    
     # 用户管理相关方法
     def create_user(self, username: str, email: str, password_hash: str, full_name: str = None) -> Optional[int]:
         """创建新用户"""
@@ -994,6 +1390,18 @@ class Database:
             logger.error(f"创建用户失败: {e}")
             return None
     
+    def get_active_user_ids(self) -> List[int]:
+        """
+        获取所有活跃用户ID（调度器每次触发都会执行，直接读取元组避免构造Row对象）
+        
+        查询失败时抛出异常，由调用方决定如何处理（避免误判为没有活跃用户）
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute('SELECT id FROM users WHERE is_active = 1')
+            return [row[0] for row in cursor]
+    
     def get_user_by_username(self, username: str) -> Optional[Dict]:
         """根据用户名获取用户信息"""
         try:
@@ -1161,7 +1569,7 @@ class Database:
             cache_key = cache.generate_cache_key('stats:user', user_id)
             cached_result = cache.get(cache_key)
             if cached_result:
-                logger.debug(f"用户统计缓存命中: user_id={user_id}")
+                logger.debug("用户统计缓存命中: user_id=%s", user_id)
                 return cached_result
         
         try:
@@ -1221,7 +1629,7 @@ class Database:
                 # 缓存结果
                 if cache and cache.is_connected() and cache_key:
                     cache.set(cache_key, stats, Config.CACHE_TTL['user_stats'])
-                    logger.debug(f"用户统计已缓存: user_id={user_id}")
+                    logger.debug("用户统计已缓存: user_id=%s", user_id)
                 
                 return stats
                 
@@ -1237,15 +1645,16 @@ class Database:
                 'processing_rate': 0
             }
     
-    def get_user_email_accounts(self, user_id: int) -> List[Dict]:
-        """获取用户的邮箱账户"""
+    def get_user_email_accounts(self, user_id: int, active_only: bool = False) -> List[Dict]:
+        """获取用户的邮箱账户（active_only=True时只返回启用的账户）"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
+                active_filter = 'AND is_active = 1' if active_only else ''
+                cursor.execute(f'''
                     SELECT id, email, provider, is_active, last_check, total_emails, created_at
                     FROM email_accounts
-                    WHERE user_id = ?
+                    WHERE user_id = ? {active_filter}
                     ORDER BY created_at DESC
                 ''', (user_id,))
                 
@@ -1267,6 +1676,22 @@ class Database:
             logger.error(f"获取用户邮箱账户失败: {e}")
             return []
     
+    def get_account_passwords(self, user_id: int) -> Dict[int, str]:
+        """一次性获取用户所有邮箱账户的密码 {账户ID: 密码}"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, password FROM email_accounts 
+                    WHERE user_id = ?
+                ''', (user_id,))
+                
+                return {row['id']: row['password'] or '' for row in cursor.fetchall()}
+                
+        except Exception as e:
+            logger.error(f"获取邮箱账户密码失败: {e}")
+            return {}
+    
     def save_user_email_account(self, user_id: int, email: str, password: str, provider: str) -> bool:
         """保存用户邮箱账户配置"""
         try:
@@ -1515,6 +1940,27 @@ class Database:
             logger.error(f"设置用户配置失败: {e}")
             return False
     
+    def set_user_configs_bulk(self, user_id: int, items: Dict[str, str]) -> int:
+        """批量设置用户配置（一个事务），返回保存的数量"""
+        if not items:
+            return 0
+        
+        try:
+            now = datetime.now().isoformat()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO user_config (user_id, key, value, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', [(user_id, key, str(value), now) for key, value in items.items()])
+                
+                conn.commit()
+                return len(items)
+                
+        except Exception as e:
+            logger.error(f"批量设置用户配置失败: {e}")
+            return 0
+    
     def get_user_configs(self, user_id: int) -> Dict[str, str]:
         """获取用户所有配置"""
         try:
@@ -1535,6 +1981,32 @@ class Database:
             logger.error(f"获取用户配置失败: {e}")
             return {}
     
+    def get_user_configs_bulk(self, user_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        """批量获取多个用户的所有配置（启动时为全部用户创建定时任务用）"""
+        configs = {user_id: {} for user_id in user_ids}
+        if not user_ids:
+            return configs
+        
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                for i in range(0, len(user_ids), 500):
+                    chunk = user_ids[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(f'''
+                        SELECT user_id, key, value FROM user_config 
+                        WHERE user_id IN ({placeholders})
+                    ''', chunk)
+                    for user_id, key, value in cursor:
+                        configs[user_id][key] = value
+                
+                return configs
+                
+        except Exception as e:
+            logger.error(f"批量获取用户配置失败: {e}")
+            return configs
+    
     def get_system_config(self, key: str, default_value: str = None) -> str:
         """获取系统配置"""
         try:
@@ -1549,6 +2021,22 @@ class Database:
             logger.error(f"获取系统配置失败: {e}")
             return default_value
     
+    def get_system_configs(self, keys: List[str]) -> Dict[str, str]:
+        """批量获取系统配置，返回已存在的 key -> value"""
+        if not keys:
+            return {}
+        
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                placeholders = ','.join('?' * len(keys))
+                cursor.execute(f'SELECT key, value FROM system_config WHERE key IN ({placeholders})', list(keys))
+                return {row['key']: row['value'] for row in cursor.fetchall()}
+                
+        except Exception as e:
+            logger.error(f"批量获取系统配置失败: {e}")
+            return {}
+    
     def set_system_config(self, key: str, value: str) -> bool:
         """设置系统配置"""
         try:
@@ -1566,33 +2054,61 @@ class Database:
             logger.error(f"设置系统配置失败: {e}")
             return False
     
+    def set_system_configs_bulk(self, items: Dict[str, str]) -> int:
+        """批量设置系统配置（一个事务），返回保存的数量"""
+        if not items:
+            return 0
+        
+        try:
+            now = datetime.now().isoformat()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO system_config (key, value, updated_at)
+                    VALUES (?, ?, ?)
+                ''', [(key, str(value), now) for key, value in items.items()])
+                
+                conn.commit()
+                return len(items)
+                
+        except Exception as e:
+            logger.error(f"批量设置系统配置失败: {e}")
+            return 0
+    
     def get_user_digests_paginated(self, user_id: int, page: int = 1, per_page: int = 10) -> tuple:
         """分页获取用户历史简报"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # 获取用户简报总数
-                cursor.execute('SELECT COUNT(*) as total FROM digests WHERE user_id = ?', (user_id,))
-                total = cursor.fetchone()['total']
-                
-                # 获取分页数据
+                # 分页数据和总数在同一次查询中取得
                 offset = (page - 1) * per_page
                 cursor.execute('''
-                    SELECT id, date, title, content, email_count, summary, created_at
+                    SELECT id, date, title, content, email_count, summary, created_at,
+                           COUNT(*) OVER() as total_count
                     FROM digests
                     WHERE user_id = ?
                     ORDER BY created_at DESC
                     LIMIT ? OFFSET ?
                 ''', (user_id, per_page, offset))
+                rows = cursor.fetchall()
+                
+                if rows:
+                    total = rows[0]['total_count']
+                elif page > 1:
+                    # 页码超出范围时没有返回行，单独统计总数
+                    cursor.execute('SELECT COUNT(*) as total FROM digests WHERE user_id = ?', (user_id,))
+                    total = cursor.fetchone()['total']
+                else:
+                    total = 0
                 
                 digests = []
-                for row in cursor.fetchall():
+                for row in rows:
                     digests.append({
                         'id': row['id'],
                         'date': row['date'],
                         'title': row['title'],
-                        'content': json.loads(row['content']) if row['content'] else {},
+                        'content': json_loads(row['content']) if row['content'] else {},
                         'email_count': row['email_count'],
                         'summary': row['summary'],
                         'created_at': row['created_at']
@@ -1631,7 +2147,7 @@ class Database:
                         'id': row['id'],
                         'date': row['date'],
                         'title': row['title'],
-                        'content': json.loads(row['content']) if row['content'] else {},
+                        'content': json_loads(row['content']) if row['content'] else {},
                         'email_count': row['email_count'],
                         'summary': row['summary'],
                         'created_at': row['created_at']
@@ -1660,7 +2176,7 @@ class Database:
                         'id': row['id'],
                         'date': row['date'],
                         'title': row['title'],
-                        'content': json.loads(row['content']) if row['content'] else {},
+                        'content': json_loads(row['content']) if row['content'] else {},
                         'email_count': row['email_count'],
                         'summary': row['summary'],
                         'created_at': row['created_at']
@@ -1716,6 +2232,46 @@ class Database:
             logger.error(f"更新邮箱账户统计失败: {e}")
             return False
     
+    def bulk_update_account_stats(self, user_id: int, accounts: List[Dict]) -> int:
+        """
+        批量更新多个邮箱账户的统计信息（一次分组统计 + 一次批量更新）
+        
+        Args:
+            user_id: 用户ID
+            accounts: 邮箱账户列表（需包含email字段）
+            
+        Returns:
+            更新的账户数量
+        """
+        account_emails = [account['email'] for account in accounts]
+        if not account_emails:
+            return 0
+        
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                placeholders = ','.join('?' * len(account_emails))
+                cursor.execute(f'''
+                    SELECT account_email, COUNT(*) as count FROM emails 
+                    WHERE user_id = ? AND account_email IN ({placeholders})
+                    GROUP BY account_email
+                ''', (user_id, *account_emails))
+                counts = {row['account_email']: row['count'] for row in cursor.fetchall()}
+                
+                now = datetime.now().isoformat()
+                cursor.executemany('''
+                    UPDATE email_accounts 
+                    SET last_check = ?, total_emails = ?, updated_at = ?
+                    WHERE user_id = ? AND email = ?
+                ''', [(now, counts.get(email, 0), now, user_id, email) for email in account_emails])
+                
+                conn.commit()
+                return cursor.rowcount
+                
+        except Exception as e:
+            logger.error(f"批量更新邮箱账户统计失败: {e}")
+            return 0
+    
     def get_account_email_count(self, user_id: int, account_email: str) -> int:
         """获取指定邮箱账户的邮件数量"""
         try:
@@ -1759,7 +2315,7 @@ class Database:
             # 尝试从缓存获取
             cached_result = cache.get(cache_key)
             if cached_result:
-                logger.debug(f"邮件列表缓存命中: user_id={user_id}, page={page}")
+                logger.debug("邮件列表缓存命中: user_id=%s, page=%s", user_id, page)
                 return cached_result['emails'], cached_result['total']
         
         try:
@@ -1835,27 +2391,61 @@ class Database:
                         where_conditions.append("(attachments IS NULL OR attachments = '' OR attachments = '[]')")
                 
                 where_clause = ' AND '.join(where_conditions)
+                offset = (page - 1) * per_page
+                
+                # 总数按筛选条件单独缓存（与页码无关，翻页时复用）；
+                # 键以 emails:user:{user_id}: 开头，随邮件列表缓存一起失效
+                count_cache_key = None
+                total = None
+                if cache and cache.is_connected():
+                    count_cache_key = cache.generate_cache_key(
+                        'emails:user', user_id, 'count',
+                        search=search, category=category, provider=provider, processed=processed,
+                        accounts=accounts, time_range=time_range, has_attachment=has_attachment
+                    )
+                    cached_total = cache.get(count_cache_key)
+                    if isinstance(cached_total, int):
+                        total = cached_total
                 
-                # 优化：使用窗口函数一次查询获取数据和总数
-                data_sql = f'''
-                    WITH email_data AS (
+                if total is not None:
+                    # 总数已知：只查询当前页
+                    cursor.execute(f'''
                         SELECT id, subject, sender, date, summary, ai_summary, processed, 
-                               account_email, provider, importance, category, created_at,
-                               COUNT(*) OVER() as total_count,
-                               ROW_NUMBER() OVER(ORDER BY date DESC, created_at DESC) as row_num
+                               account_email, provider, importance, category, created_at
                         FROM emails
                         WHERE {where_clause}
-                    )
-                    SELECT * FROM email_data
-                    WHERE row_num > ? AND row_num <= ?
-                '''
-                
-                offset = (page - 1) * per_page
-                params.extend([offset, offset + per_page])
-                cursor.execute(data_sql, params)
-                
-                rows = cursor.fetchall()
-                total = rows[0]['total_count'] if rows else 0
+                        ORDER BY date DESC, created_at DESC
+                        LIMIT ? OFFSET ?
+                    ''', params + [per_page, offset])
+                    rows = cursor.fetchall()
+                else:
+                    # 优化：使用窗口函数一次查询获取数据和总数
+                    data_sql = f'''
+                        WITH email_data AS (
+                            SELECT id, subject, sender, date, summary, ai_summary, processed, 
+                                   account_email, provider, importance, category, created_at,
+                                   COUNT(*) OVER() as total_count,
+                                   ROW_NUMBER() OVER(ORDER BY date DESC, created_at DESC) as row_num
+                            FROM emails
+                            WHERE {where_clause}
+                        )
+                        SELECT * FROM email_data
+                        WHERE row_num > ? AND row_num <= ?
+                    '''
+                    cursor.execute(data_sql, params + [offset, offset + per_page])
+                    rows = cursor.fetchall()
+                    
+                    if rows:
+                        total = rows[0]['total_count']
+                    elif offset > 0:
+                        # 超出范围的页没有返回行，单独统计总数
+                        cursor.execute(f'SELECT COUNT(*) FROM emails WHERE {where_clause}', params)
+                        total = cursor.fetchone()[0]
+                    else:
+                        total = 0
+                    
+                    if count_cache_key:
+                        cache.set(count_cache_key, total, EMAIL_COUNT_CACHE_TTL)
                 
                 emails = []
                 for row in rows:
@@ -1882,7 +2472,7 @@ class Database:
                         'cached_at': datetime.now().isoformat()
                     }
                     cache.set(cache_key, cache_data, Config.CACHE_TTL['email_list'])
-                    logger.debug(f"邮件列表已缓存: user_id={user_id}, page={page}, count={len(emails)}")
+                    logger.debug("邮件列表已缓存: user_id=%s, page=%s, count=%s", user_id, page, len(emails))
                 
                 return emails, total
                 
@@ -1922,12 +2512,12 @@ class Database:
                         # 清除普通邮件列表缓存，因为删除的邮件不应该出现在那里
                         email_pattern = f"emails:user:{user_id}:*"
                         email_count = cache.delete_pattern(email_pattern)
-                        logger.debug(f"软删除邮件后清除邮件列表缓存: {email_count} 个键")
+                        logger.debug("软删除邮件后清除邮件列表缓存: %s 个键", email_count)
                         
                         # 清除已删除邮件列表缓存，因为新删除的邮件应该出现在那里
                         deleted_pattern = f"deleted_emails:user:{user_id}:*"
                         deleted_count = cache.delete_pattern(deleted_pattern)
-                        logger.debug(f"软删除邮件后清除已删除邮件缓存: {deleted_count} 个键")
+                        logger.debug("软删除邮件后清除已删除邮件缓存: %s 个键", deleted_count)
                         
                         # 清除用户统计缓存
                         cache.invalidate_user_cache(user_id, 'delete_email')
@@ -1954,7 +2544,7 @@ class Database:
                         # 清除已删除邮件列表的所有分页缓存
                         cache_pattern = f"deleted_emails:user:{user_id}:*"
                         deleted_count = cache.delete_pattern(cache_pattern)
-                        logger.debug(f"彻底删除邮件后清除已删除邮件缓存: {deleted_count} 个键")
+                        logger.debug("彻底删除邮件后清除已删除邮件缓存: %s 个键", deleted_count)
                         
                         # 清除用户统计缓存
                         cache.invalidate_user_cache(user_id, 'purge_email')
@@ -1965,6 +2555,66 @@ class Database:
             logger.error(f"彻底删除邮件失败: {e}")
             return False
     
+    def _bulk_update_emails_by_ids(self, sql_template: str, email_ids: List[int], user_id: int,
+                                   leading_params: tuple = ()) -> int:
+        """对一组邮件ID分批执行同一条语句（单个事务），返回影响行数"""
+        email_ids = [email_id for email_id in email_ids if email_id]
+        if not email_ids:
+            return 0
+        
+        affected = 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(email_ids), 500):
+                batch = email_ids[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                cursor.execute(sql_template.format(placeholders=placeholders),
+                               (*leading_params, *batch, user_id))
+                affected += cursor.rowcount
+            conn.commit()
+        return affected
+    
+    def bulk_soft_delete(self, email_ids: List[int], user_id: int) -> int:
+        """批量软删除邮件（一个事务），返回删除数量"""
+        try:
+            deleted = self._bulk_update_emails_by_ids(
+                'UPDATE emails SET deleted = 1, updated_at = ? WHERE id IN ({placeholders}) AND user_id = ?',
+                email_ids, user_id, leading_params=(datetime.now().isoformat(),)
+            )
+            
+            if deleted:
+                cache = get_cache_service()
+                if cache and cache.is_connected():
+                    cache.delete_pattern(f"emails:user:{user_id}:*")
+                    cache.delete_pattern(f"deleted_emails:user:{user_id}:*")
+                    cache.invalidate_user_cache(user_id, 'delete_email')
+            
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"批量软删除邮件失败: {e}")
+            return 0
+    
+    def bulk_purge(self, email_ids: List[int], user_id: int) -> int:
+        """批量彻底删除邮件（一个事务），返回删除数量"""
+        try:
+            deleted = self._bulk_update_emails_by_ids(
+                'DELETE FROM emails WHERE id IN ({placeholders}) AND user_id = ?',
+                email_ids, user_id
+            )
+            
+            if deleted:
+                cache = get_cache_service()
+                if cache and cache.is_connected():
+                    cache.delete_pattern(f"deleted_emails:user:{user_id}:*")
+                    cache.invalidate_user_cache(user_id, 'purge_email')
+            
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"批量彻底删除邮件失败: {e}")
+            return 0
+    
     def restore_email(self, email_id: int, user_id: int) -> bool:
         """恢复软删除的邮件"""
         try:
@@ -1986,12 +2636,12 @@ class Database:
                         # 清除已删除邮件列表的所有分页缓存
                         cache_pattern = f"deleted_emails:user:{user_id}:*"
                         deleted_count = cache.delete_pattern(cache_pattern)
-                        logger.debug(f"恢复邮件后清除已删除邮件缓存: {deleted_count} 个键")
+                        logger.debug("恢复邮件后清除已删除邮件缓存: %s 个键", deleted_count)
                         
                         # 清除普通邮件列表缓存，因为恢复的邮件会出现在那里
                         email_pattern = f"emails:user:{user_id}:*"
                         email_count = cache.delete_pattern(email_pattern)
-                        logger.debug(f"恢复邮件后清除邮件列表缓存: {email_count} 个键")
+                        logger.debug("恢复邮件后清除邮件列表缓存: %s 个键", email_count)
                         
                         # 清除用户统计缓存
                         cache.invalidate_user_cache(user_id, 'restore_email')
@@ -2025,7 +2675,7 @@ class Database:
             # 尝试从缓存获取
             cached_result = cache.get(cache_key)
             if cached_result:
-                logger.debug(f"已删除邮件列表缓存命中: user_id={user_id}, page={page}")
+                logger.debug("已删除邮件列表缓存命中: user_id=%s, page=%s", user_id, page)
                 return cached_result['emails'], cached_result['total']
         
         try:
@@ -2058,27 +2708,60 @@ class Database:
                     params.append(int(processed))
                 
                 where_clause = ' AND '.join(where_conditions)
+                offset = (page - 1) * per_page
                 
-                # 优化：使用窗口函数一次查询获取数据和总数
-                data_sql = f'''
-                    WITH email_data AS (
+                # 总数按筛选条件单独缓存（与页码无关，翻页时复用）；
+                # 键以 deleted_emails:user:{user_id}: 开头，随回收站列表缓存一起失效
+                count_cache_key = None
+                total = None
+                if cache and cache.is_connected():
+                    count_cache_key = cache.generate_cache_key(
+                        'deleted_emails:user', user_id, 'count',
+                        search=search, category=category, provider=provider, processed=processed
+                    )
+                    cached_total = cache.get(count_cache_key)
+                    if isinstance(cached_total, int):
+                        total = cached_total
+                
+                if total is not None:
+                    # 总数已知：只查询当前页
+                    cursor.execute(f'''
                         SELECT id, subject, sender, date, summary, ai_summary, processed, 
-                               account_email, provider, importance, category, created_at,
-                               COUNT(*) OVER() as total_count,
-                               ROW_NUMBER() OVER(ORDER BY date DESC, created_at DESC) as row_num
+                               account_email, provider, importance, category, created_at
                         FROM emails
                         WHERE {where_clause}
-                    )
-                    SELECT * FROM email_data
-                    WHERE row_num > ? AND row_num <= ?
-                '''
-                
-                offset = (page - 1) * per_page
-                params.extend([offset, offset + per_page])
-                cursor.execute(data_sql, params)
-                
-                rows = cursor.fetchall()
-                total = rows[0]['total_count'] if rows else 0
+                        ORDER BY date DESC, created_at DESC
+                        LIMIT ? OFFSET ?
+                    ''', params + [per_page, offset])
+                    rows = cursor.fetchall()
+                else:
+                    # 优化：使用窗口函数一次查询获取数据和总数
+                    data_sql = f'''
+                        WITH email_data AS (
+                            SELECT id, subject, sender, date, summary, ai_summary, processed, 
+                                   account_email, provider, importance, category, created_at,
+                                   COUNT(*) OVER() as total_count,
+                                   ROW_NUMBER() OVER(ORDER BY date DESC, created_at DESC) as row_num
+                            FROM emails
+                            WHERE {where_clause}
+                        )
+                        SELECT * FROM email_data
+                        WHERE row_num > ? AND row_num <= ?
+                    '''
+                    cursor.execute(data_sql, params + [offset, offset + per_page])
+                    rows = cursor.fetchall()
+                    
+                    if rows:
+                        total = rows[0]['total_count']
+                    elif offset > 0:
+                        # 超出范围的页没有返回行，单独统计总数
+                        cursor.execute(f'SELECT COUNT(*) FROM emails WHERE {where_clause}', params)
+                        total = cursor.fetchone()[0]
+                    else:
+                        total = 0
+                    
+                    if count_cache_key:
+                        cache.set(count_cache_key, total, EMAIL_COUNT_CACHE_TTL)
                 
                 emails = []
                 for row in rows:
@@ -2105,7 +2788,7 @@ class Database:
                         'cached_at': datetime.now().isoformat()
                     }
                     cache.set(cache_key, cache_data, Config.CACHE_TTL['email_list'])
-                    logger.debug(f"已删除邮件列表已缓存: user_id={user_id}, page={page}, count={len(emails)}")
+                    logger.debug("已删除邮件列表已缓存: user_id=%s, page=%s, count=%s", user_id, page, len(emails))
                 
                 return emails, total
                 
@@ -2179,12 +2862,12 @@ class Database:
                     # 清除所有邮件列表缓存
                     email_pattern = f"emails:user:{user_id}:*"
                     email_count = cache.delete_pattern(email_pattern)
-                    logger.debug(f"清空邮件后清除邮件列表缓存: {email_count} 个键")
+                    logger.debug("清空邮件后清除邮件列表缓存: %s 个键", email_count)
                     
                     # 清除已删除邮件列表缓存
                     deleted_pattern = f"deleted_emails:user:{user_id}:*"
                     deleted_cache_count = cache.delete_pattern(deleted_pattern)
-                    logger.debug(f"清空邮件后清除已删除邮件缓存: {deleted_cache_count} 个键")
+                    logger.debug("清空邮件后清除已删除邮件缓存: %s 个键", deleted_cache_count)
                     
                     # 清除用户统计缓存（使用'all'以清除所有相关缓存，包括recent_activity）
                     cache.invalidate_user_cache(user_id, 'all')
@@ -2231,7 +2914,7 @@ class Database:
                     # 清除所有简报列表缓存
                     digest_pattern = f"digests:user:{user_id}:*"
                     digest_count = cache.delete_pattern(digest_pattern)
-                    logger.debug(f"清空简报后清除简报列表缓存: {digest_count} 个键")
+                    logger.debug("清空简报后清除简报列表缓存: %s 个键", digest_count)
                     
                     # 清除最新简报缓存
                     latest_key = f"digest:user:{user_id}:latest"
@@ -2275,11 +2958,13 @@ class Database:
                 conn.commit()
                 logger.info(f"保存系统通知成功: user_id={user_id}, type={notification_type}, title={title}")
                 
-                # 清除该用户的通知缓存
+                # 清除该用户的通知缓存，未读数计数器直接加一（先递增版本号）
                 cache = get_cache_service()
                 if cache and cache.is_connected():
                     pattern = f"notifications:user:{user_id}:*"
                     cache.delete_pattern(pattern)
+                    self._bump_unread_notification_version(cache, user_id)
+                    cache.incr_if_exists(UNREAD_NOTIFICATION_COUNT_KEY.format(user_id=user_id))
                 
                 return True
                 
@@ -2287,6 +2972,51 @@ class Database:
             logger.error(f"保存系统通知失败: {e}")
             return False
     
+    def save_notifications_bulk(self, notifications: List[Dict]) -> int:
+        """
+        批量保存系统通知（共享一个连接，executemany一次提交）
+        
+        Args:
+            notifications: 通知列表，每项包含 user_id、title、message，
+                           可选 notification_type（默认info）
+            
+        Returns:
+            int: 保存的通知数量
+        """
+        if not notifications:
+            return 0
+        
+        try:
+            now = datetime.now().isoformat()
+            rows = [(n['user_id'], n.get('notification_type', 'info'), n['title'], n['message'], now)
+                    for n in notifications]
+            
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO system_notifications 
+                    (user_id, type, title, message, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+                
+                conn.commit()
+                logger.info(f"批量保存系统通知成功: {len(rows)} 条")
+            
+            # 清除相关用户的通知缓存，未读数计数器按新增条数累加
+            cache = get_cache_service()
+            if cache and cache.is_connected():
+                added_counts = Counter(row[0] for row in rows)
+                cache.delete_patterns([f"notifications:user:{user_id}:*" for user_id in added_counts])
+                for user_id, added in added_counts.items():
+                    self._bump_unread_notification_version(cache, user_id)
+                    cache.incr_if_exists(UNREAD_NOTIFICATION_COUNT_KEY.format(user_id=user_id), added)
+            
+            return len(rows)
+            
+        except Exception as e:
+            logger.error(f"批量保存系统通知失败: {e}")
+            return 0
+    
     def get_user_notifications(self, user_id: int, page: int = 1, 
                               per_page: int = 20, 
                               unread_only: bool = False) -> Tuple[List[Dict], int]:
@@ -2312,7 +3042,7 @@ class Database:
             # 尝试从缓存获取
             cached_result = cache.get(cache_key)
             if cached_result:
-                logger.debug(f"通知列表缓存命中: user_id={user_id}, page={page}")
+                logger.debug("通知列表缓存命中: user_id=%s, page=%s", user_id, page)
                 return cached_result['notifications'], cached_result['total']
         
         try:
@@ -2373,10 +3103,112 @@ class Database:
             logger.error(f"获取用户通知失败: {e}")
             return [], 0
     
+    def get_user_notifications_after(self, user_id: int, after_cursor: Optional[Tuple] = None,
+                                     per_page: int = 20,
+                                     unread_only: bool = False) -> Tuple[List[Dict], Optional[Tuple]]:
+        """
+        游标分页获取用户通知（不计算总数）
+        
+        Args:
+            user_id: 用户ID
+            after_cursor: 上一页最后一条的 (created_at, id)，为None时取第一页
+            per_page: 每页数量
+            unread_only: 仅获取未读通知
+            
+        Returns:
+            (notifications, next_cursor): 通知列表和下一页游标（没有下一页时为None）
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                where_conditions = ['user_id = ?']
+                params = [user_id]
+                
+                if unread_only:
+                    where_conditions.append('is_read = 0')
+                
+                if after_cursor:
+                    where_conditions.append('(created_at, id) < (?, ?)')
+                    params.extend(after_cursor)
+                
+                # 多取一条判断是否还有下一页，省去COUNT(*)
+                params.append(per_page + 1)
+                cursor.execute(f'''
+                    SELECT id, type, title, message, is_read, created_at
+                    FROM system_notifications
+                    WHERE {' AND '.join(where_conditions)}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', params)
+                
+                rows = cursor.fetchall()
+                has_next = len(rows) > per_page
+                rows = rows[:per_page]
+                
+                notifications = [{
+                    'id': row['id'],
+                    'type': row['type'],
+                    'title': row['title'],
+                    'message': row['message'],
+                    'is_read': bool(row['is_read']),
+                    'created_at': row['created_at']
+                } for row in rows]
+                
+                next_cursor = (rows[-1]['created_at'], rows[-1]['id']) if has_next else None
+                return notifications, next_cursor
+                
+        except Exception as e:
+            logger.error(f"游标分页获取用户通知失败: {e}")
+            return [], None
+    
+    def iter_user_sent_emails(self, user_id: int, after_cursor: Optional[Tuple] = None,
+                              limit: int = 50) -> Iterator[Dict]:
+        """
+        按发送时间倒序逐行读取用户已发送邮件（游标分页，供流式响应使用）
+        
+        Args:
+            user_id: 用户ID
+            after_cursor: 上一页最后一封的 (sent_at, id)，为None时从最新一封开始
+            limit: 最多读取的行数
+            
+        查询失败时抛出异常，由调用方决定如何处理
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None  # 直接按列名元组组装字典，不构造Row对象
+            
+            where_clause = 'user_id = ?'
+            params = [user_id]
+            if after_cursor:
+                where_clause += ' AND (sent_at, id) < (?, ?)'
+                params.extend(after_cursor)
+            params.append(limit)
+            
+            cursor.execute(f'''
+                SELECT {', '.join(SENT_EMAIL_COLUMNS)}
+                FROM sent_emails 
+                WHERE {where_clause}
+                ORDER BY sent_at DESC, id DESC
+                LIMIT ?
+            ''', params)
+            
+            for row in cursor:
+                yield dict(zip(SENT_EMAIL_COLUMNS, row))
+    
+    @staticmethod
+    def _bump_unread_notification_version(cache, user_id: int):
+        """未读通知写库后、更新计数器前调用，使进行中的计数器回填作废"""
+        cache.bump_version(UNREAD_NOTIFICATION_VERSION_KEY.format(user_id=user_id),
+                           UNREAD_NOTIFICATION_COUNT_TTL)
+    
     def get_unread_notification_count(self, user_id: int) -> int:
         """
         获取用户未读通知数量
         
+        计数器缺失时从数据库统计并以SET NX回填；统计期间有写操作（版本号变化）时
+        重新统计，避免把少算或多算的值缓存一小时
+        
         Args:
             user_id: 用户ID
             
@@ -2384,30 +3216,37 @@ class Database:
             int: 未读通知数量
         """
         cache = get_cache_service()
-        cache_key = f"notifications:user:{user_id}:unread_count"
-        
-        # 尝试从缓存获取
-        if cache and cache.is_connected():
-            cached_count = cache.get(cache_key)
-            if cached_count is not None:
-                return cached_count
+        cache_key = UNREAD_NOTIFICATION_COUNT_KEY.format(user_id=user_id)
+        version_keys = [UNREAD_NOTIFICATION_VERSION_KEY.format(user_id=user_id),
+                        UNREAD_NOTIFICATION_GLOBAL_VERSION_KEY]
+        use_cache = bool(cache and cache.is_connected())
         
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT COUNT(*) as count 
-                    FROM system_notifications 
-                    WHERE user_id = ? AND is_read = 0
-                ''', (user_id,))
-                
-                count = cursor.fetchone()['count']
-                
-                # 缓存结果（2分钟）
-                if cache and cache.is_connected():
-                    cache.set(cache_key, count, ttl=120)
+            for _ in range(UNREAD_NOTIFICATION_SEED_ATTEMPTS):
+                # 尝试从缓存获取
+                if use_cache:
+                    cached_count = cache.get(cache_key)
+                    if cached_count is not None:
+                        return cached_count
+                    versions = cache.get_versions(version_keys)
+                
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT COUNT(*) as count 
+                        FROM system_notifications 
+                        WHERE user_id = ? AND is_read = 0
+                    ''', (user_id,))
+                    count = cursor.fetchone()['count']
                 
-                return count
+                # 回填计数器，之后由新增/已读操作增量维护
+                if not use_cache or versions is None or cache.set_nx_if_versions(
+                        cache_key, count, UNREAD_NOTIFICATION_COUNT_TTL, version_keys, versions):
+                    return count
+                logger.debug("用户 %s 统计未读通知期间有写操作，重新统计", user_id)
+            
+            # 写操作持续发生，本次不缓存
+            return count
                 
         except Exception as e:
             logger.error(f"获取未读通知数量失败: {e}")
@@ -2435,11 +3274,12 @@ class Database:
                 
                 conn.commit()
                 
-                # 清除该用户的通知缓存
+                # 清除该用户的通知缓存（未读数计数器下次查询时重新统计）
                 cache = get_cache_service()
-                if cache and cache.is_connected():
-                    pattern = f"notifications:user:{user_id}:*"
-                    cache.delete_pattern(pattern)
+                if cache and cache.is_connected() and cursor.rowcount > 0:
+                    self._bump_unread_notification_version(cache, user_id)
+                    cache.delete_patterns([f"notifications:user:{user_id}:*",
+                                           UNREAD_NOTIFICATION_COUNT_KEY.format(user_id=user_id)])
                 
                 return cursor.rowcount > 0
                 
@@ -2469,11 +3309,15 @@ class Database:
                 conn.commit()
                 logger.info(f"标记用户 {user_id} 的所有通知为已读，共 {cursor.rowcount} 条")
                 
-                # 清除该用户的通知缓存
+                # 未读数计数器下次查询时重新统计（不直接置零，避免覆盖此后新增通知的计数；
+                # 没有更新任何行时也删除，纠正可能不准确的计数器）
                 cache = get_cache_service()
                 if cache and cache.is_connected():
-                    pattern = f"notifications:user:{user_id}:*"
-                    cache.delete_pattern(pattern)
+                    self._bump_unread_notification_version(cache, user_id)
+                    patterns = [UNREAD_NOTIFICATION_COUNT_KEY.format(user_id=user_id)]
+                    if cursor.rowcount > 0:
+                        patterns.append(f"notifications:user:{user_id}:*")
+                    cache.delete_patterns(patterns)
                 
                 return True
                 
@@ -2502,11 +3346,12 @@ class Database:
                 
                 conn.commit()
                 
-                # 清除该用户的通知缓存
+                # 清除该用户的通知缓存（未读数计数器下次查询时重新统计）
                 cache = get_cache_service()
-                if cache and cache.is_connected():
-                    pattern = f"notifications:user:{user_id}:*"
-                    cache.delete_pattern(pattern)
+                if cache and cache.is_connected() and cursor.rowcount > 0:
+                    self._bump_unread_notification_version(cache, user_id)
+                    cache.delete_patterns([f"notifications:user:{user_id}:*",
+                                           UNREAD_NOTIFICATION_COUNT_KEY.format(user_id=user_id)])
                 
                 return cursor.rowcount > 0
                 
@@ -2529,21 +3374,31 @@ class Database:
             
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    DELETE FROM system_notifications 
-                    WHERE created_at < ?
-                ''', (cutoff_date,))
                 
-                conn.commit()
-                deleted_count = cursor.rowcount
+                # 分批删除，每批一个短事务，避免长时间持有写锁
+                deleted_count = 0
+                while True:
+                    cursor.execute('''
+                        DELETE FROM system_notifications 
+                        WHERE id IN (
+                            SELECT id FROM system_notifications
+                            WHERE created_at < ?
+                            LIMIT ?
+                        )
+                    ''', (cutoff_date, NOTIFICATION_CLEANUP_BATCH_SIZE))
+                    conn.commit()
+                    deleted_count += cursor.rowcount
+                    if cursor.rowcount < NOTIFICATION_CLEANUP_BATCH_SIZE:
+                        break
                 
                 logger.info(f"清理 {days} 天前的旧通知，共删除 {deleted_count} 条")
                 
-                # 清除所有通知相关缓存
+                # 清除所有通知相关缓存（递增全局版本号，使所有用户进行中的计数器回填作废）
                 cache = get_cache_service()
                 if cache and cache.is_connected():
-                    pattern = "notifications:*"
-                    cache.delete_pattern(pattern)
+                    cache.bump_version(UNREAD_NOTIFICATION_GLOBAL_VERSION_KEY, UNREAD_NOTIFICATION_COUNT_TTL)
+                    cache.delete_patterns(["notifications:*",
+                                           UNREAD_NOTIFICATION_COUNT_KEY.format(user_id='*')])
                 
                 return deleted_count
                 
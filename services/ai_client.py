@@ -6,16 +6,19 @@ AI邮件简报系统 - AI客户端
 """
 
 import requests
+import hashlib
 import json
 import logging
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Callable
 import re
 from datetime import datetime
 
 from config import Config
 from services.translation_service import translation_service
+from utils.rate_limiter import glm_limiter, estimate_tokens, load_glm_limits
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +40,7 @@ class AIClient:
                 self.api_key = db.get_system_config('glm_api_key', Config.GLM_API_KEY)
                 self.base_url = Config.GLM_BASE_URL
                 self.model = db.get_system_config('glm_model', Config.GLM_MODEL)
+                load_glm_limits(db)
             elif self.provider == 'openai':
                 self.api_key = db.get_system_config('openai_api_key', Config.OPENAI_API_KEY)
                 self.base_url = Config.OPENAI_BASE_URL
@@ -141,8 +145,9 @@ class AIClient:
         }
         
         try:
-            response = requests.post(
+            response = glm_limiter.post(
                 f"{self.base_url}/chat/completions",
+                estimated_tokens=estimate_tokens(prompt),
                 headers=headers,
                 json=payload,
                 timeout=30
@@ -279,45 +284,94 @@ class AIClient:
             logger.error(f"生成邮件摘要时出错: {e}")
             return self._generate_fallback_summary(email_data)
     
-    def batch_summarize(self, emails: List[Dict]) -> List[Dict]:
-        """批量生成邮件摘要"""
-        if not emails:
-            return []
-        
-        logger.info(f"开始批量生成 {len(emails)} 封邮件的摘要")
+    def _summary_cluster_key(self, email_data: Dict) -> tuple:
+        """
+        近似重复邮件的聚类键: (发件人, 去掉回复/转发前缀的主题, 正文指纹)
         
-        processed_emails = []
+        订单/物流通知、CI通知、同一线程的回复等常常发件人和主题都相同而正文不同，
+        只有正文（忽略空白和大小写）也一致的邮件才共用一次摘要
+        """
+        sender = (email_data.get('sender', '') or '').strip().lower()
+        subject = email_data.get('subject', '') or ''
+        subject = re.sub(r'^\s*((re|fw|fwd|回复|答复|转发)\s*[:：]\s*)+', '', subject, flags=re.IGNORECASE)
+        subject = re.sub(r'\s+', ' ', subject).strip().lower()
+        body = re.sub(r'\s+', ' ', email_data.get('body', '') or '').strip().lower()
+        body_fingerprint = hashlib.md5(body.encode('utf-8')).hexdigest()
+        return (sender, subject, body_fingerprint)
+    
+    def _summarize_chunk(self, chunk: List[Dict]) -> int:
+        """顺序处理一批邮件的摘要，返回成功数"""
         success_count = 0
-        
-        for i, email_data in enumerate(emails):
+        for i, email_data in enumerate(chunk):
             try:
-                logger.debug(f"处理邮件 {i+1}/{len(emails)}: {email_data.get('subject', 'Unknown')}")
+                logger.debug(f"处理邮件: {email_data.get('subject', 'Unknown')}")
                 
                 # 检查邮件内容是否有效
                 if not email_data.get('body', '').strip() and not email_data.get('subject', '').strip():
                     email_data['ai_summary'] = "邮件内容为空"
-                    email_data['processed'] = True
                 else:
                     # 生成AI摘要
-                    ai_summary = self.summarize_email(email_data)
-                    email_data['ai_summary'] = ai_summary
-                    email_data['processed'] = True
+                    email_data['ai_summary'] = self.summarize_email(email_data)
                     success_count += 1
+                email_data['processed'] = True
                 
-                processed_emails.append(email_data)
-                
-                # 添加延迟避免API限制
-                if i < len(emails) - 1:  # 不是最后一封邮件
+                # 添加延迟避免API限制（GLM调用已由glm_limiter按RPM/TPM限流）
+                if self.provider != 'glm' and i < len(chunk) - 1:  # 不是本批最后一封邮件
                     time.sleep(0.5)  # 500ms延迟
                     
             except Exception as e:
                 logger.error(f"处理邮件摘要时出错: {e}")
                 email_data['ai_summary'] = self._generate_fallback_summary(email_data)
                 email_data['processed'] = True
-                processed_emails.append(email_data)
+        return success_count
+    
+    def batch_summarize(self, emails: List[Dict], batch_size: Optional[int] = None,
+                        max_workers: Optional[int] = None) -> List[Dict]:
+        """批量生成邮件摘要
         
-        logger.info(f"批量摘要生成完成: {success_count}/{len(emails)} 成功")
-        return processed_emails
+        发件人、主题和正文都相同的重复邮件只请求一次AI摘要并复用结果；
+        其余邮件按batch_size分批，多个批次并发提交。
+        
+        Args:
+            emails: 邮件列表
+            batch_size: 每批邮件数，默认Config.SUMMARY_BATCH_SIZE
+            max_workers: 并发批次数，默认Config.SUMMARY_MAX_WORKERS
+            
+        Returns:
+            填充了ai_summary和processed字段的邮件列表（顺序不变）
+        """
+        if not emails:
+            return []
+        
+        batch_size = max(1, batch_size or Config.SUMMARY_BATCH_SIZE)
+        max_workers = max(1, max_workers or Config.SUMMARY_MAX_WORKERS)
+        
+        # 聚类近似重复邮件，每个簇只取第一封作为代表
+        clusters = {}
+        for email_data in emails:
+            clusters.setdefault(self._summary_cluster_key(email_data), []).append(email_data)
+        representatives = [members[0] for members in clusters.values()]
+        
+        chunks = [representatives[i:i + batch_size] for i in range(0, len(representatives), batch_size)]
+        logger.info(f"开始批量生成 {len(emails)} 封邮件的摘要"
+                    f"（合并为 {len(representatives)} 个请求，{len(chunks)} 批）")
+        
+        if len(chunks) == 1:
+            success_count = self._summarize_chunk(chunks[0])
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)),
+                                    thread_name_prefix="summary") as executor:
+                success_count = sum(executor.map(self._summarize_chunk, chunks))
+        
+        # 将代表邮件的摘要复用到同簇其他邮件
+        for members in clusters.values():
+            leader = members[0]
+            for email_data in members[1:]:
+                email_data['ai_summary'] = leader.get('ai_summary') or self._generate_fallback_summary(email_data)
+                email_data['processed'] = True
+        
+        logger.info(f"批量摘要生成完成: {success_count}/{len(representatives)} 成功")
+        return list(emails)
     
     def summarize_email_with_async_translation(self, email_data: Dict, callback: Optional[Callable] = None) -> str:
         """生成邮件摘要并异步翻译"""
@@ -421,8 +475,8 @@ class AIClient:
                         'success': success_count
                     })
                 
-                # 添加延迟避免API限制
-                if i < len(emails) - 1:  # 不是最后一封邮件
+                # 添加延迟避免API限制（GLM调用已由glm_limiter按RPM/TPM限流）
+                if self.provider != 'glm' and i < len(emails) - 1:  # 不是最后一封邮件
                     time.sleep(0.5)  # 500ms延迟
                     
             except Exception as e:
@@ -724,8 +778,9 @@ class AIClient:
         }
         
         try:
-            response = requests.post(
+            response = glm_limiter.post(
                 f"{self.base_url}/chat/completions",
+                estimated_tokens=estimate_tokens(prompt),
                 headers=headers,
                 json=payload,
                 timeout=30
@@ -868,8 +923,9 @@ class AIClient:
         logger.info(f"GLM Function Call 请求: {json.dumps(payload, ensure_ascii=False, indent=2)}")
         
         try:
-            response = requests.post(
+            response = glm_limiter.post(
                 f"{self.base_url}/chat/completions",
+                estimated_tokens=estimate_tokens(json.dumps(messages, ensure_ascii=False)),
                 headers=headers,
                 json=payload,
                 timeout=60  # Function Call可能需要更长时间
@@ -14,6 +14,9 @@ import time
 
 logger = logging.getLogger(__name__)
 
+# 批量导入时每个事务写入的邮件数（兼顾内存占用和进度更新频率）
+EMAIL_SAVE_BATCH_SIZE = 500
+
 @celery_app.task(bind=True, max_retries=3)
 def process_user_emails_async(self, user_id: int):
     """
@@ -50,6 +53,7 @@ def process_user_emails_async(self, user_id: int):
         since_days = int(user_configs.get('check_days_back', '1'))
         
         all_new_emails = []
+        account_passwords = db.get_account_passwords(user_id)
         
         self.update_state(
             state='PROGRESS',
@@ -62,16 +66,9 @@ def process_user_emails_async(self, user_id: int):
                 continue
             
             try:
-                # 获取账户密码
-                with db.get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT password FROM email_accounts WHERE id = ?', (account['id'],))
-                    row = cursor.fetchone()
-                    password = row['password'] if row else ''
-                
                 account_info = {
                     'email': account['email'],
-                    'password': password,
+                    'password': account_passwords.get(account['id'], ''),
                     'provider': account['provider']
                 }
                 
@@ -181,14 +178,9 @@ def process_user_emails_async(self, user_id: int):
             meta={'current': 85, 'total': 100, 'status': '正在保存邮件...'}
         )
         
-        saved_count = 0
-        for email_data in summarized_emails:
-            try:
-                db.save_email(email_data)
-                saved_count += 1
-            except Exception as e:
-                logger.error(f"保存邮件失败: {e}")
-                continue
+        # 单个事务批量写入，失败时save_emails_bulk内部退回逐封保存
+        saved_ids = db.save_emails_bulk(summarized_emails)
+        saved_count = len(saved_ids)
         
         logger.info(f"用户 {user_id} 成功保存 {saved_count} 封邮件")
         
@@ -213,7 +205,8 @@ def process_user_emails_async(self, user_id: int):
                 meta={'current': 95, 'total': 100, 'status': '正在生成简报...'}
             )
             
-            recent_emails, _ = db.get_user_emails_filtered(user_id, page=1, per_page=saved_count)
+            # 按ID精确取回刚保存的邮件（包含数据库ID），并发写入的其他邮件不会混入
+            recent_emails = db.get_emails_by_ids(saved_ids, user_id=user_id)
             if recent_emails:
                 # 异步提交简报生成任务,不阻塞主流程
                 # Celery任务通常由手动触发，传递is_manual_fetch=True
@@ -321,6 +314,52 @@ def generate_digest_async(self, emails: list, user_id: int, is_manual_fetch: boo
         return {'success': False, 'error': str(e)}
 
 
+@celery_app.task(bind=True)
+def generate_user_digest(self, user_id: int, email_ids: list, is_manual_fetch: bool = False,
+                         total_found: int = None):
+    """
+    根据已保存的邮件ID异步生成用户简报（邮件收取完成后调用，不占用收取并发名额）
+    
+    Args:
+        user_id: 用户ID
+        email_ids: 已保存邮件的数据库ID列表
+        is_manual_fetch: 是否为手动收取
+        total_found: 去重前发现的邮件数（用于通知文案）
+        
+    Returns:
+        dict: 生成结果 {'success': bool}
+    """
+    try:
+        db = Database()
+        digest_generator = DigestGenerator()
+        
+        fetch_type = "手动" if is_manual_fetch else "定时"
+        logger.info(f"[Celery] 任务 {self.request.id} 开始为用户 {user_id} 生成简报（{fetch_type}收取）")
+        
+        emails = db.get_emails_by_ids(email_ids, user_id=user_id)
+        if not emails:
+            logger.warning(f"[Celery] 用户 {user_id} 无法获取已保存的邮件用于生成简报")
+            return {'success': False, 'error': '邮件不存在'}
+        
+        digest = digest_generator.create_digest(emails, is_manual_fetch=is_manual_fetch)
+        db.save_digest(digest, user_id=user_id)
+        
+        logger.info(f"[Celery] 用户 {user_id} 简报生成完成: {digest.get('title', 'Unknown')}")
+        
+        db.save_notification(
+            user_id=user_id,
+            title="新邮件到达",
+            message=f"成功收取并处理了 {len(emails)} 封新邮件，已生成邮件简报。去重前共发现 {total_found or len(emails)} 封邮件。",
+            notification_type='success'
+        )
+        
+        return {'success': True, 'digest_id': digest.get('id')}
+        
+    except Exception as e:
+        logger.error(f"[Celery] 简报生成失败: {e}", exc_info=True)
+        return {'success': False, 'error': str(e)}
+
+
 @celery_app.task(bind=True, max_retries=3)
 def import_all_emails_async(self, user_id: int, days_back: int = 180):
     """
@@ -370,6 +409,7 @@ def import_all_emails_async(self, user_id: int, days_back: int = 180):
         
         all_imported_emails = []
         total_found = 0
+        account_passwords = db.get_account_passwords(user_id)
         
         # 逐个处理邮箱账户
         for account_idx, account in enumerate(active_accounts):
@@ -390,16 +430,9 @@ def import_all_emails_async(self, user_id: int, days_back: int = 180):
                     }
                 )
                 
-                # 获取账户密码
-                with db.get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT password FROM email_accounts WHERE id = ?', (account['id'],))
-                    row = cursor.fetchone()
-                    password = row['password'] if row else ''
-                
                 account_info = {
                     'email': account_email,
-                    'password': password,
+                    'password': account_passwords.get(account['id'], ''),
                     'provider': account['provider']
                 }
                 
@@ -487,30 +520,25 @@ def import_all_emails_async(self, user_id: int, days_back: int = 180):
                 'duplicates_removed': total_found
             }
         
-        # 批量保存邮件
+        # 批量保存邮件（每批一个事务）
         saved_count = 0
-        for idx, email_data in enumerate(deduplicated_emails):
-            try:
-                db.save_email(email_data)
-                saved_count += 1
-                
-                # 每10封更新一次进度
-                if saved_count % 10 == 0:
-                    progress = 95 + int((saved_count / len(deduplicated_emails)) * 4)  # 95-99%
-                    self.update_state(
-                        state='PROGRESS',
-                        meta={
-                            'current': progress,
-                            'total': 100,
-                            'imported': saved_count,
-                            'total_found': total_found,
-                            'current_account': '',
-                            'status': f'正在保存... {saved_count}/{len(deduplicated_emails)}'
-                        }
-                    )
-            except Exception as e:
-                logger.error(f"保存邮件失败: {e}")
-                continue
+        for start in range(0, len(deduplicated_emails), EMAIL_SAVE_BATCH_SIZE):
+            batch = deduplicated_emails[start:start + EMAIL_SAVE_BATCH_SIZE]
+            saved_count += len(db.save_emails_bulk(batch))
+            
+            # 每批更新一次进度
+            progress = 95 + int((start + len(batch)) / len(deduplicated_emails) * 4)  # 95-99%
+            self.update_state(
+                state='PROGRESS',
+                meta={
+                    'current': progress,
+                    'total': 100,
+                    'imported': saved_count,
+                    'total_found': total_found,
+                    'current_account': '',
+                    'status': f'正在保存... {saved_count}/{len(deduplicated_emails)}'
+                }
+            )
         
         logger.info(f"用户 {user_id} 成功导入 {saved_count} 封邮件")
         
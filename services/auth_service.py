@@ -14,9 +14,17 @@ from flask import session, request, redirect, url_for, flash, g
 import logging
 
 from models.database import Database
+from services.cache_service import cache_service
 
 logger = logging.getLogger(__name__)
 
+# 会话令牌 -> 用户信息 缓存在Redis中（所有worker共享，登出/停用时可统一删除），
+# 同一浏览器连续请求时不必每次查库；Redis不可用时每次查库
+SESSION_CACHE_KEY_TEMPLATE = 'auth_session:user:{user_id}:{token_digest}'
+SESSION_CACHE_TTL = 30
+# 登出/失效时递增，查库期间版本号变化则不回填缓存，避免把刚失效的会话重新缓存
+SESSION_VERSION_KEY_TEMPLATE = 'auth_session_ver:user:{user_id}'
+
 class AuthService:
     def __init__(self):
         self.db = Database()
@@ -163,24 +171,73 @@ class AuthService:
         else:
             return False, "创建会话失败", None
     
+    @staticmethod
+    def _session_cache_key(user_id: int, session_token: str) -> str:
+        """缓存键使用令牌摘要，Redis中不保留原始令牌；按用户分组，便于删除某用户的全部会话缓存"""
+        token_digest = hashlib.blake2b(session_token.encode(), digest_size=16).hexdigest()
+        return SESSION_CACHE_KEY_TEMPLATE.format(user_id=user_id, token_digest=token_digest)
+    
+    def invalidate_user_sessions(self, user_id: int):
+        """删除用户所有会话的缓存（资料修改、停用账户后调用，所有worker立即生效）"""
+        cache_service.bump_version(SESSION_VERSION_KEY_TEMPLATE.format(user_id=user_id), SESSION_CACHE_TTL)
+        cache_service.delete_pattern(SESSION_CACHE_KEY_TEMPLATE.format(user_id=user_id, token_digest='*'))
+    
+    @staticmethod
+    def _session_expired(user: Dict) -> bool:
+        """缓存的会话是否已过期（expires_at 格式无法解析时视为过期，回库确认）"""
+        try:
+            return datetime.fromisoformat(user['expires_at']) <= datetime.now()
+        except (KeyError, TypeError, ValueError):
+            return True
+    
     def logout_user(self) -> bool:
         """用户登出"""
         session_token = session.get('session_token')
         if session_token:
+            # 先删除数据库会话再删缓存，避免其他worker在两步之间重新缓存
             self.db.delete_user_session(session_token)
+            user_id = session.get('user_id')
+            if user_id is not None:
+                cache_service.bump_version(SESSION_VERSION_KEY_TEMPLATE.format(user_id=user_id),
+                                           SESSION_CACHE_TTL)
+                cache_service.delete(self._session_cache_key(user_id, session_token))
         
         # 清除Flask会话
         session.clear()
         return True
     
     def get_current_user(self) -> Optional[Dict]:
-        """获取当前登录用户"""
+        """获取当前登录用户（同一请求内复用；跨请求按会话令牌短时缓存）"""
         session_token = session.get('session_token')
         if not session_token:
             return None
         
-        user = self.db.get_user_by_session(session_token)
+        # 按会话令牌缓存在g上，登录/登出后令牌变化自动失效
+        cached = g.get('_current_user')
+        if cached is not None and cached[0] == session_token:
+            return cached[1]
+        
+        user = None
+        user_id = session.get('user_id')
+        cache_key = version_keys = versions = None
+        if user_id is not None:
+            cache_key = self._session_cache_key(user_id, session_token)
+            cached_user = cache_service.get(cache_key)
+            # 缓存命中时仍校验有效期和账户状态；登出/停用通过删除缓存立即生效
+            if (isinstance(cached_user, dict) and cached_user.get('id') == user_id
+                    and cached_user.get('is_active') and not self._session_expired(cached_user)):
+                user = cached_user
+            else:
+                version_keys = [SESSION_VERSION_KEY_TEMPLATE.format(user_id=user_id)]
+                versions = cache_service.get_versions(version_keys)
+        
+        if user is None:
+            user = self.db.get_user_by_session(session_token)
+            if user and versions is not None and user['id'] == user_id:
+                cache_service.set_nx_if_versions(cache_key, user, SESSION_CACHE_TTL, version_keys, versions)
+        
         if user:
+            g._current_user = (session_token, user)
             # 更新Flask会话中的用户信息
             g.current_user = user
             return user
@@ -266,6 +323,8 @@ class AuthService:
         try:
             success = self.db.update_user_profile(user_id, email, full_name)
             if success:
+                g.pop('_current_user', None)
+                self.invalidate_user_sessions(user_id)
                 logger.info(f"用户 {user_id} 资料更新成功")
                 return True, "资料更新成功"
             else:
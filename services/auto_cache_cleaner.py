@@ -11,6 +11,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List
 from services.cache_service import cache_service
 from models.database import Database
+from config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +59,11 @@ class AutoCacheCleaner:
             cleanup_stats['categories']['oversized_cache'] = oversized_cleared
             cleanup_stats['total_cleared'] += oversized_cleared
             
+            # 6. 清理过期的翻译缓存（数据库表）
+            translation_cleared = self.db.cleanup_translation_cache(Config.TRANSLATION_CACHE_TTL_DAYS)
+            cleanup_stats['categories']['translation_cache'] = translation_cleared
+            cleanup_stats['total_cleared'] += translation_cleared
+            
             cleanup_stats['end_time'] = datetime.now().isoformat()
             cleanup_stats['success'] = True
             
@@ -204,10 +210,7 @@ class AutoCacheCleaner:
             # 获取所有活跃用户ID
             active_users = set()
             try:
-                with self.db.get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT id FROM users WHERE is_active = 1')
-                    active_users = {row['id'] for row in cursor.fetchall()}
+                active_users = set(self.db.get_active_user_ids())
             except Exception as e:
                 logger.error(f"获取活跃用户列表失败: {e}")
                 return 0
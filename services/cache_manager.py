@@ -108,10 +108,7 @@ class CacheManager:
                 f'config:user:{user_id}:*'
             ]
             
-            total_cleared = 0
-            for pattern in patterns:
-                cleared = self.cache.delete_pattern(pattern)
-                total_cleared += cleared
+            total_cleared = self.cache.delete_patterns(patterns)
             
             return {
                 'success': True,
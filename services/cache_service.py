@@ -8,6 +8,8 @@ import redis
 import json
 import hashlib
 import logging
+import re
+from fnmatch import fnmatchcase
 from typing import Any, Optional, Dict, List
 from datetime import datetime, timedelta
 from functools import wraps
@@ -16,6 +18,54 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+# 每条UNLINK命令携带的最大键数
+DELETE_BATCH_SIZE = 500
+
+_INCR_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+# 版本号未变化时才写入（SET NX），用于从数据库统计后回填计数器：
+# 统计期间有写操作递增了版本号时放弃写入，由调用方重新统计
+_SET_NX_IF_VERSIONS_SCRIPT = """
+local versions = {}
+for i = 2, #KEYS do
+    versions[#versions + 1] = redis.call('GET', KEYS[i]) or '0'
+end
+if table.concat(versions, ':') ~= ARGV[2] then
+    return 0
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3], 'NX') then
+    return 1
+end
+return 0
+"""
+
+# 用户级缓存键（如 emails:user:5:page:1、stats:user:5）登记到该用户的索引集合，
+# 按用户清除缓存时只需读取集合，不必SCAN整个键空间
+USER_KEY_RE = re.compile(r'^[a-z_]+:user:(\d+)(?::|$)')
+USER_KEY_PATTERN_RE = re.compile(r'^[a-z_]+:user:(\d+)(?::\*|$)')
+USER_KEY_INDEX = 'user_keys:{user_id}'
+
+# 登记键并保证索引集合的过期时间不早于其中任何一个键
+_INDEX_USER_KEY_SCRIPT = """
+local existed = redis.call('EXISTS', KEYS[1])
+redis.call('SADD', KEYS[1], ARGV[1])
+local ttl = tonumber(ARGV[2])
+if ttl <= 0 then
+    redis.call('PERSIST', KEYS[1])
+    return 1
+end
+local current = redis.call('TTL', KEYS[1])
+if existed == 0 or (current >= 0 and current < ttl) then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return 1
+"""
+
 class CacheService:
     """Redis缓存服务"""
     
@@ -117,18 +167,92 @@ class CacheService:
             else:
                 data = str(value)
             
-            # 设置缓存
+            # 设置缓存（用户级键同时登记到索引集合，同一次往返完成）
+            pipe = self.redis_client.pipeline(transaction=False)
             if ttl:
-                result = self.redis_client.setex(key, ttl, data)
+                pipe.setex(key, ttl, data)
             else:
-                result = self.redis_client.set(key, data)
+                pipe.set(key, data)
             
-            return bool(result)
+            user_match = USER_KEY_RE.match(key)
+            if user_match:
+                pipe.eval(_INDEX_USER_KEY_SCRIPT, 1,
+                          USER_KEY_INDEX.format(user_id=user_match.group(1)), key, ttl or 0)
+            
+            return bool(pipe.execute()[0])
             
         except Exception as e:
             logger.warning(f"设置缓存失败 {key}: {e}")
             return False
     
+    def incr_if_exists(self, key: str, amount: int = 1) -> Optional[int]:
+        """
+        键存在时原子地加上amount并返回新值，不存在时返回None
+        
+        用于维护计数器缓存：键过期后不会被INCR重新创建出一个不带TTL的错误值
+        """
+        if not self.is_connected():
+            return None
+        
+        try:
+            return self.redis_client.eval(_INCR_IF_EXISTS_SCRIPT, 1, key, amount)
+        except Exception as e:
+            logger.warning(f"更新计数缓存失败 {key}: {e}")
+            return None
+    
+    def get_versions(self, keys: List[str]) -> Optional[str]:
+        """读取多个版本号（不存在时为'0'），以':'连接返回；Redis不可用时返回None"""
+        if not self.is_connected():
+            return None
+        
+        try:
+            versions = [v.decode() if isinstance(v, bytes) else v for v in self.redis_client.mget(keys)]
+            return ':'.join(v or '0' for v in versions)
+        except Exception as e:
+            logger.warning(f"读取版本号失败 {keys}: {e}")
+            return None
+    
+    def bump_version(self, key: str, ttl: int):
+        """递增版本号（写操作完成后调用，使进行中的回填作废）"""
+        if not self.is_connected():
+            return
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.incr(key)
+            pipe.expire(key, ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"递增版本号失败 {key}: {e}")
+    
+    def set_nx_if_versions(self, key: str, value: Any, ttl: int,
+                           version_keys: List[str], versions: str) -> bool:
+        """
+        版本号仍为versions（get_versions的返回值）且键不存在时写入，返回是否写入
+        
+        与 bump_version 配合回填计数器：先读版本号再统计，统计期间有写操作时不写入
+        """
+        if not self.is_connected():
+            return False
+        
+        try:
+            # 与 set 相同的序列化方式，get 可以按JSON解析
+            if isinstance(value, (dict, list, tuple)):
+                data = json.dumps(value, ensure_ascii=False, default=str)
+            else:
+                data = str(value)
+            written = bool(self.redis_client.eval(_SET_NX_IF_VERSIONS_SCRIPT, 1 + len(version_keys),
+                                                  key, *version_keys, data, versions, ttl))
+            # 与 set 一样把用户级键登记到索引集合，按用户清除缓存时才能找到
+            user_match = USER_KEY_RE.match(key)
+            if written and user_match:
+                self.redis_client.eval(_INDEX_USER_KEY_SCRIPT, 1,
+                                       USER_KEY_INDEX.format(user_id=user_match.group(1)), key, ttl)
+            return written
+        except Exception as e:
+            logger.warning(f"回填缓存失败 {key}: {e}")
+            return False
+    
     def delete(self, key: str) -> bool:
         """删除缓存"""
         if not self.is_connected():
@@ -143,20 +267,83 @@ class CacheService:
     
     def delete_pattern(self, pattern: str) -> int:
         """批量删除匹配模式的缓存"""
+        return self.delete_patterns([pattern])
+    
+    def delete_patterns(self, patterns: List[str]) -> int:
+        """
+        批量删除匹配多个模式的缓存
+        
+        用户级模式（如 emails:user:5:*）从该用户的键索引集合中匹配；其余模式用SCAN
+        代替阻塞的KEYS。键按批通过一个非事务pipeline发送UNLINK（后台释放内存），
+        多个模式只需一次往返执行
+        """
         if not self.is_connected():
             return 0
         
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                result = self.redis_client.delete(*keys)
-                logger.debug(f"删除缓存模式 {pattern}: {result} 个键")
-                return result
-            return 0
+            user_patterns = {}
+            scan_patterns = []
+            for pattern in patterns:
+                user_match = USER_KEY_PATTERN_RE.match(pattern)
+                if user_match:
+                    user_patterns.setdefault(user_match.group(1), []).append(pattern)
+                else:
+                    scan_patterns.append(pattern)
+            
+            keys = []
+            index_removals = []
+            for user_id, user_key_patterns in user_patterns.items():
+                index_key = USER_KEY_INDEX.format(user_id=user_id)
+                matched = [key for key in self.redis_client.smembers(index_key)
+                           if any(fnmatchcase(key, p) for p in user_key_patterns)]
+                if matched:
+                    keys.extend(matched)
+                    index_removals.append((index_key, matched))
+            
+            for pattern in scan_patterns:
+                keys.extend(self.redis_client.scan_iter(match=pattern, count=1000))
+            
+            if not keys:
+                return 0
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            for i in range(0, len(keys), DELETE_BATCH_SIZE):
+                pipe.unlink(*keys[i:i + DELETE_BATCH_SIZE])
+            unlink_commands = len(pipe)
+            for index_key, matched in index_removals:
+                for i in range(0, len(matched), DELETE_BATCH_SIZE):
+                    pipe.srem(index_key, *matched[i:i + DELETE_BATCH_SIZE])
+            
+            result = sum(pipe.execute()[:unlink_commands])
+            if result:
+                logger.debug(f"删除缓存模式 {patterns}: {result} 个键")
+            return result
         except Exception as e:
-            logger.warning(f"批量删除缓存失败 {pattern}: {e}")
+            logger.warning(f"批量删除缓存失败 {patterns}: {e}")
             return 0
     
+    def count_keys_by_prefix(self, prefixes: List[str]) -> Dict[str, int]:
+        """
+        按前缀统计键数量
+        
+        用SCAN增量遍历一次键空间同时统计所有前缀，不使用会阻塞Redis的KEYS命令
+        """
+        counts = {prefix: 0 for prefix in prefixes}
+        if not self.is_connected():
+            return counts
+        
+        try:
+            for key in self.redis_client.scan_iter(count=1000):
+                if isinstance(key, bytes):
+                    key = key.decode('utf-8', errors='ignore')
+                for prefix in prefixes:
+                    if key.startswith(prefix):
+                        counts[prefix] += 1
+                        break
+        except Exception as e:
+            logger.warning(f"统计缓存键数量失败: {e}")
+        return counts
+    
     def exists(self, key: str) -> bool:
         """检查缓存是否存在"""
         if not self.is_connected():
@@ -191,6 +378,8 @@ class CacheService:
                 # 清除邮件相关缓存
                 patterns_to_clear.extend([
                     f'emails:user:{user_id}:*',
+                    # 回收站列表及总数（重新保存的邮件会覆盖deleted标记）
+                    f'deleted_emails:user:{user_id}:*',
                     f'stats:user:{user_id}',
                     f'email:detail:*'  # 可能影响邮件详情
                 ])
@@ -204,10 +393,7 @@ class CacheService:
                 patterns_to_clear.append(f'config:user:{user_id}:*')
             
             # 执行清除
-            total_cleared = 0
-            for pattern in patterns_to_clear:
-                cleared = self.delete_pattern(pattern)
-                total_cleared += cleared
+            total_cleared = self.delete_patterns(patterns_to_clear)
             
             if total_cleared > 0:
                 logger.info(f"用户 {user_id} 缓存失效: {action_type}, 清除 {total_cleared} 个缓存项")
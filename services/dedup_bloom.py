@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI邮件简报系统 - 邮件去重布隆过滤器
+
+在调用数据库去重之前先用布隆过滤器做一次预筛:
+- 未命中: 邮件一定没有处理过,直接视为新邮件
+- 命中: 可能重复,交给 Database.deduplicate_emails 做精确判断
+
+过滤器按用户保存为Redis位图,所有读写都在Lua脚本中原子完成(SETBIT只会置位,
+多个进程同时写入不会互相覆盖):
+- bloom:dedup:{user_id}            哈希: gen/num_blocks/num_hashes/capacity/count/ready
+- bloom:dedup:{user_id}:bits:{gen} 位图
+
+重建时先登记新的gen再读取数据库,邮件写库后由 Database.save_emails_bulk 调用
+record_saved_emails 置位,因此无论两者谁先完成,已保存的邮件都不会漏掉。
+过滤器未就绪(其他进程正在重建)或Redis不可用时直接走数据库去重。
+"""
+
+import hashlib
+import logging
+import math
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# 每个块512位(64字节),一个键的所有位都落在同一个块内
+BLOCK_BITS = 512
+
+BLOOM_KEY_TEMPLATE = 'bloom:dedup:{user_id}'
+BLOOM_BITS_KEY_TEMPLATE = 'bloom:dedup:{user_id}:bits:{gen}'
+BLOOM_TTL = 7 * 24 * 3600  # 一周未使用则过期,下次从数据库重建
+BLOOM_BUILD_TTL = 600  # 重建中的过滤器若进程异常退出,10分钟后过期
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+BLOOM_MIN_CAPACITY = 1000
+BLOOM_ADD_BATCH_SIZE = 2000  # 每次Lua调用写入的键数量
+
+# 过滤器不存在时登记新的gen,返回1;已存在(其他进程在用或在重建)返回0
+_INIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'gen', ARGV[1], 'num_blocks', ARGV[2], 'num_hashes', ARGV[3],
+           'capacity', ARGV[4], 'count', 0, 'ready', 0)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+# 置位(gen不匹配说明过滤器已被替换,返回0,新过滤器会从数据库重建出这些键)
+_ADD_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'gen') ~= ARGV[1] then
+    return 0
+end
+for i = 4, #ARGV do
+    redis.call('SETBIT', KEYS[2], ARGV[i], 1)
+end
+redis.call('HINCRBY', KEYS[1], 'count', ARGV[3])
+if redis.call('HGET', KEYS[1], 'ready') == '1' then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+redis.call('EXPIRE', KEYS[2], redis.call('TTL', KEYS[1]))
+return 1
+"""
+
+# 重建完成,标记为可用
+_READY_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'gen') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'ready', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+# 按键查询(每个键 num_hashes 个位置),返回每个键是否命中;过滤器不可用时返回nil
+_CHECK_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'gen') ~= ARGV[1] or redis.call('HGET', KEYS[1], 'ready') ~= '1' then
+    return false
+end
+local k = tonumber(ARGV[2])
+local result = {}
+for i = 3, #ARGV, k do
+    local hit = 1
+    for j = i, i + k - 1 do
+        if redis.call('GETBIT', KEYS[2], ARGV[j]) == 0 then
+            hit = 0
+            break
+        end
+    end
+    result[#result + 1] = hit
+end
+return result
+"""
+
+# 删除指定gen的过滤器(饱和后重建)
+_RESET_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'gen') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[2])
+return 1
+"""
+
+
+def bloom_layout(capacity: int, error_rate: float = BLOOM_FALSE_POSITIVE_RATE) -> Tuple[int, int, int]:
+    """按容量和误判率计算过滤器大小,返回 (capacity, num_blocks, num_hashes)"""
+    capacity = max(int(capacity), BLOOM_MIN_CAPACITY)
+    num_bits = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+    num_blocks = max(1, math.ceil(num_bits / BLOCK_BITS))
+    num_hashes = max(1, round(num_blocks * BLOCK_BITS / capacity * math.log(2)))
+    return capacity, num_blocks, num_hashes
+
+
+def bloom_positions(key: str, num_blocks: int, num_hashes: int) -> Iterable[int]:
+    """计算键在位图中的位置(双重哈希 g_i(x) = h1 + i*h2, 只做一次sha1,全部落在同一个块内)"""
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    block = int.from_bytes(digest[0:8], 'little') % num_blocks
+    h1 = int.from_bytes(digest[8:12], 'little')
+    h2 = int.from_bytes(digest[12:16], 'little') | 1
+    base = block * BLOCK_BITS
+    for i in range(num_hashes):
+        yield base + (h1 + i * h2) % BLOCK_BITS
+
+
+def email_bloom_keys(email: Dict, content_hash: Optional[str]) -> Tuple[str, ...]:
+    """邮件在过滤器中的键: email_id(Message-ID) 和 content_hash"""
+    keys = []
+    if email.get('email_id'):
+        keys.append(f"id:{email['email_id']}")
+    if content_hash:
+        keys.append(f"hash:{content_hash}")
+    return tuple(keys)
+
+
+def _bits_key(user_id: int, gen: str) -> str:
+    return BLOOM_BITS_KEY_TEMPLATE.format(user_id=user_id, gen=gen)
+
+
+def _read_meta(user_id: int) -> Optional[Dict[str, str]]:
+    """读取过滤器元数据,不存在时返回None"""
+    meta = cache_service.redis_client.hgetall(BLOOM_KEY_TEMPLATE.format(user_id=user_id))
+    if not meta:
+        return None
+    return {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in meta.items()}
+
+
+def _add_keys(user_id: int, gen: str, num_blocks: int, num_hashes: int, keys: Iterable[str]) -> bool:
+    """分批置位,gen已被替换时返回False"""
+    meta_key = BLOOM_KEY_TEMPLATE.format(user_id=user_id)
+    bits_key = _bits_key(user_id, gen)
+    batch = []
+
+    def flush() -> bool:
+        positions = [pos for key in batch for pos in bloom_positions(key, num_blocks, num_hashes)]
+        added = cache_service.redis_client.eval(_ADD_SCRIPT, 2, meta_key, bits_key,
+                                                gen, BLOOM_TTL, len(batch), *positions)
+        batch.clear()
+        return bool(added)
+
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= BLOOM_ADD_BATCH_SIZE and not flush():
+            return False
+    return flush() if batch else True
+
+
+def record_saved_emails(user_id: int, emails: List[Dict]):
+    """
+    把已写入数据库的邮件加入用户的过滤器
+
+    过滤器不存在时不做处理(下次使用时从数据库重建);同步失败时删除过滤器,
+    宁可重建也不能让已保存的邮件被判定为"一定是新邮件"。
+    """
+    if not emails or not cache_service.is_connected():
+        return
+
+    try:
+        meta = _read_meta(user_id)
+        if meta is None:
+            return
+        keys = [key for email in emails for key in email_bloom_keys(email, email.get('content_hash'))]
+        _add_keys(user_id, meta['gen'], int(meta['num_blocks']), int(meta['num_hashes']), keys)
+    except Exception as e:
+        logger.error(f"同步用户 {user_id} 布隆过滤器失败,删除后重建: {e}")
+        cache_service.delete(BLOOM_KEY_TEMPLATE.format(user_id=user_id))
+
+
+class EmailDedupBloom:
+    """按用户维护的邮件去重布隆过滤器"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _rebuild(self, user_id: int) -> Optional[Dict[str, str]]:
+        """
+        根据用户已有邮件重建过滤器,返回元数据;其他进程已登记过滤器时返回None
+
+        先登记gen再读取数据库:此后写库的邮件要么在读取结果里,要么由
+        record_saved_emails 置位到这个gen上
+        """
+        meta_key = BLOOM_KEY_TEMPLATE.format(user_id=user_id)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM emails WHERE user_id = ?', (user_id,))
+            existing = cursor.fetchone()[0]
+
+            # 预留一倍空间给后续新邮件,避免频繁重建
+            capacity, num_blocks, num_hashes = bloom_layout(existing * 2)
+            gen = uuid.uuid4().hex
+            if not cache_service.redis_client.eval(_INIT_SCRIPT, 1, meta_key, gen, num_blocks,
+                                                   num_hashes, capacity, BLOOM_BUILD_TTL):
+                return None
+
+            cursor.execute('SELECT email_id, content_hash FROM emails WHERE user_id = ?', (user_id,))
+            keys = (key for email_id, content_hash in cursor
+                    for key in email_bloom_keys({'email_id': email_id}, content_hash))
+            if not _add_keys(user_id, gen, num_blocks, num_hashes, keys):
+                return None
+
+        if not cache_service.redis_client.eval(_READY_SCRIPT, 2, meta_key, _bits_key(user_id, gen),
+                                               gen, BLOOM_TTL):
+            return None
+        logger.debug(f"用户 {user_id} 布隆过滤器已重建: {existing} 封邮件, {num_blocks} 个块")
+        return _read_meta(user_id)
+
+    def _load(self, user_id: int) -> Optional[Dict[str, str]]:
+        """读取可用的过滤器元数据,需要时重建;其他进程正在重建时返回None"""
+        meta = _read_meta(user_id)
+        if meta is not None and int(meta['count']) > int(meta['capacity']):
+            # 插入数量超过设计容量后误判率会快速上升,需要重建
+            cache_service.redis_client.eval(_RESET_SCRIPT, 2, BLOOM_KEY_TEMPLATE.format(user_id=user_id),
+                                            _bits_key(user_id, meta['gen']), meta['gen'])
+            meta = None
+        if meta is None:
+            return self._rebuild(user_id)
+        return meta if meta.get('ready') == '1' else None
+
+    def _check(self, user_id: int, meta: Dict[str, str], keys: List[str]) -> Optional[Dict[str, bool]]:
+        """查询键是否可能已存在,过滤器在查询期间被替换时返回None"""
+        num_blocks, num_hashes = int(meta['num_blocks']), int(meta['num_hashes'])
+        positions = [pos for key in keys for pos in bloom_positions(key, num_blocks, num_hashes)]
+        hits = cache_service.redis_client.eval(
+            _CHECK_SCRIPT, 2, BLOOM_KEY_TEMPLATE.format(user_id=user_id), _bits_key(user_id, meta['gen']),
+            meta['gen'], num_hashes, *positions
+        )
+        if hits is None:
+            return None
+        return {key: bool(hit) for key, hit in zip(keys, hits)}
+
+    def invalidate(self, user_id: int):
+        """删除用户的过滤器(清空邮件等操作后调用,下次使用时重建)"""
+        if not cache_service.is_connected():
+            return
+        try:
+            meta = _read_meta(user_id)
+            if meta is not None:
+                cache_service.redis_client.eval(_RESET_SCRIPT, 2, BLOOM_KEY_TEMPLATE.format(user_id=user_id),
+                                                _bits_key(user_id, meta['gen']), meta['gen'])
+        except Exception as e:
+            logger.warning(f"删除用户 {user_id} 布隆过滤器失败: {e}")
+
+    def deduplicate(self, emails: List[Dict], user_id: int) -> List[Dict]:
+        """
+        先用布隆过滤器预筛,再对可能重复的邮件做数据库精确去重
+
+        Args:
+            emails: 新获取的邮件列表
+            user_id: 用户ID
+
+        Returns:
+            去重后的邮件列表(保持原有顺序)
+        """
+        if not emails:
+            return []
+
+        # Redis不可用时过滤器无法持久化,直接走数据库去重,避免重复扫描
+        if not cache_service.is_connected():
+            return self.db.deduplicate_emails(emails, user_id=user_id)
+
+        try:
+            meta = self._load(user_id)
+            hits = None
+            if meta is not None:
+                email_keys = []
+                for email in emails:
+                    email['content_hash'] = self.db.generate_content_hash(email)
+                    email_keys.append(email_bloom_keys(email, email['content_hash']))
+                hits = self._check(user_id, meta, list({k for keys in email_keys for k in keys}))
+            if hits is None:
+                logger.debug(f"用户 {user_id} 布隆过滤器暂不可用,使用数据库去重")
+                return self.db.deduplicate_emails(emails, user_id=user_id)
+
+            definitely_new = []
+            maybe_seen = []
+            new_keys = set()
+            maybe_keys = set()
+            for email, keys in zip(emails, email_keys):
+                if any(k in new_keys for k in keys):
+                    # 与本批次中已判定为新邮件的重复
+                    continue
+                if any(k in maybe_keys or hits[k] for k in keys):
+                    maybe_seen.append(email)
+                    maybe_keys.update(keys)
+                else:
+                    definitely_new.append(email)
+                    new_keys.update(keys)
+
+            confirmed_new = self.db.deduplicate_emails(maybe_seen, user_id=user_id) if maybe_seen else []
+            kept_ids = {id(e) for e in definitely_new}
+            kept_ids.update(id(e) for e in confirmed_new)
+            unique_emails = [e for e in emails if id(e) in kept_ids]
+
+            logger.info(f"用户 {user_id} 布隆预筛: {len(emails)} 封邮件, "
+                        f"{len(definitely_new)} 封直接判定为新邮件, "
+                        f"{len(maybe_seen)} 封交由数据库确认")
+            return unique_emails
+
+        except Exception as e:
+            logger.error(f"布隆过滤器去重失败,回退到数据库去重: {e}")
+            return self.db.deduplicate_emails(emails, user_id=user_id)
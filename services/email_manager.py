@@ -697,8 +697,9 @@ class EmailManager:
                     email_ids = email_ids[-max_emails_limit:]
                     logger.info(f"限制处理数量为 {max_emails_limit} 封（用户配置）")
             
-            # 获取已处理的邮件ID
-            processed_ids = self.db.get_processed_email_ids(email_address)
+            # 只查询本次找到的邮件中哪些已处理过（唯一邮件ID包含账户信息）
+            unprocessed_ids = set(self.db.filter_unprocessed_email_ids(
+                [f"{email_address}:{email_id.decode('utf-8')}" for email_id in email_ids], email_address))
             
             new_emails = []
             for email_id in email_ids:
@@ -707,7 +708,7 @@ class EmailManager:
                 # 生成唯一的邮件ID（包含账户信息）
                 unique_email_id = f"{email_address}:{email_id_str}"
                 
-                if unique_email_id in processed_ids:
+                if unique_email_id not in unprocessed_ids:
                     continue
                 
                 try:
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI邮件简报系统 - 后台任务队列
+
+耗时的批量操作(批量翻译等)提交到线程池执行,请求线程立即返回任务ID,
+前端通过 /api/jobs/<job_id> 轮询状态和结果。
+任务状态写入Redis(多进程部署时任意进程都能查询),Redis不可用时保存在进程内。
+"""
+
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from services.cache_service import cache_service
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY_TEMPLATE = 'job:{job_id}'
+JOB_TTL = 3600  # 任务状态保留1小时
+
+# 任务状态
+JOB_PENDING = 'PENDING'
+JOB_RUNNING = 'RUNNING'
+JOB_SUCCESS = 'SUCCESS'
+JOB_FAILURE = 'FAILURE'
+
+
+class JobQueue:
+    """基于线程池的后台任务队列"""
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._local_jobs = TTLCache(maxsize=10000, ttl=JOB_TTL)
+
+    def _save(self, job: Dict):
+        self._local_jobs.set(job['job_id'], job)
+        cache_service.set(JOB_KEY_TEMPLATE.format(job_id=job['job_id']), job, JOB_TTL)
+
+    def _update(self, job: Dict, **fields):
+        job = dict(job, **fields, updated_at=datetime.now().isoformat())
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """获取任务状态,不存在或已过期时返回None"""
+        job = cache_service.get(JOB_KEY_TEMPLATE.format(job_id=job_id))
+        if isinstance(job, dict):
+            return job
+        return self._local_jobs.get(job_id)
+
+    def submit(self, job_type: str, user_id: int, func: Callable, *args, **kwargs) -> str:
+        """
+        提交后台任务
+
+        Args:
+            job_type: 任务类型(如 batch_translate)
+            user_id: 提交任务的用户ID(查询时校验)
+            func: 任务函数,返回值作为任务结果(需可JSON序列化)
+
+        Returns:
+            任务ID
+        """
+        now = datetime.now().isoformat()
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'type': job_type,
+            'user_id': user_id,
+            'state': JOB_PENDING,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+        }
+        self._save(job)
+        self._executor.submit(self._run, job, func, args, kwargs)
+        logger.info(f"提交后台任务: {job_type} {job['job_id']} (用户 {user_id})")
+        return job['job_id']
+
+    def _run(self, job: Dict, func: Callable, args, kwargs):
+        job = self._update(job, state=JOB_RUNNING)
+        try:
+            result = func(*args, **kwargs)
+            self._update(job, state=JOB_SUCCESS, result=result)
+            logger.info(f"后台任务完成: {job['type']} {job['job_id']}")
+        except Exception as e:
+            logger.error(f"后台任务失败: {job['type']} {job['job_id']}: {e}")
+            self._update(job, state=JOB_FAILURE, error=str(e))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI邮件简报系统 - 邮件处理并发控制
+
+用Redis有序集合记录正在处理的用户(成员=用户ID,分数=开始时间),通过Lua脚本
+原子地完成"检查数量 + 加入",多进程部署(gunicorn等)时并发上限依然准确。
+超过 stale_seconds 的记录视为进程异常退出的残留,自动清理。
+Redis不可用时退化为进程内集合 + 锁。
+"""
+
+import logging
+import threading
+import time
+from typing import List
+
+from services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# 返回值: 1=获得名额, 0=达到并发上限, -1=该用户已在处理中
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[3])
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return -1
+end
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+return 1
+"""
+
+ACQUIRED = 1
+LIMIT_REACHED = 0
+ALREADY_PROCESSING = -1
+
+
+class ProcessingGate:
+    """跨进程的用户邮件处理并发闸门"""
+
+    def __init__(self, max_concurrent: int, key: str = 'processing:users', stale_seconds: int = 1800):
+        self.max_concurrent = max_concurrent
+        self.key = key
+        self.stale_seconds = stale_seconds
+        self._acquire_script = None
+        self._local_users = set()
+        self._local_lock = threading.Lock()
+
+    def _use_redis(self) -> bool:
+        return cache_service.is_connected()
+
+    def acquire(self, user_id: int) -> int:
+        """
+        尝试为用户获取处理名额
+
+        Returns:
+            ACQUIRED / LIMIT_REACHED / ALREADY_PROCESSING
+        """
+        if self._use_redis():
+            try:
+                if self._acquire_script is None:
+                    self._acquire_script = cache_service.redis_client.register_script(_ACQUIRE_SCRIPT)
+                now = time.time()
+                return int(self._acquire_script(
+                    keys=[self.key],
+                    args=[user_id, now, now - self.stale_seconds, self.max_concurrent]
+                ))
+            except Exception as e:
+                logger.warning(f"Redis并发控制失败，使用进程内控制: {e}")
+
+        with self._local_lock:
+            if user_id in self._local_users:
+                return ALREADY_PROCESSING
+            if len(self._local_users) >= self.max_concurrent:
+                return LIMIT_REACHED
+            self._local_users.add(user_id)
+            return ACQUIRED
+
+    def release(self, user_id: int):
+        """释放用户的处理名额"""
+        with self._local_lock:
+            self._local_users.discard(user_id)
+        if self._use_redis():
+            try:
+                cache_service.redis_client.zrem(self.key, user_id)
+            except Exception as e:
+                logger.warning(f"释放处理名额失败 {user_id}: {e}")
+
+    def current_users(self) -> List[int]:
+        """获取正在处理中的用户ID列表"""
+        users = set()
+        if self._use_redis():
+            try:
+                min_score = time.time() - self.stale_seconds
+                users.update(int(uid) for uid in cache_service.redis_client.zrangebyscore(self.key, min_score, '+inf'))
+            except Exception as e:
+                logger.warning(f"获取处理中用户失败: {e}")
+        with self._local_lock:
+            users.update(self._local_users)
+        return sorted(users)
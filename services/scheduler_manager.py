@@ -12,6 +12,8 @@ from datetime import datetime, timedelta
 from typing import Dict, Set, List
 from collections import defaultdict
 
+from utils.ttl_cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 class EmailSchedulerManager:
@@ -22,6 +24,18 @@ class EmailSchedulerManager:
     SCHEDULE_TYPE_CRON = 'cron'  # 定时触发（如每天6点）
     SCHEDULE_TYPE_CUSTOM = 'custom'  # 自定义规则（如整点、偶数整点）
     
+    # 用户定时任务的公共参数：由调度器负责节流，处理函数内不再sleep
+    JOB_OPTIONS = {
+        'max_instances': 1,  # 同一用户的任务不重叠执行
+        'coalesce': True,  # 合并错过的任务
+        'misfire_grace_time': 300,  # 并发名额紧张导致延迟时，5分钟内仍然补跑
+        'jitter': 60,  # 随机错开最多60秒，避免同一时刻触发的用户争抢并发名额
+        'replace_existing': True
+    }
+    
+    # 任务状态缓存时间（秒），前端轮询状态时避免每次查询调度器
+    STATUS_CACHE_TTL = 5
+    
     def __init__(self, scheduler, max_concurrent_users=3):
         self.scheduler = scheduler
         self.max_concurrent_users = max_concurrent_users
@@ -31,6 +45,7 @@ class EmailSchedulerManager:
         self.error_counts: Dict[int, int] = defaultdict(int)
         self.last_success: Dict[int, datetime] = {}
         self.lock = threading.Lock()
+        self._status_cache = TTLCache(maxsize=1024, ttl=self.STATUS_CACHE_TTL)
     
     def create_user_schedule(self, user_id: int, schedule_config: Dict):
         """
@@ -66,6 +81,7 @@ class EmailSchedulerManager:
                 return
             
             self.user_jobs[user_id] = job_id
+            self._status_cache.pop(user_id)
             logger.info(f"为用户 {user_id} 创建定时任务成功: {self._format_schedule_info(schedule_config)}")
             
         except Exception as e:
@@ -86,9 +102,7 @@ class EmailSchedulerManager:
             start_date=start_time,
             id=job_id,
             args=[user_id],
-            max_instances=1,
-            coalesce=True,  # 合并错过的任务
-            replace_existing=True
+            **self.JOB_OPTIONS
         )
         
         logger.info(f"  └─ 间隔触发: 每 {interval_minutes} 分钟, 错峰 {offset_minutes} 分钟后首次执行")
@@ -109,9 +123,7 @@ class EmailSchedulerManager:
             minute=minute_str,
             id=job_id,
             args=[user_id],
-            max_instances=1,
-            coalesce=True,
-            replace_existing=True
+            **self.JOB_OPTIONS
         )
         
         logger.info(f"  └─ Cron触发: 每天 {hour_str} 时 {minute_str} 分")
@@ -130,9 +142,7 @@ class EmailSchedulerManager:
                 minute=str(minute),
                 id=job_id,
                 args=[user_id],
-                max_instances=1,
-                coalesce=True,
-                replace_existing=True
+                **self.JOB_OPTIONS
             )
             logger.info(f"  └─ 自定义触发: 每个整点的第 {minute} 分钟")
             
@@ -148,9 +158,7 @@ class EmailSchedulerManager:
                 minute=str(minute),
                 id=job_id,
                 args=[user_id],
-                max_instances=1,
-                coalesce=True,
-                replace_existing=True
+                **self.JOB_OPTIONS
             )
             logger.info(f"  └─ 自定义触发: 偶数整点的第 {minute} 分钟")
             
@@ -166,9 +174,7 @@ class EmailSchedulerManager:
                 minute=str(minute),
                 id=job_id,
                 args=[user_id],
-                max_instances=1,
-                coalesce=True,
-                replace_existing=True
+                **self.JOB_OPTIONS
             )
             logger.info(f"  └─ 自定义触发: 奇数整点的第 {minute} 分钟")
         
@@ -185,9 +191,7 @@ class EmailSchedulerManager:
                 minute=str(minute),
                 id=job_id,
                 args=[user_id],
-                max_instances=1,
-                coalesce=True,
-                replace_existing=True
+                **self.JOB_OPTIONS
             )
             logger.info(f"  └─ 自定义触发: 每 {n_hours} 小时 (于 {hour_str} 时的第 {minute} 分钟)")
         else:
@@ -226,6 +230,7 @@ class EmailSchedulerManager:
             if job_id in self.user_jobs and self.scheduler.get_job(job_id):
                 self.scheduler.remove_job(job_id)
                 del self.user_jobs[user_id]
+                self._status_cache.pop(user_id)
                 logger.info(f"移除用户 {user_id} 的定时任务")
         except Exception as e:
             logger.error(f"移除用户 {user_id} 定时任务失败: {e}")
@@ -280,9 +285,7 @@ class EmailSchedulerManager:
             # 从处理中列表移除
             with self.lock:
                 self.current_processing.discard(user_id)
-            
-            # 添加处理间隔，避免过载
-            time.sleep(2)
+            self._status_cache.pop(user_id)
     
     def update_all_user_schedules(self):
         """更新所有用户的定时任务"""
@@ -291,25 +294,44 @@ class EmailSchedulerManager:
             db = Database()
             
             # 获取所有活跃用户
-            with db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT id FROM users WHERE is_active = 1')
-                user_ids = [row['id'] for row in cursor.fetchall()]
+            user_ids = db.get_active_user_ids()
             
             # 为每个用户创建定时任务
-            for user_id in user_ids:
-                schedule_config = self._get_user_schedule_config(user_id, db)
-                self.create_user_schedule(user_id, schedule_config)
+            self.create_user_schedules(user_ids, db)
                 
             logger.info(f"更新了 {len(user_ids)} 个用户的定时任务")
             
         except Exception as e:
             logger.error(f"更新用户定时任务失败: {e}")
     
-    def _get_user_schedule_config(self, user_id: int, db) -> Dict:
-        """获取用户的调度配置"""
+    def create_user_schedules(self, user_ids: List[int], db):
+        """
+        批量创建用户定时任务
+        
+        一次查询取出所有用户配置；添加任务期间暂停调度器，
+        避免每次add_job都唤醒调度线程重新计算下次执行时间
+        """
+        all_configs = db.get_user_configs_bulk(user_ids)
+        
+        paused = self.scheduler.running
+        if paused:
+            self.scheduler.pause()
+        try:
+            for user_id in user_ids:
+                try:
+                    schedule_config = self._get_user_schedule_config(user_id, db, all_configs.get(user_id))
+                    self.create_user_schedule(user_id, schedule_config)
+                except Exception as e:
+                    logger.error(f"为用户 {user_id} 创建定时任务失败: {e}")
+        finally:
+            if paused:
+                self.scheduler.resume()
+    
+    def _get_user_schedule_config(self, user_id: int, db, user_configs: Dict = None) -> Dict:
+        """获取用户的调度配置（user_configs 为已查询好的用户配置时不再查库）"""
         try:
-            user_configs = db.get_user_configs(user_id)
+            if user_configs is None:
+                user_configs = db.get_user_configs(user_id)
             
             # 获取调度类型（默认为interval）
             schedule_type = user_configs.get('schedule_type', self.SCHEDULE_TYPE_INTERVAL)
@@ -363,6 +385,7 @@ class EmailSchedulerManager:
         try:
             if self.scheduler.get_job(job_id):
                 self.scheduler.pause_job(job_id)
+                self._status_cache.pop(user_id)
                 logger.info(f"暂停用户 {user_id} 的定时任务")
         except Exception as e:
             logger.error(f"暂停用户 {user_id} 定时任务失败: {e}")
@@ -373,12 +396,21 @@ class EmailSchedulerManager:
         try:
             if self.scheduler.get_job(job_id):
                 self.scheduler.resume_job(job_id)
+                self._status_cache.pop(user_id)
                 logger.info(f"恢复用户 {user_id} 的定时任务")
         except Exception as e:
             logger.error(f"恢复用户 {user_id} 定时任务失败: {e}")
     
     def get_user_schedule_status(self, user_id: int) -> Dict:
-        """获取用户定时任务状态"""
+        """获取用户定时任务状态（缓存几秒，任务变更时清除）"""
+        status = self._status_cache.get(user_id)
+        if status is None:
+            status = self._load_user_schedule_status(user_id)
+            self._status_cache.set(user_id, status)
+        return dict(status)
+    
+    def _load_user_schedule_status(self, user_id: int) -> Dict:
+        """从调度器读取用户定时任务状态"""
         job_id = f'user_{user_id}_email_processing'
         
         try:
@@ -6,21 +6,34 @@
 """
 
 import re
+import json
+import hashlib
 import logging
 import requests
 import threading
-from typing import Optional, Dict, Callable
+from typing import Optional, Dict, Callable, List, Iterator
 from config import Config
 from models.database import Database
+from utils.ttl_cache import TTLCache
+from utils.rate_limiter import glm_limiter, estimate_tokens, load_glm_limits
 
 logger = logging.getLogger(__name__)
 
+TARGET_LANGUAGES = ('zh', 'en')
+
+
+def translation_cache_key(text: str, target_lang: str) -> str:
+    """翻译缓存键: 原文blake2b哈希 + 目标语言"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest() + ':' + target_lang
+
+
 class TranslationService:
     """翻译服务类"""
     
     def __init__(self):
         """初始化翻译服务"""
         self.db = Database()
+        self._cache = TTLCache(Config.TRANSLATION_CACHE_SIZE, Config.TRANSLATION_CACHE_TTL_DAYS * 86400)
         self._init_client()
     
     def _init_client(self):
@@ -30,6 +43,7 @@ class TranslationService:
             self.api_key = self.db.get_system_config('glm_api_key', Config.GLM_API_KEY)
             self.base_url = Config.GLM_BASE_URL
             self.model = self.db.get_system_config('glm_model', Config.GLM_MODEL)
+            load_glm_limits(self.db)
             
             if not self.api_key:
                 logger.warning("GLM API key 未配置，翻译功能将不可用")
@@ -190,7 +204,47 @@ class TranslationService:
         
         return prompt.strip()
     
-    def _call_glm_translation_api(self, prompt: str) -> Optional[str]:
+    def _create_batch_translation_prompt(self, texts: List[str]) -> str:
+        """创建批量翻译提示词（编号列表，要求返回JSON数组）"""
+        numbered = '\n'.join(f"{i}. {text}" for i, text in enumerate(texts, 1))
+        prompt = f"""
+请将以下编号的英文文本逐条翻译成简洁准确的中文，保持原文的含义和语气：
+
+{numbered}
+
+翻译要求：
+1. 每条单独翻译，翻译成自然流畅的中文
+2. 专业术语请使用准确的中文表达
+3. 时间、日期、金额等关键信息保持准确
+4. 只返回一个JSON字符串数组，按编号顺序排列，共{len(texts)}项，不要添加编号或任何解释
+
+JSON数组："""
+        
+        return prompt.strip()
+    
+    def _parse_batch_translation_result(self, content: str, expected_count: int) -> Optional[List[str]]:
+        """解析批量翻译返回的JSON数组，格式或数量不符时返回None"""
+        if not content:
+            return None
+        
+        start = content.find('[')
+        end = content.rfind(']')
+        if start == -1 or end <= start:
+            return None
+        
+        try:
+            items = json.loads(content[start:end + 1])
+        except ValueError:
+            return None
+        
+        if not isinstance(items, list) or len(items) != expected_count:
+            return None
+        if not all(isinstance(item, str) and item.strip() for item in items):
+            return None
+        
+        return [self._clean_translation_result(item) for item in items]
+    
+    def _call_glm_translation_api(self, prompt: str, max_tokens: int = 1000) -> Optional[str]:
         """调用GLM API进行翻译"""
         if not self.api_key:
             logger.error("GLM API key 未配置，无法进行翻译")
@@ -210,13 +264,15 @@ class TranslationService:
                 }
             ],
             'temperature': 0.3,  # 降低随机性，提高翻译准确性
-            'max_tokens': 1000,
+            'max_tokens': max_tokens,
             'top_p': 0.8,
         }
         
         try:
-            response = requests.post(
+            # 按RPM/TPM限流，429时指数退避重试
+            response = glm_limiter.post(
                 f"{self.base_url}/chat/completions",
+                estimated_tokens=estimate_tokens(prompt),
                 headers=headers,
                 json=data,
                 timeout=30
@@ -244,6 +300,47 @@ class TranslationService:
             logger.error(f"GLM API 翻译调用异常: {e}")
             return None
     
+    def _get_cached_translation(self, cache_key: str) -> Optional[str]:
+        """查询翻译缓存（进程内LRU -> 数据库）"""
+        translation = self._cache.get(cache_key)
+        if translation is not None:
+            logger.debug(f"翻译命中进程内缓存: {cache_key}")
+            return translation
+        
+        translation = self.db.get_cached_translation(cache_key, Config.TRANSLATION_CACHE_TTL_DAYS)
+        if translation is not None:
+            logger.debug(f"翻译命中数据库缓存: {cache_key}")
+            self._cache.set(cache_key, translation)
+        return translation
+    
+    def _store_cached_translation(self, cache_key: str, target_lang: str, translation: str):
+        """写入翻译缓存（进程内LRU + 数据库）"""
+        self._cache.set(cache_key, translation)
+        self.db.save_cached_translation(cache_key, target_lang, translation)
+    
+    def _translate_with_cache(self, text: str, target_lang: str,
+                              prompt_builder: Callable[[str], str]) -> Optional[str]:
+        """先查翻译缓存，未命中时调用GLM并写入缓存"""
+        cache_key = translation_cache_key(text, target_lang)
+        
+        translation = self._get_cached_translation(cache_key)
+        if translation is not None:
+            return translation
+        
+        translation = self._call_glm_translation_api(prompt_builder(text))
+        if translation:
+            self._store_cached_translation(cache_key, target_lang, translation)
+        return translation
+    
+    def invalidate_cached_translation(self, text: str):
+        """删除某段原文的所有翻译缓存（用户要求重新翻译时调用）"""
+        if not text:
+            return
+        cache_keys = [translation_cache_key(text, lang) for lang in TARGET_LANGUAGES]
+        for cache_key in cache_keys:
+            self._cache.pop(cache_key)
+        self.db.delete_cached_translations(cache_keys)
+    
     def _clean_translation_result(self, translation: str) -> str:
         """清理翻译结果"""
         if not translation:
@@ -272,11 +369,8 @@ class TranslationService:
                 logger.debug("文本不是英文或已是中文，无需翻译")
                 return text
             
-            # 创建翻译提示词
-            prompt = self._create_translation_prompt(text)
-            
-            # 调用GLM API进行翻译
-            translation = self._call_glm_translation_api(prompt)
+            # 调用GLM API进行翻译（相同原文优先使用缓存）
+            translation = self._translate_with_cache(text, 'zh', self._create_translation_prompt)
             
             if translation:
                 logger.info(f"翻译成功: {text[:50]}... -> {translation[:50]}...")
@@ -297,11 +391,8 @@ class TranslationService:
                 logger.debug("文本不是中文或已是英文，无需翻译")
                 return text
             
-            # 创建翻译提示词
-            prompt = self._create_english_translation_prompt(text)
-            
-            # 调用GLM API进行翻译
-            translation = self._call_glm_translation_api(prompt)
+            # 调用GLM API进行翻译（相同原文优先使用缓存）
+            translation = self._translate_with_cache(text, 'en', self._create_english_translation_prompt)
             
             if translation:
                 logger.info(f"英文翻译成功: {text[:50]}... -> {translation[:50]}...")
@@ -321,11 +412,8 @@ class TranslationService:
             if self._is_chinese_text(text):
                 return text
             
-            # 创建混合文本到中文翻译提示词
-            prompt = self._create_mixed_to_chinese_prompt(text)
-            
-            # 调用GLM API进行翻译
-            translation = self._call_glm_translation_api(prompt)
+            # 调用GLM API进行翻译（相同原文优先使用缓存）
+            translation = self._translate_with_cache(text, 'zh', self._create_mixed_to_chinese_prompt)
             
             if translation:
                 logger.info(f"混合文本中文翻译成功: {text[:50]}... -> {translation[:50]}...")
@@ -345,11 +433,8 @@ class TranslationService:
             if self._is_english_text(text):
                 return text
             
-            # 创建混合文本到英文翻译提示词
-            prompt = self._create_mixed_to_english_prompt(text)
-            
-            # 调用GLM API进行翻译
-            translation = self._call_glm_translation_api(prompt)
+            # 调用GLM API进行翻译（相同原文优先使用缓存）
+            translation = self._translate_with_cache(text, 'en', self._create_mixed_to_english_prompt)
             
             if translation:
                 logger.info(f"混合文本英文翻译成功: {text[:50]}... -> {translation[:50]}...")
@@ -400,6 +485,111 @@ class TranslationService:
             logger.error(f"智能英文翻译出错: {e}")
             return text
 
+    def _stream_glm_translation(self, prompt: str, max_tokens: int = 1000) -> Iterator[str]:
+        """以stream模式调用GLM，逐段返回增量文本"""
+        if not self.api_key:
+            logger.error("GLM API key 未配置，无法进行翻译")
+            return
+        
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+        }
+        
+        data = {
+            'model': self.model,
+            'messages': [
+                {
+                    'role': 'user',
+                    'content': prompt
+                }
+            ],
+            'temperature': 0.3,
+            'max_tokens': max_tokens,
+            'top_p': 0.8,
+            'stream': True,
+        }
+        
+        response = glm_limiter.post(
+            f"{self.base_url}/chat/completions",
+            estimated_tokens=estimate_tokens(prompt),
+            headers=headers,
+            json=data,
+            timeout=30,
+            stream=True
+        )
+        
+        try:
+            if response.status_code != 200:
+                logger.error(f"GLM API 流式翻译调用失败: {response.status_code} - {response.text}")
+                return
+            
+            # SSE格式: 每行 "data: {...}"，以 "data: [DONE]" 结束
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    break
+                try:
+                    choices = json.loads(payload).get('choices') or []
+                except ValueError:
+                    continue
+                if choices:
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if delta:
+                        yield delta
+        finally:
+            response.close()
+    
+    def _stream_translate_with_cache(self, text: str, target_lang: str,
+                                     prompt_builder: Callable[[str], str]) -> Iterator[str]:
+        """流式翻译：命中缓存时一次性返回，否则边接收边返回，完成后写入缓存"""
+        cache_key = translation_cache_key(text, target_lang)
+        cached = self._get_cached_translation(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
+        try:
+            for delta in self._stream_glm_translation(prompt_builder(text)):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            logger.error(f"GLM API 流式翻译异常: {e}")
+            if parts:
+                # 已输出部分译文，不能再补原文，也不缓存不完整的结果，交由调用方报错
+                raise
+            # 尚未输出任何内容，返回原文
+            yield text
+            return
+
+        translation = self._clean_translation_result(''.join(parts))
+        if translation:
+            self._store_cached_translation(cache_key, target_lang, translation)
+        elif not parts:
+            # 流式调用失败且没有输出任何内容，返回原文
+            yield text
+    
+    def stream_smart_translate_to_chinese(self, text: str) -> Iterator[str]:
+        """智能流式翻译到中文：纯中文或无法判断类型时原样返回"""
+        if self._is_english_text(text):
+            yield from self._stream_translate_with_cache(text, 'zh', self._create_translation_prompt)
+        elif not self._is_chinese_text(text) and self._is_mixed_text(text):
+            yield from self._stream_translate_with_cache(text, 'zh', self._create_mixed_to_chinese_prompt)
+        else:
+            yield text
+    
+    def stream_smart_translate_to_english(self, text: str) -> Iterator[str]:
+        """智能流式翻译到英文：纯英文或无法判断类型时原样返回"""
+        if self._is_chinese_text(text):
+            yield from self._stream_translate_with_cache(text, 'en', self._create_english_translation_prompt)
+        elif not self._is_english_text(text) and self._is_mixed_text(text):
+            yield from self._stream_translate_with_cache(text, 'en', self._create_mixed_to_english_prompt)
+        else:
+            yield text
+    
     def translate_to_chinese_async(self, text: str, callback: Callable[[str], None]):
         """异步翻译文本到中文"""
         def _translate_worker():
@@ -414,21 +604,61 @@ class TranslationService:
         thread = threading.Thread(target=_translate_worker, daemon=True)
         thread.start()
     
-    def batch_translate_to_chinese(self, texts: list) -> list:
-        """批量翻译文本到中文"""
+    def translate_batch_to_chinese(self, texts: List[str]) -> List[str]:
+        """
+        批量翻译文本到中文：多条文本合并为一次GLM请求
+        
+        非英文文本保持原文，已缓存的直接使用缓存，其余编号后一次性翻译；
+        返回结果无法解析时逐条翻译。
+        
+        Returns:
+            与输入顺序一致的翻译结果（翻译失败的项保留原文）
+        """
         if not texts:
             return []
         
-        translated_texts = []
-        for text in texts:
-            try:
-                translated = self.translate_to_chinese(text)
-                translated_texts.append(translated)
-            except Exception as e:
-                logger.error(f"批量翻译单项失败: {e}")
-                translated_texts.append(text)  # 保留原文
+        results = list(texts)
+        pending = []  # (下标, 缓存键)
+        for index, text in enumerate(texts):
+            if not self._is_english_text(text):
+                continue
+            cache_key = translation_cache_key(text, 'zh')
+            cached = self._get_cached_translation(cache_key)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append((index, cache_key))
+        
+        if not pending:
+            return results
+        
+        pending_texts = [texts[index] for index, _ in pending]
+        translations = None
+        try:
+            max_tokens = min(4000, 1000 * len(pending_texts))
+            content = self._call_glm_translation_api(
+                self._create_batch_translation_prompt(pending_texts), max_tokens=max_tokens
+            )
+            translations = self._parse_batch_translation_result(content, len(pending_texts))
+        except Exception as e:
+            logger.error(f"批量翻译请求出错: {e}")
+        
+        if translations is None:
+            logger.warning(f"批量翻译结果无法解析，逐条翻译 {len(pending_texts)} 条文本")
+            for index, _ in pending:
+                results[index] = self.translate_to_chinese(texts[index])
+            return results
+        
+        for (index, cache_key), translation in zip(pending, translations):
+            results[index] = translation
+            self._store_cached_translation(cache_key, 'zh', translation)
         
-        return translated_texts
+        logger.info(f"批量翻译成功: {len(pending_texts)} 条文本合并为1次请求")
+        return results
+    
+    def batch_translate_to_chinese(self, texts: list) -> list:
+        """批量翻译文本到中文（兼容旧接口）"""
+        return self.translate_batch_to_chinese(texts)
     
     def is_translation_available(self) -> bool:
         """检查翻译功能是否可用"""
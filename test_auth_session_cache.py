@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试会话缓存
+缓存保存在Redis中，多个worker（多个AuthService实例）之间登出/停用立即生效，
+缓存命中时仍校验会话有效期
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask, session
+
+from config import Config
+from services import auth_service as auth_service_module
+from services.cache_service import cache_service
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """临时SQLite数据库 + fakeredis（需要lupa执行Lua脚本），未安装时跳过"""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    monkeypatch.setattr(Config, 'DATABASE_PATH', tmp_path / 'emails.db')
+    monkeypatch.setattr(cache_service, 'redis_client', fakeredis.FakeRedis(decode_responses=True))
+    monkeypatch.setattr(cache_service, 'is_available', True)
+
+    worker_a, worker_b = auth_service_module.AuthService(), auth_service_module.AuthService()
+    ok, _, user_id = worker_a.register_user('alice', 'alice@example.com', 'Passw0rd!')
+    assert ok
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    with app.test_request_context():
+        ok, _, _ = worker_a.login_user('alice', 'Passw0rd!')
+        assert ok
+        cookie = dict(session)
+    return app, worker_a, worker_b, user_id, cookie
+
+
+def current_user(app, worker, cookie):
+    """模拟一次新请求（g为空）"""
+    with app.test_request_context():
+        session.update(cookie)
+        return worker.get_current_user()
+
+
+def test_logout_on_one_worker_applies_to_others(env):
+    app, worker_a, worker_b, user_id, cookie = env
+    assert current_user(app, worker_a, cookie)['id'] == user_id
+    assert cache_service.redis_client.keys('auth_session:user:*')
+
+    with app.test_request_context():
+        session.update(cookie)
+        worker_b.logout_user()
+
+    assert current_user(app, worker_a, cookie) is None
+
+
+def test_cached_session_checks_expiry(env, monkeypatch):
+    app, worker_a, _, user_id, cookie = env
+    cached = current_user(app, worker_a, cookie)
+    assert cached['id'] == user_id
+
+    # 会话到期：缓存条目仍在（30秒内），但命中时校验 expires_at 并回库确认
+    after_expiry = datetime.fromisoformat(cached['expires_at']) + timedelta(minutes=1)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return after_expiry
+
+    monkeypatch.setattr(auth_service_module, 'datetime', FrozenDatetime)
+    with worker_a.db.get_connection() as conn:
+        conn.execute('UPDATE user_sessions SET expires_at = ?',
+                     ((datetime.now() - timedelta(minutes=1)).isoformat(),))
+        conn.commit()
+
+    assert cache_service.redis_client.keys('auth_session:user:*')
+    assert current_user(app, worker_a, cookie) is None
+
+
+def test_deactivated_user_is_rejected_after_invalidation(env):
+    app, worker_a, worker_b, user_id, cookie = env
+    assert current_user(app, worker_a, cookie)['id'] == user_id
+    with worker_b.db.get_connection() as conn:
+        conn.execute('UPDATE users SET is_active = 0 WHERE id = ?', (user_id,))
+        conn.commit()
+    worker_b.invalidate_user_sessions(user_id)
+
+    assert current_user(app, worker_a, cookie) is None
+
+
+def test_logout_during_lookup_is_not_cached(env, monkeypatch):
+    """查库之后、回填缓存之前其他worker登出，不能把已失效的会话缓存下来"""
+    app, worker_a, worker_b, user_id, cookie = env
+    original = worker_a.db.get_user_by_session
+
+    def lookup_then_logout(token):
+        user = original(token)
+        with app.test_request_context():
+            session.update(cookie)
+            worker_b.logout_user()
+        return user
+
+    monkeypatch.setattr(worker_a.db, 'get_user_by_session', lookup_then_logout)
+    assert current_user(app, worker_a, cookie)['id'] == user_id
+    monkeypatch.setattr(worker_a.db, 'get_user_by_session', original)
+
+    assert current_user(app, worker_a, cookie) is None
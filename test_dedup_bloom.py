@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试邮件去重布隆过滤器
+位图布局与哈希位置、无Redis时的数据库去重回退、写库后过滤器同步、重建期间的回退
+"""
+
+import pytest
+
+from config import Config
+from models.database import Database
+from services import dedup_bloom
+from services.cache_service import cache_service
+from services.dedup_bloom import (
+    BLOCK_BITS, BLOOM_KEY_TEMPLATE, EmailDedupBloom, bloom_layout, bloom_positions,
+    email_bloom_keys, record_saved_emails
+)
+
+USER_ID = 1
+META_KEY = BLOOM_KEY_TEMPLATE.format(user_id=USER_ID)
+
+
+def make_email(i: int, user_id: int = USER_ID) -> dict:
+    return {
+        'user_id': user_id,
+        'email_id': f'<msg-{i}@example.com>',
+        'subject': f'主题 {i}',
+        'sender': 'sender@example.com',
+        'date': '2024-01-01T08:00:00',
+        'body': f'正文 {i}',
+    }
+
+
+def with_hash(db: Database, email: dict) -> dict:
+    email['content_hash'] = db.generate_content_hash(email)
+    return email
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """临时SQLite数据库（默认不连接Redis）"""
+    monkeypatch.setattr(Config, 'DATABASE_PATH', tmp_path / 'emails.db')
+    monkeypatch.setattr(cache_service, 'is_available', False)
+    return Database()
+
+
+@pytest.fixture
+def redis_cache(db, monkeypatch):
+    """用fakeredis替代Redis（需要lupa执行Lua脚本），未安装时跳过"""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    monkeypatch.setattr(cache_service, 'redis_client', fakeredis.FakeRedis(decode_responses=True))
+    monkeypatch.setattr(cache_service, 'is_available', True)
+    return cache_service.redis_client
+
+
+def test_positions_stay_in_one_block():
+    capacity, num_blocks, num_hashes = bloom_layout(5000)
+    assert capacity == 5000
+    for i in range(100):
+        positions = list(bloom_positions(f'id:{i}', num_blocks, num_hashes))
+        assert len(positions) == num_hashes
+        assert len({pos // BLOCK_BITS for pos in positions}) == 1
+        assert all(0 <= pos < num_blocks * BLOCK_BITS for pos in positions)
+        assert positions == list(bloom_positions(f'id:{i}', num_blocks, num_hashes))
+
+
+def test_false_positive_rate_is_bounded():
+    _, num_blocks, num_hashes = bloom_layout(2000)
+    bits = set()
+    for i in range(2000):
+        bits.update(bloom_positions(f'id:{i}', num_blocks, num_hashes))
+    false_positives = sum(
+        all(pos in bits for pos in bloom_positions(f'other:{i}', num_blocks, num_hashes))
+        for i in range(10000)
+    )
+    # 设计误判率为1%，分块后略高，留出余量
+    assert false_positives < 300
+
+
+def test_email_bloom_keys():
+    assert email_bloom_keys({'email_id': 'x'}, 'h') == ('id:x', 'hash:h')
+    assert email_bloom_keys({}, 'h') == ('hash:h',)
+    assert email_bloom_keys({'email_id': 'x'}, None) == ('id:x',)
+
+
+def test_deduplicate_without_redis_uses_database(db):
+    dedup = EmailDedupBloom(db)
+    first = dedup.deduplicate([make_email(i) for i in range(3)], user_id=USER_ID)
+    assert len(first) == 3
+    db.save_emails_bulk(first)
+
+    second = dedup.deduplicate([make_email(i) for i in range(5)], user_id=USER_ID)
+    assert [e['email_id'] for e in second] == [make_email(3)['email_id'], make_email(4)['email_id']]
+
+
+def test_deduplicate_with_redis(db, redis_cache):
+    dedup = EmailDedupBloom(db)
+    first = dedup.deduplicate([make_email(i) for i in range(3)] + [make_email(0)], user_id=USER_ID)
+    assert len(first) == 3
+    assert redis_cache.hget(META_KEY, 'ready') == '1'
+    db.save_emails_bulk(first)
+
+    second = dedup.deduplicate([make_email(i) for i in range(5)], user_id=USER_ID)
+    assert len(second) == 2
+
+
+def test_saves_outside_prefilter_update_filter(db, redis_cache):
+    """Celery任务、导入等路径直接写库，之后的预筛不能把这些邮件判定为新邮件"""
+    dedup = EmailDedupBloom(db)
+    db.save_emails_bulk(dedup.deduplicate([make_email(0)], user_id=USER_ID))
+    count = int(redis_cache.hget(META_KEY, 'count'))
+
+    db.save_emails_bulk([with_hash(db, make_email(1))])
+    db.save_email(with_hash(db, make_email(2)))
+    # 每封邮件两个键（email_id 和 content_hash）
+    assert int(redis_cache.hget(META_KEY, 'count')) == count + 4
+
+    result = dedup.deduplicate([make_email(i) for i in range(4)], user_id=USER_ID)
+    assert [e['email_id'] for e in result] == [make_email(3)['email_id']]
+
+
+def test_save_during_rebuild_is_not_lost(db, redis_cache, monkeypatch):
+    """重建读取数据库之后才写库的邮件，由 record_saved_emails 置位到正在重建的过滤器"""
+    dedup = EmailDedupBloom(db)
+    late_email = with_hash(db, make_email(9))
+    original_add_keys = dedup_bloom._add_keys
+
+    def add_keys_then_save(*args):
+        # 只在重建读取数据库后插入一次写库，写库自身的同步走原实现
+        monkeypatch.setattr(dedup_bloom, '_add_keys', original_add_keys)
+        added = original_add_keys(*args)
+        db.save_emails_bulk([late_email])
+        return added
+
+    monkeypatch.setattr(dedup_bloom, '_add_keys', add_keys_then_save)
+    dedup.deduplicate([make_email(0)], user_id=USER_ID)
+    assert redis_cache.hget(META_KEY, 'ready') == '1'
+
+    assert dedup.deduplicate([make_email(9)], user_id=USER_ID) == []
+
+
+def test_filter_being_rebuilt_falls_back_to_database(db, redis_cache):
+    db.save_emails_bulk([with_hash(db, make_email(0))])
+    # 其他进程已登记但尚未完成重建
+    redis_cache.hset(META_KEY, mapping={'gen': 'other', 'num_blocks': 1, 'num_hashes': 7,
+                                        'capacity': 1000, 'count': 0, 'ready': 0})
+    result = EmailDedupBloom(db).deduplicate([make_email(0), make_email(1)], user_id=USER_ID)
+    assert [e['email_id'] for e in result] == [make_email(1)['email_id']]
+    assert redis_cache.hget(META_KEY, 'gen') == 'other'
+
+
+def test_saturated_filter_is_rebuilt(db, redis_cache):
+    dedup = EmailDedupBloom(db)
+    db.save_emails_bulk(dedup.deduplicate([make_email(0)], user_id=USER_ID))
+    old_gen = redis_cache.hget(META_KEY, 'gen')
+    redis_cache.hset(META_KEY, 'count', 10 ** 6)
+
+    assert dedup.deduplicate([make_email(0)], user_id=USER_ID) == []
+    assert redis_cache.hget(META_KEY, 'gen') != old_gen
+    assert int(redis_cache.hget(META_KEY, 'count')) == 2
+
+
+def test_record_saved_emails_without_filter_is_noop(redis_cache):
+    record_saved_emails(USER_ID, [make_email(0)])
+    assert not redis_cache.exists(META_KEY)
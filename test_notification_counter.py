@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试未读通知数计数器
+从数据库回填时的并发写入、增量维护、全部标记已读
+"""
+
+import pytest
+
+from config import Config
+from models.database import UNREAD_NOTIFICATION_COUNT_KEY, Database
+from services.cache_service import cache_service
+
+USER_ID = 1
+COUNT_KEY = UNREAD_NOTIFICATION_COUNT_KEY.format(user_id=USER_ID)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """临时SQLite数据库 + fakeredis（需要lupa执行Lua脚本），未安装时跳过"""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    monkeypatch.setattr(Config, 'DATABASE_PATH', tmp_path / 'emails.db')
+    monkeypatch.setattr(cache_service, 'redis_client', fakeredis.FakeRedis(decode_responses=True))
+    monkeypatch.setattr(cache_service, 'is_available', True)
+    return Database()
+
+
+def add_notifications(db: Database, count: int):
+    db.save_notifications_bulk([{'user_id': USER_ID, 'title': f'通知{i}', 'message': '内容'}
+                                for i in range(count)])
+
+
+def test_counter_is_seeded_and_maintained(db):
+    add_notifications(db, 2)
+    assert not cache_service.redis_client.exists(COUNT_KEY)
+    assert db.get_unread_notification_count(USER_ID) == 2
+    assert cache_service.redis_client.get(COUNT_KEY) == '2'
+
+    db.save_notification(USER_ID, '新通知', '内容')
+    add_notifications(db, 2)
+    assert db.get_unread_notification_count(USER_ID) == 5
+
+
+def test_write_during_seeding_triggers_recount(db, monkeypatch):
+    add_notifications(db, 1)
+    original = cache_service.set_nx_if_versions
+    writes = []
+
+    def write_then_seed(*args):
+        # 统计之后、回填之前另一个进程新增通知（此时计数器不存在，增量被丢弃）
+        if not writes:
+            writes.append(1)
+            add_notifications(db, 1)
+        return original(*args)
+
+    monkeypatch.setattr(cache_service, 'set_nx_if_versions', write_then_seed)
+    assert db.get_unread_notification_count(USER_ID) == 2
+    assert cache_service.redis_client.get(COUNT_KEY) == '2'
+
+
+def test_mark_all_read_updates_rows_even_if_counter_is_zero(db):
+    assert db.get_unread_notification_count(USER_ID) == 0
+    add_notifications(db, 3)
+    # 计数器因并发写入而错误地为0
+    cache_service.redis_client.set(COUNT_KEY, 0)
+
+    assert db.mark_all_notifications_as_read(USER_ID)
+    with db.get_connection() as conn:
+        unread = conn.execute('SELECT COUNT(*) FROM system_notifications WHERE is_read = 0').fetchone()[0]
+    assert unread == 0
+    assert db.get_unread_notification_count(USER_ID) == 0
+
+
+def test_mark_all_read_clears_wrong_counter(db):
+    add_notifications(db, 1)
+    db.mark_all_notifications_as_read(USER_ID)
+    assert db.get_unread_notification_count(USER_ID) == 0
+    cache_service.redis_client.set(COUNT_KEY, 5)
+
+    assert db.mark_all_notifications_as_read(USER_ID)
+    assert db.get_unread_notification_count(USER_ID) == 0
+
+
+def test_mark_one_read_drops_seeded_counter(db):
+    add_notifications(db, 2)
+    assert db.get_unread_notification_count(USER_ID) == 2
+    with db.get_connection() as conn:
+        notification_id = conn.execute('SELECT MIN(id) FROM system_notifications').fetchone()[0]
+
+    assert db.mark_notification_as_read(notification_id, USER_ID)
+    assert db.get_unread_notification_count(USER_ID) == 1
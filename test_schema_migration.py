@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试数据库结构迁移（PRAGMA user_version）
+旧版emails表补充字段、邮件计数表初始化、已迁移的库不再重复迁移
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from config import Config
+from models.database import (
+    EMAIL_COUNTER_PROCESSED, EMAIL_COUNTER_TOTAL, EMAIL_MIGRATION_COLUMNS, SCHEMA_VERSION, Database
+)
+from services.cache_service import cache_service
+
+# 加入附件、转发、软删除字段之前的emails表
+OLD_EMAILS_TABLE = '''
+    CREATE TABLE emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        email_id TEXT UNIQUE,
+        content_hash TEXT UNIQUE,
+        subject TEXT,
+        sender TEXT,
+        recipients TEXT,
+        date TEXT,
+        body TEXT,
+        body_html TEXT,
+        summary TEXT,
+        ai_summary TEXT,
+        processed BOOLEAN DEFAULT 0,
+        account_email TEXT,
+        provider TEXT,
+        importance INTEGER DEFAULT 1,
+        category TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / 'emails.db'
+    monkeypatch.setattr(Config, 'DATABASE_PATH', path)
+    monkeypatch.setattr(cache_service, 'is_available', False)
+    return path
+
+
+def create_old_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute(OLD_EMAILS_TABLE)
+    conn.executemany(
+        'INSERT INTO emails (user_id, email_id, content_hash, subject, processed) VALUES (?, ?, ?, ?, ?)',
+        [(1, 'a', 'ha', '旧邮件1', 1), (1, 'b', 'hb', '旧邮件2', 0), (2, 'c', 'hc', '旧邮件3', 1)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def read_schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(emails)')}
+        counters = dict(conn.execute('SELECT key, value FROM stats_counters'))
+        triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        return version, columns, counters, triggers
+    finally:
+        conn.close()
+
+
+def test_new_database_is_created_at_current_version(db_path):
+    Database()
+    version, columns, counters, triggers = read_schema(db_path)
+    assert version == SCHEMA_VERSION
+    assert {name for name, _ in EMAIL_MIGRATION_COLUMNS} <= columns
+    assert counters == {EMAIL_COUNTER_TOTAL: 0, EMAIL_COUNTER_PROCESSED: 0}
+    assert {'emails_ai_count', 'emails_au_count', 'emails_ad_count'} <= triggers
+
+
+def test_old_database_is_migrated(db_path):
+    create_old_database(db_path)
+    Database()
+    version, columns, counters, _ = read_schema(db_path)
+    assert version == SCHEMA_VERSION
+    assert {name for name, _ in EMAIL_MIGRATION_COLUMNS} <= columns
+    # 计数按迁移前已有的数据初始化
+    assert counters == {EMAIL_COUNTER_TOTAL: 3, EMAIL_COUNTER_PROCESSED: 2}
+
+    conn = sqlite3.connect(db_path)
+    deleted = [row[0] for row in conn.execute('SELECT deleted FROM emails')]
+    conn.close()
+    assert deleted == [0, 0, 0]
+
+
+def test_version_one_database_only_gets_counters(db_path):
+    create_old_database(db_path)
+    conn = sqlite3.connect(db_path)
+    for field_name, field_type in EMAIL_MIGRATION_COLUMNS:
+        conn.execute(f'ALTER TABLE emails ADD COLUMN {field_name} {field_type}')
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+
+    Database()
+    version, _, counters, _ = read_schema(db_path)
+    assert version == SCHEMA_VERSION
+    assert counters == {EMAIL_COUNTER_TOTAL: 3, EMAIL_COUNTER_PROCESSED: 2}
+
+
+
+def test_concurrent_migration_does_not_fail(db_path):
+    """读取表结构之后另一个进程添加了字段（user_version 仍为0），启动不应因重复字段失败"""
+    Database()
+    # 退回到缺少deleted字段、尚未记录版本的状态（其余表和索引都已存在，启动时读取表结构不需要写锁）
+    conn = sqlite3.connect(db_path)
+    conn.execute('ALTER TABLE emails DROP COLUMN deleted')
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+    conn.close()
+
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    other.execute('ALTER TABLE emails ADD COLUMN deleted BOOLEAN DEFAULT 0')
+
+    errors = []
+
+    def start():
+        try:
+            Database()
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=start)
+    worker.start()
+    time.sleep(0.3)
+    other.execute('COMMIT')
+    other.close()
+    worker.join()
+
+    assert errors == []
+    version, columns, _, _ = read_schema(db_path)
+    assert version == SCHEMA_VERSION
+    assert 'deleted' in columns
+
+def test_migrated_database_is_not_reseeded(db_path):
+    Database()
+    conn = sqlite3.connect(db_path)
+    conn.execute('UPDATE stats_counters SET value = 42 WHERE key = ?', (EMAIL_COUNTER_TOTAL,))
+    conn.commit()
+    conn.close()
+
+    Database()
+    _, _, counters, _ = read_schema(db_path)
+    assert counters[EMAIL_COUNTER_TOTAL] == 42
+
+
+def test_counters_follow_inserts_updates_and_deletes(db_path):
+    db = Database()
+    emails = [{'user_id': 1, 'email_id': f'm{i}', 'subject': f's{i}', 'processed': i == 0} for i in range(3)]
+    for email in emails:
+        email['content_hash'] = db.generate_content_hash(email)
+    db.save_emails_bulk(emails)
+    # 相同email_id重新保存（INSERT OR REPLACE）不应重复计数
+    db.save_email(emails[1])
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE emails SET processed = 1 WHERE email_id = 'm1'")
+    conn.execute("DELETE FROM emails WHERE email_id = 'm2'")
+    conn.commit()
+    conn.close()
+
+    _, _, counters, _ = read_schema(db_path)
+    assert counters == {EMAIL_COUNTER_TOTAL: 2, EMAIL_COUNTER_PROCESSED: 2}
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量摘要的重复邮件合并
+只有发件人、主题（忽略回复/转发前缀）和正文都一致的邮件才共用一次摘要
+"""
+
+import pytest
+
+from config import Config
+from services.ai_client import AIClient
+from services.cache_service import cache_service
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DATABASE_PATH', tmp_path / 'emails.db')
+    monkeypatch.setattr(cache_service, 'is_available', False)
+    client = AIClient()
+    client.provider = 'glm'
+    calls = []
+
+    def summarize_email(email_data):
+        calls.append(email_data['body'])
+        return f"摘要: {email_data['body']}"
+
+    client.summarize_email = summarize_email
+    client.calls = calls
+    return client
+
+
+def make_email(subject: str, body: str, sender: str = 'shop@example.com') -> dict:
+    return {'sender': sender, 'subject': subject, 'body': body}
+
+
+def test_same_subject_different_body_is_summarized_separately(client):
+    emails = [make_email('您的订单已发货', '订单 1001 已发货'), make_email('您的订单已发货', '订单 1002 已发货')]
+    client.batch_summarize(emails)
+    assert len(client.calls) == 2
+    assert emails[0]['ai_summary'] == '摘要: 订单 1001 已发货'
+    assert emails[1]['ai_summary'] == '摘要: 订单 1002 已发货'
+
+
+def test_exact_duplicates_share_one_summary(client):
+    emails = [
+        make_email('周报', '本周进展\n一切正常'),
+        make_email('Re: 周报', '本周进展   一切正常'),
+        make_email('转发：周报', '本周进展 一切正常', sender='SHOP@example.com'),
+    ]
+    client.batch_summarize(emails)
+    assert len(client.calls) == 1
+    assert {e['ai_summary'] for e in emails} == {'摘要: 本周进展\n一切正常'}
+    assert all(e['processed'] for e in emails)
+
+
+def test_different_senders_are_not_merged(client):
+    emails = [make_email('通知', '内容相同', sender='a@example.com'),
+              make_email('通知', '内容相同', sender='b@example.com')]
+    client.batch_summarize(emails)
+    assert len(client.calls) == 2
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试通用工具模块
+进程内TTL缓存、游标分页、ZIP流式打包、后台任务队列
+"""
+
+import io
+import time
+import zipfile
+
+import pytest
+
+from services.cache_service import cache_service
+from services.job_queue import JOB_FAILURE, JOB_SUCCESS, JobQueue
+from utils.pagination import decode_cursor, encode_cursor
+from utils.ttl_cache import TTLCache
+from utils.zip_stream import is_compressed_type, stream_zip
+
+
+# ==================== TTLCache ====================
+
+def test_ttl_cache_get_set_pop():
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get('a') is None
+    assert cache.get('a', 'default') == 'default'
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.pop('a') == 1
+    assert cache.pop('a', 'gone') == 'gone'
+    assert len(cache) == 0
+
+
+def test_ttl_cache_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set('a', 1)
+    now[0] += 5
+    assert cache.get('a') == 1
+    now[0] += 0.1
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')  # a 变为最近使用
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+# ==================== 游标分页 ====================
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('2024-01-01T08:00:00+00:00', 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ('2024-01-01T08:00:00+00:00', 42)
+    assert decode_cursor(encode_cursor('中文', 7)) == ('中文', 7)
+
+
+@pytest.mark.parametrize('cursor', [None, '', 'not-a-cursor', '!!!', encode_cursor('x', 1)[:-2]])
+def test_invalid_cursor_decodes_to_none(cursor):
+    assert decode_cursor(cursor) is None
+
+
+# ==================== ZIP流式打包 ====================
+
+def test_is_compressed_type():
+    assert is_compressed_type('application/pdf')
+    assert is_compressed_type('image/png; name=a.png')
+    assert is_compressed_type(None, 'photo.jpg')
+    assert is_compressed_type('application/octet-stream', 'archive.zip')
+    assert is_compressed_type('application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+    assert not is_compressed_type('text/plain')
+    assert not is_compressed_type('image/bmp')
+    assert not is_compressed_type(None, 'notes')
+
+
+def test_stream_zip(tmp_path):
+    text_file = tmp_path / 'notes.txt'
+    text_file.write_text('邮件附件' * 50000, encoding='utf-8')
+    image_file = tmp_path / 'photo.png'
+    image_file.write_bytes(bytes(range(256)) * 1000)
+
+    chunks = list(stream_zip([
+        (str(text_file), 'notes.txt'),
+        (str(image_file), 'images/photo.png', 'image/png'),
+    ]))
+    assert len(chunks) > 1
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.read('notes.txt') == text_file.read_bytes()
+        assert zipf.read('images/photo.png') == image_file.read_bytes()
+        assert zipf.getinfo('notes.txt').compress_type == zipfile.ZIP_DEFLATED
+        assert zipf.getinfo('images/photo.png').compress_type == zipfile.ZIP_STORED
+
+
+# ==================== 后台任务队列 ====================
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """不连接Redis时任务状态保存在进程内"""
+    monkeypatch.setattr(cache_service, 'is_available', False)
+    queue = JobQueue(max_workers=1)
+    yield queue
+    queue.shutdown()
+
+
+def wait_for_job(queue: JobQueue, job_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['state'] in (JOB_SUCCESS, JOB_FAILURE):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'任务 {job_id} 未在 {timeout} 秒内结束')
+
+
+def test_job_queue_success(jobs):
+    job_id = jobs.submit('sum', 1, lambda a, b: a + b, 2, b=3)
+    job = wait_for_job(jobs, job_id)
+    assert job['state'] == JOB_SUCCESS
+    assert job['result'] == 5
+    assert job['user_id'] == 1
+    assert job['type'] == 'sum'
+
+
+def test_job_queue_failure(jobs):
+    def fail():
+        raise ValueError('出错了')
+
+    job = wait_for_job(jobs, jobs.submit('fail', 1, fail))
+    assert job['state'] == JOB_FAILURE
+    assert job['error'] == '出错了'
+    assert job['result'] is None
+
+
+def test_job_queue_unknown_job(jobs):
+    assert jobs.get('missing') is None
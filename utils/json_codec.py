@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON编解码 - 数据库JSON字段（收件人、附件、简报内容等）的序列化
+
+安装了orjson时使用orjson，否则退回标准库json。
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def json_dumps(obj) -> str:
+    """序列化为JSON字符串（非ASCII字符原样保留）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode('utf-8')
+        except TypeError:
+            # orjson不支持的对象（如超过64位的整数）退回标准库
+            pass
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def json_loads(data):
+    """解析JSON字符串"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            # 标准库写入的 NaN/Infinity 等orjson不接受的内容
+            pass
+    return json.loads(data)
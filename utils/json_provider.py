@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON序列化 - 安装了orjson时用它替换Flask默认的json模块
+"""
+
+import logging
+
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    基于orjson的JSON Provider，jsonify() 自动使用
+
+    日期等类型仍交给Flask默认的 default() 处理，输出格式与原来一致；
+    orjson无法序列化的对象（如超过64位的整数）退回标准库。
+    """
+
+    def _orjson_options(self) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _orjson_dumps(self, obj) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options())
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._orjson_dumps(obj).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            data = self._orjson_dumps(obj) + b"\n"
+        except TypeError:
+            data = f"{super().dumps(obj)}\n"
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+
+def install_json_provider(app):
+    """orjson可用时为应用安装 OrjsonProvider"""
+    if orjson is None:
+        logger.info("未安装orjson，使用Flask默认JSON序列化")
+        return
+    app.json = OrjsonProvider(app)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+语言检测工具 - 翻译前判断文本是否已经是目标语言，避免无效的GLM调用
+
+安装了 fast-langdetect 时使用FastText模型，否则按中英文字符占比估算。
+"""
+
+import logging
+import re
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from fast_langdetect import detect as _fast_detect
+except ImportError:
+    _fast_detect = None
+
+_CHINESE_CHAR_RE = re.compile(r'[\u4e00-\u9fff]')
+_ENGLISH_CHAR_RE = re.compile(r'[a-zA-Z]')
+
+# 只检测开头部分，长邮件正文不必全文扫描
+DETECT_SAMPLE_LENGTH = 2000
+
+# 接口参数中的目标语言名称 -> 语言代码
+LANGUAGE_CODES = {
+    'chinese': 'zh',
+    'english': 'en',
+}
+
+
+def detect_language(text: str) -> Tuple[Optional[str], float]:
+    """
+    检测文本语言
+
+    Returns:
+        (语言代码, 置信度)，无法判断时返回 (None, 0.0)
+    """
+    if not text or not text.strip():
+        return None, 0.0
+
+    sample = text[:DETECT_SAMPLE_LENGTH]
+
+    if _fast_detect is not None:
+        try:
+            result = _fast_detect(sample.replace('\n', ' '))
+            lang = result['lang']
+            return ('zh' if lang.startswith('zh') else lang), float(result['score'])
+        except Exception as e:
+            logger.debug(f"fast-langdetect 检测失败，使用字符占比估算: {e}")
+
+    chinese_chars = len(_CHINESE_CHAR_RE.findall(sample))
+    english_chars = len(_ENGLISH_CHAR_RE.findall(sample))
+    total_chars = chinese_chars + english_chars
+    if total_chars == 0:
+        return None, 0.0
+    if chinese_chars >= english_chars:
+        return 'zh', chinese_chars / total_chars
+    return 'en', english_chars / total_chars
+
+
+def is_in_language(text: str, target_language: str, min_confidence: float = 0.9) -> bool:
+    """
+    判断文本是否已经是目标语言
+
+    Args:
+        text: 待检测文本
+        target_language: 目标语言（chinese/english 或 zh/en）
+        min_confidence: 最低置信度
+    """
+    lang, confidence = detect_language(text)
+    return lang == LANGUAGE_CODES.get(target_language, target_language) and confidence >= min_confidence
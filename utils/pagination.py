@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游标分页工具 - 列表接口用 (排序值, id) 作为游标，翻到深页时不再依赖OFFSET
+"""
+
+import base64
+import json
+from typing import Any, Optional, Tuple
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """将最后一行的 (排序值, id) 编码为URL安全的游标字符串"""
+    raw = json.dumps([sort_value, row_id], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Any, int]]:
+    """解析游标，为空或格式不正确时返回None"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求限流工具
+- 路由限流: 基于Redis滑动窗口(Redis不可用时退化为进程内计数)
+- GLM调用限流: 进程内RPM/TPM令牌桶,并发任务主动排队而不是撞上429再重试
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, List, Optional, Tuple
+
+import requests
+from flask import jsonify, request
+
+from config import Config
+from services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+_PERIOD_SECONDS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+
+def parse_limits(limit_string: str) -> List[Tuple[int, int]]:
+    """
+    解析限流规则字符串
+
+    Args:
+        limit_string: 形如 "6/hour;1/minute" 的规则
+
+    Returns:
+        [(次数, 窗口秒数), ...]
+    """
+    limits = []
+    for part in limit_string.split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        count, period = part.split('/', 1)
+        limits.append((int(count), _PERIOD_SECONDS[period.strip().rstrip('s')]))
+    # 短窗口优先检查，被短窗口拒绝的请求不会占用长窗口配额
+    return sorted(limits, key=lambda item: item[1])
+
+
+class SlidingWindowRateLimiter:
+    """滑动窗口限流器(Redis有序集合记录请求时间戳)"""
+
+    def __init__(self, prefix: str = 'ratelimit'):
+        self.prefix = prefix
+        self._local_hits = defaultdict(deque)
+        self._local_lock = threading.Lock()
+
+    def _hit_redis(self, key: str, limit: int, window: int) -> Tuple[bool, int]:
+        now = time.time()
+        member = f"{now}:{uuid.uuid4().hex[:8]}"
+        pipe = cache_service.redis_client.pipeline()
+        pipe.zremrangebyscore(key, 0, now - window)
+        pipe.zadd(key, {member: now})
+        pipe.zcard(key)
+        pipe.zrange(key, 0, 0, withscores=True)
+        pipe.expire(key, window)
+        _, _, count, oldest, _ = pipe.execute()
+
+        if count <= limit:
+            return True, 0
+
+        # 被拒绝的请求不计入窗口
+        cache_service.redis_client.zrem(key, member)
+        retry_after = int(oldest[0][1] + window - now) + 1 if oldest else window
+        return False, max(retry_after, 1)
+
+    def _hit_local(self, key: str, limit: int, window: int) -> Tuple[bool, int]:
+        now = time.monotonic()
+        with self._local_lock:
+            hits = self._local_hits[key]
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return False, max(int(hits[0] + window - now) + 1, 1)
+            hits.append(now)
+            return True, 0
+
+    def hit(self, identity: str, limits: List[Tuple[int, int]]) -> Tuple[bool, int]:
+        """
+        记录一次请求并检查是否超限
+
+        Args:
+            identity: 限流对象标识(如 trigger:user:1)
+            limits: parse_limits 的结果
+
+        Returns:
+            (是否允许, 需要等待的秒数)
+        """
+        use_redis = cache_service.is_connected()
+        for limit, window in limits:
+            key = f"{self.prefix}:{identity}:{window}"
+            try:
+                if use_redis:
+                    allowed, retry_after = self._hit_redis(key, limit, window)
+                else:
+                    allowed, retry_after = self._hit_local(key, limit, window)
+            except Exception as e:
+                # 限流器故障时不影响正常请求
+                logger.warning(f"限流检查失败 {key}: {e}")
+                continue
+            if not allowed:
+                return False, retry_after
+        return True, 0
+
+
+request_limiter = SlidingWindowRateLimiter()
+
+
+def rate_limit(limit_string: str, scope: str, key_func: Optional[Callable[[], str]] = None):
+    """
+    路由限流装饰器,超限时返回429
+
+    Args:
+        limit_string: 限流规则,如 "6/hour;1/minute"
+        scope: 限流范围名称(不同接口独立计数)
+        key_func: 返回限流对象标识的函数,默认使用客户端IP
+    """
+    limits = parse_limits(limit_string)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            identity = key_func() if key_func else None
+            identity = identity or f"ip:{request.remote_addr}"
+            allowed, retry_after = request_limiter.hit(f"{scope}:{identity}", limits)
+            if not allowed:
+                logger.warning(f"请求过于频繁: {scope} {identity}, {retry_after}秒后可重试")
+                response = jsonify({
+                    'success': False,
+                    'message': f'操作过于频繁，请 {retry_after} 秒后再试',
+                    'retry_after': retry_after
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+class TokenBucketLimiter:
+    """
+    进程内的RPM/TPM限流器(最近60秒内的请求记录放在deque中)
+
+    acquire() 在请求数或预估token数达到上限时阻塞等待;
+    遇到429时 backoff() 让所有等待中的线程一起暂停。
+    """
+
+    WINDOW_SECONDS = 60
+
+    def __init__(self, rpm: int, tpm: int, name: str = 'glm'):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._records = deque()  # (时间戳, token数)
+        self._tokens_in_window = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def configure(self, rpm, tpm):
+        """更新限额(<=0 表示不限制)"""
+        with self._condition:
+            self.rpm = int(rpm)
+            self.tpm = int(tpm)
+            self._condition.notify_all()
+        logger.info(f"{self.name} 限流配置: {self.rpm} RPM, {self.tpm} TPM")
+
+    def _expire(self, now: float):
+        while self._records and self._records[0][0] <= now - self.WINDOW_SECONDS:
+            _, tokens = self._records.popleft()
+            self._tokens_in_window -= tokens
+
+    def _wait_seconds(self, now: float, tokens: int) -> float:
+        """返回还需等待的秒数,0表示可以立即发送"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rpm > 0 and len(self._records) >= self.rpm:
+            return self._records[0][0] + self.WINDOW_SECONDS - now
+        # 单次请求超过TPM时只要求窗口为空,避免永远等待
+        if self.tpm > 0 and self._records and self._tokens_in_window + tokens > self.tpm:
+            return self._records[0][0] + self.WINDOW_SECONDS - now
+        return 0
+
+    @contextmanager
+    def acquire(self, estimated_tokens: int = 0):
+        """
+        获取一次调用额度(不足时阻塞等待)
+
+        Args:
+            estimated_tokens: 本次请求预估消耗的token数
+        """
+        tokens = max(int(estimated_tokens), 0)
+        waited = 0.0
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_seconds(now, tokens)
+                if wait <= 0:
+                    break
+                waited += wait
+                self._condition.wait(timeout=wait)
+            self._records.append((now, tokens))
+            self._tokens_in_window += tokens
+        if waited >= 1:
+            logger.debug(f"{self.name} 限流等待 {waited:.1f} 秒")
+        yield
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        收到429后暂停所有调用(指数退避,优先使用服务端的Retry-After)
+
+        Returns:
+            本次暂停的秒数
+        """
+        try:
+            delay = float(retry_after) if retry_after else 0
+        except ValueError:
+            delay = 0
+        delay = min(max(delay, 2 ** attempt), 60)
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        logger.warning(f"{self.name} 接口返回429,暂停 {delay:.0f} 秒后重试")
+        return delay
+
+    def post(self, url: str, estimated_tokens: int = 0, max_retries: int = 3, **kwargs):
+        """
+        限流后发送POST请求,遇到429按指数退避重试
+
+        Returns:
+            requests.Response(重试用尽时返回最后一次429响应)
+        """
+        for attempt in range(max_retries + 1):
+            with self.acquire(estimated_tokens):
+                response = requests.post(url, **kwargs)
+            if response.status_code != 429 or attempt == max_retries:
+                return response
+            self.backoff(attempt + 1, response.headers.get('Retry-After'))
+        return response
+
+
+glm_limiter = TokenBucketLimiter(Config.GLM_RPM_LIMIT, Config.GLM_TPM_LIMIT)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本token数(约4个字符1个token)"""
+    return len(text or '') // 4
+
+
+def load_glm_limits(db):
+    """从系统配置加载GLM限额(glm_rpm_limit / glm_tpm_limit)"""
+    try:
+        glm_limiter.configure(
+            db.get_system_config('glm_rpm_limit', Config.GLM_RPM_LIMIT),
+            db.get_system_config('glm_tpm_limit', Config.GLM_TPM_LIMIT)
+        )
+    except Exception as e:
+        logger.warning(f"加载GLM限流配置失败，使用默认配置: {e}")